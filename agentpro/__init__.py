@@ -1,21 +1,36 @@
 from .agent import AgentPro
+from .completion import OneShotCompletion
 from typing import Any
-from agentpro.tools import CodeEngine, YouTubeSearchTool, SlideGenerationTool # add more tools when available
+import threading
 
-# Initialize optional tools
-try:
-    from agentpro.tools import AresInternetTool
-    ares_tool = AresInternetTool()
-    has_ares = True
-except (ImportError, ValueError):
-    ares_tool = None
-    has_ares = False
+# The default tools need API keys to build, so they are created on first access (agentpro.code_tool, ...)
+# rather than on import; importing a submodule such as agentpro.tools.http_transport stays side-effect free
+_tools = {}
+_tools_lock = threading.Lock()
 
-# Initialize required tools
-code_tool = CodeEngine()
-youtube_tool = YouTubeSearchTool()
-slide_tool = SlideGenerationTool()
+def _build_tool(name: str) -> Any:
+    from agentpro.tools import CodeEngine, YouTubeSearchTool, SlideGenerationTool # add more tools when available
+    if name == 'code_tool':
+        return CodeEngine()
+    if name == 'youtube_tool':
+        return YouTubeSearchTool()
+    if name == 'slide_tool':
+        return SlideGenerationTool()
+    # Optional tools are None when unavailable
+    try:
+        from agentpro.tools import AresInternetTool
+        return AresInternetTool()
+    except (ImportError, ValueError):
+        return None
 
-__all__ = ['AgentPro', 'code_tool', 'youtube_tool', 'slide_tool']
-if has_ares:
-    __all__.append('ares_tool')
+def __getattr__(name: str) -> Any:
+    if name == 'has_ares':
+        return __getattr__('ares_tool') is not None
+    if name not in ('code_tool', 'youtube_tool', 'slide_tool', 'ares_tool'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _tools_lock:
+        if name not in _tools:
+            _tools[name] = _build_tool(name)
+        return _tools[name]
+
+__all__ = ['AgentPro', 'OneShotCompletion', 'code_tool', 'youtube_tool', 'slide_tool', 'ares_tool']
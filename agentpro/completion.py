@@ -0,0 +1,61 @@
+from openai import OpenAI, AsyncOpenAI
+from pydantic import BaseModel, ValidationError
+from typing import Any, AsyncIterator, Dict, Optional, Type, Union
+import json
+import os
+JSON_SYSTEM_PROMPT = "Respond with a single JSON object matching this JSON schema, and nothing else:\n{schema}"
+class OneShotCompletion:
+    """
+    Stateless completion: one chat request per call, no ReAct loop and no message history, so
+    concurrent callers can share one instance. Given a pydantic schema the model is asked for a
+    JSON object and the reply is validated into that schema.
+    """
+    def __init__(self, client: Optional[OpenAI] = None, async_client: Optional[AsyncOpenAI] = None,
+                 model: Optional[str] = None, system_prompt: Optional[str] = None,
+                 temperature: float = 0.3, max_tokens: int = 2000):
+        openrouter_api_key = os.environ.get("OPENROUTER_API_KEY")
+        if openrouter_api_key:
+            # Same routing as AgentPro: OpenRouter with MODEL_NAME when configured
+            self.client = client or OpenAI(base_url="https://openrouter.ai/api/v1", api_key=openrouter_api_key)
+            self.async_client = async_client or AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=openrouter_api_key)
+        else:
+            self.client = client or OpenAI()
+            self.async_client = async_client or AsyncOpenAI()
+        self.model = model or os.environ.get("MODEL_NAME", "gpt-4o-mini")
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+    def request(self, prompt: str, schema: Optional[Type[BaseModel]] = None) -> Dict[str, Any]:
+        """Chat completion parameters of one call."""
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if schema is not None:
+            messages.append({"role": "system", "content": JSON_SYSTEM_PROMPT.format(schema=json.dumps(schema.model_json_schema()))})
+        messages.append({"role": "user", "content": prompt})
+        request = {"model": self.model, "messages": messages, "temperature": self.temperature, "max_tokens": self.max_tokens}
+        if schema is not None:
+            request["response_format"] = {"type": "json_object"}
+        return request
+    def parse(self, content: str, schema: Optional[Type[BaseModel]] = None) -> Union[str, BaseModel]:
+        """Validate a reply into the schema, raising ValueError when it doesn't match."""
+        content = (content or "").strip()
+        if schema is None:
+            return content
+        try:
+            return schema.model_validate_json(content)
+        except ValidationError as e:
+            raise ValueError(f"Completion did not match {schema.__name__}: {e}") from e
+    def complete(self, prompt: str, schema: Optional[Type[BaseModel]] = None) -> Union[str, BaseModel]:
+        response = self.client.chat.completions.create(**self.request(prompt, schema))
+        return self.parse(response.choices[0].message.content, schema)
+    async def acomplete(self, prompt: str, schema: Optional[Type[BaseModel]] = None) -> Union[str, BaseModel]:
+        response = await self.async_client.chat.completions.create(**self.request(prompt, schema))
+        return self.parse(response.choices[0].message.content, schema)
+    async def astream(self, prompt: str, schema: Optional[Type[BaseModel]] = None) -> AsyncIterator[str]:
+        """Same single request, streamed: yields content deltas as they arrive. Pass their concatenation to parse."""
+        stream = await self.async_client.chat.completions.create(**self.request(prompt, schema), stream=True)
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
@@ -1,24 +1,44 @@
 import requests
 import os
+from typing import Any, Dict
 from pydantic import HttpUrl
 from .base import Tool
+from .http_transport import get_async_transport, get_transport
 class AresInternetTool(Tool):
     name: str = "Ares Internet Search Tool"
     description: str = "Tool to search real-time relevant content from the internet"
     arg: str = "A single string parameter that will be searched on the internet to find relevant content"
     url: HttpUrl = "https://api-ares.traversaal.ai/live/predict"
     x_api_key: str = None
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0  # a hung upstream fails the call instead of blocking the worker
     def __init__(self, **data):
         super().__init__(**data)
         if self.x_api_key is None:
             self.x_api_key = os.environ.get("TRAVERSAAL_ARES_API_KEY")
             if not self.x_api_key:
                 raise ValueError("TRAVERSAAL_ARES_API_KEY environment variable not set") # OPTIONAL : TAKE API-KEY AS INPUT AT THIS STAGE
-    def run(self, prompt: str) -> str:
-        print(f"Calling Ares Internet Search Tool with prompt: {prompt}")
-        payload = {"query": [prompt]}
-        response = requests.post(self.url, json=payload, headers={"x-api-key": self.x_api_key, "content-type": "application/json"})
+    def _request_kwargs(self, prompt: str) -> Dict[str, Any]:
+        # Searches don't change anything upstream, so the transport may retry them
+        return {"json": {"query": [prompt]}, "headers": {"x-api-key": self.x_api_key, "content-type": "application/json"},
+                "timeout": (self.connect_timeout, self.read_timeout), "idempotent": True}
+    def _handle_response(self, response: requests.Response) -> str:
         if response.status_code != 200:
             return f"Error: {response.status_code} - {response.text}"
         response = response.json()
         return response['data']['response_text']
+    def run(self, prompt: str) -> str:
+        print(f"Calling Ares Internet Search Tool with prompt: {prompt}")
+        try:
+            response = get_transport().post(str(self.url), **self._request_kwargs(prompt))
+        except requests.exceptions.RequestException as e:
+            return f"Error: {e}"
+        return self._handle_response(response)
+    async def arun(self, prompt: str) -> str:
+        """Async variant of run, sharing the same connection pool."""
+        print(f"Calling Ares Internet Search Tool with prompt: {prompt}")
+        try:
+            response = await get_async_transport().post(str(self.url), **self._request_kwargs(prompt))
+        except requests.exceptions.RequestException as e:
+            return f"Error: {e}"
+        return self._handle_response(response)
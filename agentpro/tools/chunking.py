@@ -0,0 +1,50 @@
+import re
+from typing import List
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception: # tiktoken is optional, fall back to a character heuristic
+    _encoding = None
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 characters per token."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+def split_sentences(text: str) -> List[str]:
+    """Split text on sentence-ending punctuation."""
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+def _split_words(text: str, max_tokens: int) -> List[str]:
+    # Auto-generated captions often have no punctuation, so fall back to word boundaries
+    pieces, current, current_tokens = [], [], 0
+    for word in text.split():
+        word_tokens = count_tokens(" " + word)
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """Pack text into chunks of at most max_tokens, breaking on sentence (or word) boundaries."""
+    units = []
+    for sentence in split_sentences(text):
+        if count_tokens(sentence) > max_tokens:
+            units.extend(_split_words(sentence, max_tokens))
+        else:
+            units.append(sentence)
+    chunks, current, current_tokens = [], [], 0
+    for unit in units:
+        unit_tokens = count_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
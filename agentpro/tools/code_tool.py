@@ -1,16 +1,171 @@
+import ast
+import contextlib
+import contextvars
+import hashlib
+import io
+import os
 import re
 import subprocess
 import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from openai import OpenAI
+from pydantic import BaseModel
 from .base import LLMTool
+_exec_lock = threading.Lock()  # stdout/stderr redirection is process-wide, one execution at a time
+_tracked_files: contextvars.ContextVar = contextvars.ContextVar("tracked_files", default=None)  # (reads, writes) of the running execution
+_WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT | os.O_TRUNC
+_LIBRARY_PREFIXES = tuple({os.path.abspath(p) + os.sep for p in (sys.prefix, sys.base_prefix, sys.exec_prefix)})
+def _audit_open(event: str, args: tuple):
+    """Record every file opened while generated code runs: builtin open, pathlib, os.open and
+    library readers such as pandas or numpy all raise the "open" audit event."""
+    if event != "open":
+        return
+    tracked = _tracked_files.get()
+    if tracked is None:
+        return
+    file, mode, flags = args
+    if not isinstance(file, (str, bytes, os.PathLike)):
+        return  # file descriptors were opened (and recorded) earlier
+    path = os.path.abspath(os.fsdecode(file))
+    if path.startswith(_LIBRARY_PREFIXES):
+        return  # interpreter and site-packages files loaded by imports
+    writing = any(c in mode for c in "wax+") if mode else bool(flags & _WRITE_FLAGS)
+    tracked[1 if writing else 0].add(path)
+_hook_installed = False
+def _install_audit_hook():
+    # Audit hooks cannot be removed, so one hook is installed for the process, on the first execution,
+    # and only records inside an execution's context
+    global _hook_installed
+    with _exec_lock:
+        if not _hook_installed:
+            sys.addaudithook(_audit_open)
+            _hook_installed = True
+class ExecutionResult(BaseModel):
+    stdout: str = ""
+    stderr: str = ""
+    return_value: Optional[str] = None
+    artifacts: List[Dict[str, Any]] = []  # [{"path": ..., "size": ...}]
+    input_files: Dict[str, Tuple[int, int]] = {}  # path -> (mtime_ns, size)
+    error: Optional[str] = None
+    cached: bool = False
+def _fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    """Cheap (mtime_ns, size) fingerprint of a file, None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"\n... [truncated {len(text) - limit} chars]"
 class CodeEngine(LLMTool):
     name: str = "Code Generation and Execution Tool"
-    description: str = "A coding tool that can take a prompt and generate executable Python code. It parses and executes the code. Returns the code and the error if the code execution fails."
+    description: str = "A coding tool that can take a prompt and generate executable Python code. It parses and executes the code. Returns the code, its printed output, the value of the last expression and the files it produced, or the error if the code execution fails."
     arg: str = "A single string parameter describing the coding task."
+    # Specific Parameters
+    use_cache: bool = True
+    cache_size: int = 32
+    max_output_chars: int = 4000
+    max_artifacts: int = 20
+    _cache: Any = None  # sha256(code) -> ExecutionResult, most recently used last
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._cache = OrderedDict()
+    def _cache_lookup(self, code_hash: str) -> Optional[ExecutionResult]:
+        """Return a cached result if every file it read or produced is unchanged."""
+        result = self._cache.get(code_hash)
+        if result is None:
+            return None
+        recorded = dict(result.input_files)
+        recorded.update({a["path"]: a["fingerprint"] for a in result.artifacts})
+        if any(_fingerprint(path) != tuple(fp) for path, fp in recorded.items()):
+            del self._cache[code_hash]
+            return None
+        self._cache.move_to_end(code_hash)
+        return result.model_copy(update={"cached": True})
+    def _cache_store(self, code_hash: str, result: ExecutionResult):
+        self._cache[code_hash] = result
+        self._cache.move_to_end(code_hash)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+    def execute_code(self, code_string: str) -> ExecutionResult:
+        """Execute code, capturing stdout/stderr, the last expression value and the files it read or wrote."""
+        _install_audit_hook()
+        reads, writes = set(), set()
+        cwd = os.getcwd()
+        before = {entry.path: _fingerprint(entry.path) for entry in os.scandir(cwd) if entry.is_file()}
+        stdout, stderr = io.StringIO(), io.StringIO()
+        namespace = {"__name__": "__main__"}
+        return_value, error = None, None
+        token = _tracked_files.set((reads, writes))  # other threads keep their own (empty) context
+        try:
+            with _exec_lock, contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                tree = ast.parse(code_string)
+                last_expr = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+                exec(compile(tree, "<generated>", "exec"), namespace)
+                if last_expr is not None:
+                    value = eval(compile(ast.Expression(last_expr.value), "<generated>", "eval"), namespace)
+                    if value is not None:
+                        return_value = _truncate(repr(value), self.max_output_chars)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                error = f"SystemExit: {e.code}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            _tracked_files.reset(token)
+        after = {entry.path: _fingerprint(entry.path) for entry in os.scandir(cwd) if entry.is_file()}
+        writes.update(path for path, fp in after.items() if before.get(path) != fp)
+        artifacts = []
+        for path in sorted(writes):
+            fingerprint = _fingerprint(path)
+            if fingerprint is not None:
+                artifacts.append({"path": os.path.relpath(path, cwd), "size": fingerprint[1], "fingerprint": fingerprint})
+        inputs = {}
+        for path in reads - writes:
+            fingerprint = _fingerprint(path)
+            if fingerprint is not None:
+                inputs[path] = fingerprint
+        return ExecutionResult(
+            stdout=_truncate(stdout.getvalue(), self.max_output_chars),
+            stderr=_truncate(stderr.getvalue(), self.max_output_chars),
+            return_value=return_value,
+            artifacts=artifacts,
+            input_files=inputs,
+            error=error)
+    def format_observation(self, code: str, result: ExecutionResult) -> str:
+        """Render the code and its execution result as the tool observation."""
+        parts = [f"Code: {code}"]
+        if result.stdout:
+            parts.append(f"Output:\n{result.stdout.rstrip()}")
+        if result.stderr:
+            parts.append(f"Stderr:\n{result.stderr.rstrip()}")
+        if result.return_value is not None:
+            parts.append(f"Return Value: {result.return_value}")
+        if result.artifacts:
+            listed = [f"- {a['path']} ({a['size']} bytes)" for a in result.artifacts[:self.max_artifacts]]
+            if len(result.artifacts) > self.max_artifacts:
+                listed.append(f"... and {len(result.artifacts) - self.max_artifacts} more files")
+            parts.append("Files Produced:\n" + "\n".join(listed))
+        if result.error:
+            parts.append(f"Code execution caused an error: {result.error}")
+        else:
+            parts.append("Code Executed Successfully" + (" (cached result, inputs unchanged)" if result.cached else ""))
+        return "\n\n".join(parts)
     def parse_and_exec_code(self, response: str):
         result = re.search(r'```python\s*([\s\S]*?)\s*```', response)
         if not result:
-            return "No Python code block found", "Failed to extract code"
+            return "No Python code block found", ExecutionResult(error="Failed to extract code")
         code_string = result.group(1)
+        code_hash = hashlib.sha256(code_string.encode("utf-8")).hexdigest()
+        if self.use_cache:
+            cached = self._cache_lookup(code_hash)
+            if cached is not None:
+                print("Identical code with unchanged inputs found in cache, skipping execution")
+                return code_string, cached
         if "pip install" in code_string.split("\n")[0]:
             print("Requires PIP package installations")
             packages = code_string.split("\n")[0].split("pip install")[-1].strip()
@@ -24,12 +179,12 @@ class CodeEngine(LLMTool):
             for package in packages:
                 subprocess.check_call([sys.executable, "-m", "pip", "install", package])
         print("Executing main code...")
-        try:
-            exec(code_string)
-        except Exception as e:
-            print(f"Error executing generated code: {e}")
-            return code_string, e
-        return code_string, None
+        execution = self.execute_code(code_string)
+        if execution.error:
+            print(f"Error executing generated code: {execution.error}")
+        elif self.use_cache:
+            self._cache_store(code_hash, execution)
+        return code_string, execution
     #def generate_code(self, prompt):
     #    response = self.client.chat.completions.create(
     #        model="gpt-4o", # DEFAULT TO GPT-4o , BUT MAKE IT VARIABLE W/ OPEN ROUTER MODELS 
@@ -79,12 +234,10 @@ class CodeEngine(LLMTool):
                     max_tokens=4000, temperature=0.7)
                 response_content = response.choices[0].message.content
             except Exception as e2:
-                return f"Failed to generate code: {e2}", e2
-        code, error = self.parse_and_exec_code(response_content)
-        return code, error  
+                return f"Failed to generate code: {e2}", ExecutionResult(error=str(e2))
+        code, execution = self.parse_and_exec_code(response_content)
+        return code, execution
     def run(self, prompt: str) -> str:
         print(f"Calling Code Generation Tool with the prompt: {prompt}")
-        code, error = self.generate_code(prompt)
-        if error:
-            return f"Code: {code}\n\nCode execution caused an error: {error}"
-        return f"Code: {code}\n\n\nCode Executed Successfully"
+        code, execution = self.generate_code(prompt)
+        return self.format_observation(code, execution)
@@ -0,0 +1,172 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+class HttpTransport:
+    """
+    Shared requests.Session with keep-alive pooling, (connect, read) timeouts, at most
+    max_per_host concurrent connections per host and bounded retries with jittered
+    exponential backoff. Connect timeouts (request never sent) are always retried; connection
+    resets, read timeouts and 429/5xx only for idempotent requests. POSTs that are safe to
+    repeat, like search or completion queries, can opt in with idempotent=True. A request's
+    budget also covers the time spent waiting for one of its host's connection slots.
+    """
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 60.0, retries: int = 2,
+                 backoff: float = 0.5, max_backoff: float = 8.0, max_per_host: int = 10):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_per_host = max_per_host
+        self._session = self._new_session()
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}  # host -> free connection slots
+        self._slots_lock = threading.Lock()
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        # The per-host slots keep callers within max_per_host, pool_block is only a backstop
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.max_per_host, pool_block=True, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._slots_lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._slots[host]
+    def _send(self, method: str, url: str, timeout: Tuple[float, float], deadline: Optional[float], **kwargs) -> requests.Response:
+        # Wait for a connection slot of the host, no longer than the budget allows
+        slot = self._slot(url)
+        if not slot.acquire(timeout=max(deadline - time.monotonic(), 0) if deadline is not None else None):
+            raise requests.exceptions.Timeout(f"Budget spent waiting for a connection to {urlsplit(url).netloc}")
+        try:
+            if deadline is not None:
+                # Never wait past the budget, even mid-attempt
+                remaining = max(deadline - time.monotonic(), 0.001)
+                timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+            response = self._session.request(method, url, timeout=timeout, **kwargs)
+        except BaseException:
+            slot.release()
+            raise
+        if not kwargs.get("stream"):
+            slot.release()  # the body has been read and the connection is back in the pool
+            return response
+        # A streamed response holds its connection until it is closed
+        close = response.close
+        released = []
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released:
+                    released.append(True)
+                    slot.release()
+        response.close = close_and_release
+        return response
+    def _delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * (0.5 + random.random() / 2)
+    def _should_retry(self, attempt: int, idempotent: bool, error: Optional[Exception] = None,
+                      response: Optional[requests.Response] = None) -> bool:
+        if attempt >= self.retries:
+            return False
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout)):
+            # Reset or stalled mid-request, the server may have acted on it: only safe when idempotent
+            return idempotent
+        return response is not None and response.status_code in RETRY_STATUSES and idempotent
+    def request(self, method: str, url: str, idempotent: Optional[bool] = None,
+                timeout: Optional[Tuple[float, float]] = None, budget: Optional[float] = None, **kwargs) -> requests.Response:
+        """
+        Send a request through the pool, retrying transient failures. Raises the last error.
+        budget caps the total seconds spent across all attempts, including backoff and waiting
+        for a free connection; requests.exceptions.Timeout once it is spent while waiting.
+        """
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        deadline = time.monotonic() + budget if budget is not None else None
+        connect_timeout, read_timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            try:
+                response = self._send(method, url, (connect_timeout, read_timeout), deadline, **kwargs)
+            except requests.exceptions.RequestException as e:
+                delay = self._delay(attempt)
+                if not self._should_retry(attempt, idempotent, error=e) or self._past(deadline, delay):
+                    raise
+                time.sleep(delay)
+            else:
+                delay = self._delay(attempt, response)
+                if not self._should_retry(attempt, idempotent, response=response) or self._past(deadline, delay):
+                    return response
+                time.sleep(delay)
+                response.close()
+            attempt += 1
+    @staticmethod
+    def _past(deadline: Optional[float], delay: float) -> bool:
+        return deadline is not None and time.monotonic() + delay >= deadline
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+    def close(self):
+        self._session.close()
+class AsyncHttpTransport:
+    """
+    Async front end of an HttpTransport. Requests run on worker threads through the shared pool,
+    while a per-host semaphore keeps waiting callers in the event loop rather than on threads.
+    """
+    def __init__(self, transport: Optional[HttpTransport] = None):
+        self.transport = transport or get_transport()
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+    def _semaphore(self, url: str) -> asyncio.Semaphore:
+        per_loop = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        host = urlsplit(url).netloc
+        if host not in per_loop:
+            per_loop[host] = asyncio.Semaphore(self.transport.max_per_host)
+        return per_loop[host]
+    async def request(self, method: str, url: str, budget: Optional[float] = None, **kwargs) -> requests.Response:
+        """Send a request on a worker thread. budget also covers the time spent waiting for a free slot."""
+        deadline = time.monotonic() + budget if budget is not None else None
+        semaphore = self._semaphore(url)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), max(deadline - time.monotonic(), 0) if deadline is not None else None)
+        except asyncio.TimeoutError:
+            raise requests.exceptions.Timeout(f"Budget spent waiting for a connection to {urlsplit(url).netloc}") from None
+        try:
+            if deadline is not None:
+                budget = max(deadline - time.monotonic(), 0.001)
+            return await asyncio.to_thread(self.transport.request, method, url, budget=budget, **kwargs)
+        finally:
+            semaphore.release()
+    async def get(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("GET", url, **kwargs)
+    async def post(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("POST", url, **kwargs)
+_shared_transport: Optional[HttpTransport] = None
+_shared_async_transport: Optional[AsyncHttpTransport] = None
+_shared_lock = threading.Lock()
+def get_transport() -> HttpTransport:
+    """Process-wide transport shared by all tools, so connections are reused across them."""
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = HttpTransport()
+        return _shared_transport
+def get_async_transport() -> AsyncHttpTransport:
+    global _shared_async_transport
+    transport = get_transport()
+    with _shared_lock:
+        if _shared_async_transport is None:
+            _shared_async_transport = AsyncHttpTransport(transport)
+        return _shared_async_transport
@@ -0,0 +1,77 @@
+import zlib
+from collections import defaultdict
+from typing import List, Set, Tuple
+import numpy as np
+from .relevance import NEGATIONS, STOPWORDS, is_negation, tokenize
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(1729)  # fixed seed keeps signatures comparable across runs
+_MAX_PERM = 256
+_A = _rng.integers(1, _PRIME, size=_MAX_PERM, dtype=np.int64)
+_B = _rng.integers(0, _PRIME, size=_MAX_PERM, dtype=np.int64)
+_SHINGLE_STOPWORDS = STOPWORDS - NEGATIONS  # "not" is what tells a claim from its opposite
+def shingle(text: str) -> Set[str]:
+    """Word shingles of a short text: lightly stemmed unigrams, stopwords dropped but negations kept."""
+    return {word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+            for word in tokenize(text, _SHINGLE_STOPWORDS)}
+def negated(shingles: Set[str]) -> bool:
+    return any(is_negation(word) for word in shingles)
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+def minhash_signatures(shingle_sets: List[Set[str]], num_perm: int = 64) -> np.ndarray:
+    """(n_texts, num_perm) MinHash signatures using universal hashing (a*x + b) mod p."""
+    a, b = _A[:num_perm, None], _B[:num_perm, None]
+    signatures = np.full((len(shingle_sets), num_perm), _PRIME, dtype=np.int64)
+    for i, shingles in enumerate(shingle_sets):
+        if shingles:
+            hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles), dtype=np.int64, count=len(shingles))
+            signatures[i] = ((a * hashes[None, :] + b) % _PRIME).min(axis=1)
+    return signatures
+def cluster_near_duplicates(texts: List[str], threshold: float = 0.6, num_perm: int = 64, bands: int = 16) -> List[List[int]]:
+    """
+    Group texts whose shingle sets have Jaccard similarity >= threshold. Candidate pairs come
+    from MinHash LSH banding (near-linear in the number of texts) and are verified exactly; a
+    negated text never joins an affirmative one, however many words they share.
+    Returns clusters of indices, ordered by first occurrence.
+    """
+    shingle_sets = [shingle(text) for text in texts]
+    polarity = [negated(shingles) for shingles in shingle_sets]
+    parent = list(range(len(texts)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    # Identical shingle sets (including case/punctuation variants) merge without LSH
+    exact = {}
+    for i, shingles in enumerate(shingle_sets):
+        key = frozenset(shingles) if shingles else texts[i].strip().lower()
+        if key in exact:
+            parent[find(i)] = find(exact[key])
+        else:
+            exact[key] = i
+    signatures = minhash_signatures(shingle_sets, num_perm)
+    rows = num_perm // bands
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, band_values in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            if shingle_sets[i]:
+                buckets[band_values.tobytes()].append(i)
+        for members in buckets.values():
+            for position, i in enumerate(members):
+                for j in members[:position]:
+                    if (find(i) != find(j) and polarity[i] == polarity[j]
+                            and jaccard(shingle_sets[i], shingle_sets[j]) >= threshold):
+                        parent[find(i)] = find(j)
+    clusters = defaultdict(list)
+    for i in range(len(texts)):
+        clusters[find(i)].append(i)
+    return sorted(clusters.values(), key=lambda members: members[0])
+def consolidate(texts: List[str], threshold: float = 0.6) -> List[Tuple[str, List[int]]]:
+    """
+    Merge near-duplicate texts. Returns (representative, member indices) pairs in first-seen
+    order; the representative is the most detailed (longest) member of its cluster.
+    """
+    return [(max((texts[i] for i in members), key=len), members)
+            for members in cluster_near_duplicates(texts, threshold)]
@@ -0,0 +1,111 @@
+import re
+import zlib
+from typing import List, Optional
+import numpy as np
+from .chunking import chunk_text, count_tokens
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+him his how i if in into is it its itself just like me more most my no nor not now of off on once only or other
+our ours out over own same she should so some such than that the their theirs them then there these they this
+those through to too um uh under until up very was we were what when where which while who whom why will with
+would yeah you your yours
+""".split())
+# Shared by every scorer that needs polarity (cache keys, near-duplicates, sentiment), "n't" forms via is_negation
+NEGATIONS = frozenset({"no", "nor", "not", "never", "none", "nobody", "nothing", "neither", "cannot"})
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?", re.IGNORECASE)  # word tokens, case kept unless the text is lowercased first
+def tokenize(text: str, stopwords: frozenset = STOPWORDS) -> List[str]:
+    """Lowercase word tokens with stopwords removed."""
+    return [word for word in WORD.findall(text.lower()) if word not in stopwords]
+def is_negation(word: str) -> bool:
+    return word in NEGATIONS or word.endswith("n't")
+def _count_matrix(docs: List[List[str]], vocab: dict) -> np.ndarray:
+    """Dense (n_docs, n_terms) term count matrix."""
+    rows, cols = [], []
+    for i, doc in enumerate(docs):
+        for word in doc:
+            j = vocab.get(word)
+            if j is not None:
+                rows.append(i)
+                cols.append(j)
+    counts = np.zeros((len(docs), len(vocab)), dtype=np.float32)
+    np.add.at(counts, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0)
+    return counts
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """Okapi BM25 score of every document against the query."""
+    docs = [tokenize(doc) for doc in documents]
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not docs or not terms:
+        return np.zeros(len(docs), dtype=np.float32)
+    tf = _count_matrix(docs, {term: j for j, term in enumerate(terms)})
+    lengths = np.array([len(doc) for doc in docs], dtype=np.float32)
+    avg_length = max(float(lengths.mean()), 1.0)
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1.0 - b + b * lengths / avg_length)
+    return (idf * tf * (k1 + 1.0) / (tf + norm[:, None])).sum(axis=1)
+def textrank_scores(documents: List[str], damping: float = 0.85, iterations: int = 30) -> np.ndarray:
+    """Query-agnostic centrality of each document: PageRank over their TF-IDF cosine similarity graph."""
+    docs = [tokenize(doc) for doc in documents]
+    vocab = {}
+    for doc in docs:
+        for word in doc:
+            vocab.setdefault(word, len(vocab))
+    n = len(docs)
+    if n == 0 or not vocab:
+        return np.full(n, 1.0 / max(n, 1), dtype=np.float32)
+    tf = _count_matrix(docs, vocab)
+    idf = np.log((1.0 + n) / (1.0 + (tf > 0).sum(axis=0))) + 1.0
+    tfidf = tf * idf
+    tfidf /= np.maximum(np.linalg.norm(tfidf, axis=1, keepdims=True), 1e-12)
+    similarity = tfidf @ tfidf.T
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, out_weight, out=np.full_like(similarity, 1.0 / n), where=out_weight > 0)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(iterations):
+        scores = (1.0 - damping) / n + damping * (transition.T @ scores)
+    return scores
+def hashed_tfidf_cosine(query: str, documents: List[str], n_features: int = 2 ** 20) -> np.ndarray:
+    """
+    Cosine similarity between the query and each document over hashed, sublinear TF-IDF vectors.
+    Terms are hashed with crc32 so scores are stable across processes; only the hashed
+    columns that actually occur are materialized.
+    """
+    docs = [[zlib.crc32(word.encode("utf-8")) % n_features for word in tokenize(doc)] for doc in documents]
+    query_terms = [zlib.crc32(word.encode("utf-8")) % n_features for word in tokenize(query)]
+    if not documents or not query_terms:
+        return np.zeros(len(documents), dtype=np.float32)
+    features, columns = np.unique(np.concatenate([np.asarray(doc, dtype=np.int64) for doc in docs + [query_terms]]), return_inverse=True)
+    rows = np.repeat(np.arange(len(docs) + 1), [len(doc) for doc in docs] + [len(query_terms)])
+    counts = np.zeros((len(docs) + 1, len(features)), dtype=np.float32)
+    np.add.at(counts, (rows, columns), 1.0)
+    tf = np.where(counts > 0, 1.0 + np.log(np.maximum(counts, 1.0)), 0.0)
+    df = (counts[:-1] > 0).sum(axis=0)
+    idf = np.log((1.0 + len(docs)) / (1.0 + df)) + 1.0
+    vectors = tf * idf
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors[:-1] @ vectors[-1]
+def select_relevant_text(text: str, query: Optional[str] = None, token_budget: int = 2000,
+                         window_tokens: int = 150, max_windows: Optional[int] = None) -> str:
+    """
+    Extractive pre-filter: split text into windows, score them against the query with BM25
+    (TextRank when there is no query or no term overlap) and keep the best windows up to
+    token_budget, returned in their original order.
+    """
+    if count_tokens(text) <= token_budget:
+        return text
+    windows = chunk_text(text, window_tokens)
+    scores = bm25_scores(query, windows) if query else np.zeros(len(windows))
+    if not scores.any():
+        scores = textrank_scores(windows)
+    selected, used = [], 0
+    for index in np.argsort(-scores, kind="stable"):
+        if max_windows is not None and len(selected) >= max_windows:
+            break
+        window_cost = count_tokens(windows[index])
+        if used + window_cost > token_budget:
+            continue
+        selected.append(int(index))
+        used += window_cost
+    return " ... ".join(windows[index] for index in sorted(selected))
@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as M:SS, or H:MM:SS past the hour."""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+class TranscriptIndex:
+    """
+    Joined transcript text plus array-backed (start, duration, text offset) columns of its
+    timed entries, so any character position maps back to a video time by binary search.
+    Entry text is whitespace-normalized, which keeps chunks produced by agentpro.tools.chunking
+    exact substrings of `text`.
+    """
+    def __init__(self, entries: List[Dict[str, Any]]):
+        texts = [" ".join(str(entry.get("text", "")).split()) for entry in entries]
+        keep = [i for i, text in enumerate(texts) if text]
+        self.text = " ".join(texts[i] for i in keep)
+        lengths = np.array([len(texts[i]) + 1 for i in keep], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(keep) else np.zeros(0, dtype=np.int64)
+        self.starts = np.array([float(entries[i].get("start", 0.0)) for i in keep], dtype=np.float64)
+        self.durations = np.array([float(entries[i].get("duration", 0.0)) for i in keep], dtype=np.float64)
+    def __len__(self) -> int:
+        return len(self.starts)
+    @property
+    def total_seconds(self) -> float:
+        if not len(self):
+            return 0.0
+        return float(self.starts[-1] + self.durations[-1])
+    def times_at(self, char_offsets) -> np.ndarray:
+        """Start time of the entry containing each character offset."""
+        if not len(self):
+            return np.zeros(len(char_offsets), dtype=np.float64)
+        positions = np.searchsorted(self.offsets, np.asarray(char_offsets, dtype=np.int64), side="right") - 1
+        return self.starts[np.clip(positions, 0, len(self) - 1)]
+    def time_at(self, char_offset: int) -> float:
+        return float(self.times_at([char_offset])[0])
+    def locate(self, chunks: List[str], separator: str = " ... ") -> List[Optional[int]]:
+        """
+        Character offset of each chunk in the transcript. Chunks must be in transcript order;
+        chunks stitched together from non-adjacent windows are located by their first piece.
+        """
+        marker = separator.strip()
+        offsets, cursor = [], 0
+        for chunk in chunks:
+            head = next((piece.strip() for piece in chunk.split(marker) if piece.strip()), "")
+            position = self.text.find(head, cursor) if head else -1
+            if position < 0 and head:
+                position = self.text.find(head)
+            offsets.append(position if position >= 0 else None)
+            if position >= 0:
+                cursor = position + 1
+        return offsets
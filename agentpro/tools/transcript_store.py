@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+from youtube_transcript_api import YouTubeTranscriptApi
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "agentpro", "transcripts.sqlite3")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+class TranscriptStore:
+    """
+    SQLite-backed cache of YouTube transcripts keyed by (video_id, language).
+    Timed segment entries ({'text', 'start', 'duration'}) are stored compressed with
+    zstd when available, zlib otherwise. The least recently used transcripts, together
+    with their cached chunk summaries, are evicted once the total of both exceeds max_bytes.
+    """
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = os.path.expanduser(path or os.environ.get("TRANSCRIPT_STORE_PATH", DEFAULT_STORE_PATH))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.environ.get("TRANSCRIPT_STORE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    video_id TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    codec TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, language)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_accessed ON transcripts (accessed_at)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_summaries)")}
+            if columns and "size" not in columns:
+                # Summaries cached before they were sized and kept per video: only a cache, start over
+                self._conn.execute("DROP TABLE chunk_summaries")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_summaries (
+                    video_id TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (video_id, chunk_hash, model)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_summaries_chunk ON chunk_summaries (chunk_hash, model)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_summaries_video ON chunk_summaries (video_id)")
+    @staticmethod
+    def _compress(entries: List[Dict[str, Any]]):
+        raw = json.dumps(entries, separators=(",", ":")).encode("utf-8")
+        if zstandard is not None:
+            return "zstd", zstandard.ZstdCompressor(level=10).compress(raw)
+        return "zlib", zlib.compress(raw, 9)
+    @staticmethod
+    def _decompress(codec: str, data: bytes) -> List[Dict[str, Any]]:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Transcript was stored with zstd but the zstandard package is not installed")
+            raw = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            raw = zlib.decompress(data)
+        return json.loads(raw.decode("utf-8"))
+    def get(self, video_id: str, language: str = "en") -> Optional[List[Dict[str, Any]]]:
+        """Return the stored segment entries for a video, or None if not stored."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT codec, data FROM transcripts WHERE video_id = ? AND language = ?",
+                (video_id, language)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE transcripts SET accessed_at = ? WHERE video_id = ? AND language = ?",
+                (time.time(), video_id, language))
+        return self._decompress(*row)
+    def put(self, video_id: str, entries: List[Dict[str, Any]], language: str = "en"):
+        """Store segment entries for a video and evict old transcripts if over budget."""
+        entries = [{"text": e["text"], "start": float(e.get("start", 0.0)), "duration": float(e.get("duration", 0.0))} for e in entries]
+        codec, data = self._compress(entries)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, language, codec, data, len(data), now, now))
+            self._evict()
+    def _total_size(self) -> int:
+        return self._conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM transcripts) + (SELECT COALESCE(SUM(size), 0) FROM chunk_summaries)").fetchone()[0]
+    def _evict(self):
+        total = self._total_size()
+        if total <= self.max_bytes:
+            return
+        # Summaries of videos whose transcripts are gone go first, then whole videos, least recently used first
+        self._conn.execute("DELETE FROM chunk_summaries WHERE video_id NOT IN (SELECT video_id FROM transcripts)")
+        total = self._total_size()
+        victims = []
+        for video_id, language, size in self._conn.execute("""
+                SELECT t.video_id, t.language, t.size + COALESCE(
+                    (SELECT SUM(s.size) FROM chunk_summaries s WHERE s.video_id = t.video_id), 0)
+                FROM transcripts t ORDER BY t.accessed_at ASC"""):
+            if total <= self.max_bytes:
+                break
+            victims.append((video_id, language))
+            total -= size
+        self._conn.executemany("DELETE FROM transcripts WHERE video_id = ? AND language = ?", victims)
+        self._conn.executemany("DELETE FROM chunk_summaries WHERE video_id = ?", [(video_id,) for video_id, _ in victims])
+    def get_summary(self, chunk_hash: str, model: str) -> Optional[str]:
+        """Return a cached summary of a transcript chunk, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM chunk_summaries WHERE chunk_hash = ? AND model = ?",
+                (chunk_hash, model)).fetchone()
+        return row[0] if row else None
+    def put_summary(self, video_id: str, chunk_hash: str, model: str, summary: str):
+        """Cache the summary of a transcript chunk; counts toward max_bytes and is dropped together with the video's transcript."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunk_summaries VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, chunk_hash, model, summary, len(summary.encode("utf-8")), time.time()))
+            self._evict()
+    def fetch(self, video_id: str, language: str = "en") -> List[Dict[str, Any]]:
+        """Return segment entries from the store, downloading and storing them on a miss."""
+        entries = self.get(video_id, language)
+        if entries is None:
+            entries = YouTubeTranscriptApi.get_transcript(video_id, languages=[language])
+            self.put(video_id, entries, language)
+        return entries
+    def warm(self, video_ids: Iterable[str], language: str = "en") -> Dict[str, str]:
+        """Download transcripts that are not stored yet. Returns video_id -> status."""
+        status = {}
+        for video_id in video_ids:
+            if self.get(video_id, language) is not None:
+                status[video_id] = "cached"
+                continue
+            try:
+                self.fetch(video_id, language)
+                status[video_id] = "fetched"
+            except Exception as e:
+                status[video_id] = f"error: {str(e)}"
+        return status
+    def bulk_import(self, file_path: str, language: str = "en") -> int:
+        """
+        Import transcripts from a JSON file mapping video_id -> entries, or a JSONL file
+        with one {"video_id", "entries", "language"?} object per line. Returns the count imported.
+        """
+        with open(file_path, "r", encoding="utf-8") as f:
+            if file_path.endswith(".jsonl"):
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = [{"video_id": video_id, "entries": entries} for video_id, entries in json.load(f).items()]
+        for record in records:
+            self.put(record["video_id"], record["entries"], record.get("language", language))
+        return len(records)
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+            summaries = self._conn.execute("SELECT COUNT(*) FROM chunk_summaries").fetchone()[0]
+            size = self._total_size()
+        return {"path": self.path, "transcripts": count, "summaries": summaries, "bytes": size, "max_bytes": self.max_bytes}
+    def close(self):
+        self._conn.close()
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Manage the on-disk YouTube transcript store.")
+    parser.add_argument("--path", help="SQLite file (defaults to $TRANSCRIPT_STORE_PATH or ~/.cache/agentpro)")
+    parser.add_argument("--language", default="en")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="download transcripts for the given video IDs")
+    warm.add_argument("video_ids", nargs="*")
+    warm.add_argument("--file", help="text file with one video ID per line")
+    bulk = commands.add_parser("import", help="import transcripts from a JSON/JSONL export")
+    bulk.add_argument("file")
+    commands.add_parser("stats", help="show store size")
+    args = parser.parse_args(argv)
+    store = TranscriptStore(args.path)
+    if args.command == "warm":
+        video_ids = list(args.video_ids)
+        if args.file:
+            with open(args.file, "r", encoding="utf-8") as f:
+                video_ids.extend(line.strip() for line in f if line.strip())
+        for video_id, status in store.warm(video_ids, args.language).items():
+            print(f"{video_id}: {status}")
+    elif args.command == "import":
+        print(f"Imported {store.bulk_import(args.file, args.language)} transcripts")
+    print(json.dumps(store.stats()))
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,42 @@
-from youtube_transcript_api import YouTubeTranscriptApi
 from duckduckgo_search import DDGS
 from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from openai import OpenAI
 from .base import LLMTool
-from typing import Any
+from .transcript_store import TranscriptStore
+from .chunking import chunk_text, count_tokens
+from .relevance import select_relevant_text
+from typing import Any, Dict, List, Optional
+import hashlib
+import math
+import os
+import threading
+import time
+_store_lock = threading.Lock()
 class YouTubeSearchTool(LLMTool):
     name: str = "YouTube Search Tool"
     description: str = "A tool capable of searching the internet for youtube videos and returns the text transcript of the videos"
     arg: str = "A single string parameter that will be searched on the internet to find relevant content"
     # Specific Parameters
     ddgs: Any = None
+    transcript_store: Any = None  # created on first fetch, so importing agentpro touches no files
+    max_workers: int = 3  # videos fetched and summarized concurrently
+    video_timeout: float = 90.0  # seconds allowed per video once its processing starts
+    chunk_tokens: int = 800  # transcripts longer than this are summarized map-reduce style
+    map_workers: int = 4  # chunk summaries requested concurrently per video
+    map_model: str = "gpt-4o-mini"  # cheaper model used for the per-chunk map step
+    prefilter_tokens: Optional[int] = 2000  # keep only the most query-relevant windows, None disables; well below a typical transcript, above chunk_tokens
+    window_tokens: int = 150  # size of the windows scored by the pre-filter
     def __init__(self, **data):
         super().__init__(**data)
         if self.ddgs is None:
             self.ddgs = DDGS()
+    def store(self) -> TranscriptStore:
+        """The transcript store, opened on first use."""
+        with _store_lock:
+            if self.transcript_store is None:
+                self.transcript_store = TranscriptStore()
+            return self.transcript_store
     def extract_video_id(self, url):
         """Extract video ID from YouTube URL."""
         parsed_url = urlparse(url)
@@ -63,10 +87,13 @@ class YouTubeSearchTool(LLMTool):
             return videos[:max_results]
         except Exception as e:
             return f"Error searching videos: {str(e)}"
+    def get_transcript_entries(self, video_id, language='en'):
+        """Get timed transcript entries for a YouTube video, served from the local store when possible."""
+        return self.store().fetch(video_id, language)
     def get_transcript(self, video_id):
         """Get transcript for a YouTube video."""
         try:
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+            transcript_list = self.get_transcript_entries(video_id)
             return ' '.join([entry['text'] for entry in transcript_list])
         except Exception as e:
             print(f"Error getting transcript: {str(e)}")
@@ -84,8 +111,62 @@ class YouTubeSearchTool(LLMTool):
     #        return response.choices[0].message.content.strip()
     #    except Exception as e:
     #        return None
-    def summarize_content(self, transcript):
-        prompt = "Create a concise summary of the following video transcript"
+    def summarize_content(self, transcript, video_id=None):
+        """Summarize a transcript, splitting long ones into chunks that are summarized in parallel and merged."""
+        chunks = chunk_text(transcript, self.chunk_tokens)
+        if len(chunks) <= 1:
+            return self._summarize("Create a concise summary of the following video transcript", transcript)
+        print(f"Transcript spans {len(chunks)} chunks, summarizing with map-reduce")
+        summaries = self._map_summaries(chunks, video_id)
+        if not summaries:
+            return None
+        return self._reduce_summaries(summaries)
+    def _summarize_chunk(self, chunk, video_id=None):
+        """Map step: summarize one transcript chunk with the cheaper model, reusing cached chunk summaries."""
+        chunk_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+        if video_id:
+            cached = self.store().get_summary(chunk_hash, self.map_model)
+            if cached:
+                return cached
+        try:
+            response = self.client.chat.completions.create(
+                model=self.map_model,
+                messages=[
+                    {"role": "system", "content": "You summarize one part of a longer video transcript. Keep every fact, figure, name and recommendation; drop filler."},
+                    {"role": "user", "content": f"Summarize this part of the transcript in a few bullet points.\n\nTranscript part:\n{chunk}"}
+                ],
+                max_tokens=500,
+                timeout=self.video_timeout)
+            summary = response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Error summarizing transcript chunk: {e}")
+            return None
+        if video_id:
+            self.store().put_summary(video_id, chunk_hash, self.map_model, summary)
+        return summary
+    def _map_summaries(self, chunks, video_id=None):
+        with ThreadPoolExecutor(max_workers=max(1, min(self.map_workers, len(chunks)))) as executor:
+            summaries = list(executor.map(lambda chunk: self._summarize_chunk(chunk, video_id), chunks))
+        return [summary for summary in summaries if summary]
+    def _reduce_summaries(self, summaries):
+        """Reduce step: merge partial summaries, first condensing groups of them if they don't fit in one call."""
+        joined = "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+        if count_tokens(joined) > self.chunk_tokens and len(summaries) > 1:
+            groups, current, current_tokens = [], [], 0
+            for summary in summaries:
+                summary_tokens = count_tokens(summary)
+                if current and current_tokens + summary_tokens > self.chunk_tokens:
+                    groups.append("\n\n".join(current))
+                    current, current_tokens = [], 0
+                current.append(summary)
+                current_tokens += summary_tokens
+            groups.append("\n\n".join(current))
+            if len(groups) < len(summaries):
+                condensed = self._map_summaries(groups)
+                if condensed:
+                    return self._reduce_summaries(condensed)
+        return self._summarize("Combine the following summaries of consecutive parts of one video transcript into a single concise summary of the whole video", joined)
+    def _summarize(self, prompt, transcript):
         openrouter_api_key = os.environ.get("OPENROUTER_API_KEY")
         model_name = os.environ.get("MODEL_NAME", "gpt-4")  # Default to gpt-4 if MODEL_NAME is not set
         try:
@@ -98,7 +179,8 @@ class YouTubeSearchTool(LLMTool):
                         {"role": "system", "content": "You are an expert content creator specializing in creating high-quality content from video transcripts."},
                         {"role": "user", "content": f"{prompt}\n\nTranscript:\n{transcript}"}
                     ],
-                    max_tokens=2000)
+                    max_tokens=2000,
+                    timeout=self.video_timeout)
             else: # Fall back to default OpenAI client
                 print("OpenRouter API key not found, using default OpenAI client with gpt-4")
                 response = self.client.chat.completions.create(
@@ -107,7 +189,8 @@ class YouTubeSearchTool(LLMTool):
                         {"role": "system", "content": "You are an expert content creator specializing in creating high-quality content from video transcripts."},
                         {"role": "user", "content": f"{prompt}\n\nTranscript:\n{transcript}"}
                     ],
-                    max_tokens=2000)
+                    max_tokens=2000,
+                    timeout=self.video_timeout)
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error with primary model: {e}")
@@ -119,11 +202,64 @@ class YouTubeSearchTool(LLMTool):
                         {"role": "system", "content": "You are an expert content creator specializing in creating high-quality content from video transcripts."},
                         {"role": "user", "content": f"{prompt}\n\nTranscript:\n{transcript}"}
                     ],
-                    max_tokens=2000)
+                    max_tokens=2000,
+                    timeout=self.video_timeout)
                 return response.choices[0].message.content.strip()
             except Exception as e2:
                 print(f"Error with fallback model: {e2}")
                 return None
+    def process_video(self, video: Dict[str, Any], query: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Fetch the transcript of a single video, keep the parts relevant to the query and summarize it."""
+        transcript = self.get_transcript(video['video_id'])
+        if not transcript:
+            return None
+        if self.prefilter_tokens:
+            transcript = select_relevant_text(transcript, query, self.prefilter_tokens, self.window_tokens)
+        content = self.summarize_content(transcript, video['video_id'])
+        if not content:
+            return None
+        return {
+            "video": video,
+            "content": content.replace("\n\n", "\n").replace("\n\n\n", "\n")
+        }
+    def _wait_for(self, future, index: int, started: Dict[int, float], deadline: float):
+        """Wait for a video's result, allowing video_timeout from the moment its processing started."""
+        while True:
+            start = started.get(index)
+            limit = start + self.video_timeout if start is not None else time.monotonic() + 0.5 # still queued, poll until it starts
+            try:
+                return future.result(timeout=max(0.0, min(limit, deadline) - time.monotonic()))
+            except FuturesTimeoutError:
+                now = time.monotonic()
+                if now >= deadline or (start is not None and now >= limit):
+                    raise
+    def process_videos(self, videos: List[Dict[str, Any]], query: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Process videos on a bounded thread pool, returning results in rank order."""
+        workers = max(1, min(self.max_workers, len(videos)))
+        started = {}
+        def worker(index, video):
+            started[index] = time.monotonic()
+            return self.process_video(video, query)
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = [executor.submit(worker, index, video) for index, video in enumerate(videos)]
+        # Queued videos only start once a worker frees up, so the overall wait is bounded too
+        deadline = time.monotonic() + self.video_timeout * math.ceil(len(videos) / workers)
+        results = []
+        try:
+            for index, (video, future) in enumerate(zip(videos, futures)):
+                try:
+                    result = self._wait_for(future, index, started, deadline)
+                except FuturesTimeoutError:
+                    print(f"Timed out processing video {video['video_id']}, skipping it")
+                    continue
+                except Exception as e:
+                    print(f"Error processing video {video['video_id']}: {str(e)}")
+                    continue
+                if result:
+                    results.append(result)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True) # don't block on timed out workers
+        return results
     def run(self, prompt: str) -> str:
         print(f"Calling YouTube Search Tool with prompt: {prompt}")
         try: # Search for videos
@@ -132,16 +268,7 @@ class YouTubeSearchTool(LLMTool):
                 return f"Search error: {videos}"
             if not videos:  # No videos found
                 return "No videos found matching the query."
-            results = []
-            for video in videos: # Get transcript
-                transcript = self.get_transcript(video['video_id'])
-                if not transcript:
-                    continue
-                content = self.summarize_content(transcript)
-                results.append({
-                    "video": video,
-                    "content": content.replace("\n\n", "\n").replace("\n\n\n", "\n")
-                 })
+            results = self.process_videos(videos, prompt)
             if not results:
                 return "Could not process any videos. Try a different search query."
             results = list(map(lambda x: f"Video Title: {x['video']['title']}\nContent: {x['content']}", results))
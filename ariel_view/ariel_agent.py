@@ -1,7 +1,9 @@
-from typing import Dict, List, Any
-from agentpro import AgentPro
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Type, Union
+from agentpro import OneShotCompletion
+from agentpro.tools.near_duplicates import consolidate
 from .tools.perplexity_tool import PerplexityResearchTool, ResearchResponse
-from .tools.enhanced_youtube_tool import EnhancedYouTubeAnalysisTool, VideoAnalysis
+from .tools.enhanced_youtube_tool import EnhancedYouTubeAnalysisTool, SegmentUpdate, VideoAnalysis
+from .stage_graph import Stage, StageCache, StageGraph, emit, emitting
 from pydantic import BaseModel
 
 class AnalysisResult(BaseModel):
@@ -10,72 +12,150 @@ class AnalysisResult(BaseModel):
     video_insights: List[VideoAnalysis]
     combined_analysis: Dict[str, Any]
     suggested_questions: List[str]
+    timings: Dict[str, float] = {}  # stage -> seconds spent, plus the total
+    cached_stages: List[str] = []  # stages whose output was reused from an earlier run
+
+class Synthesis(BaseModel):
+    narrative: str
+    main_themes: List[str] = []
+    key_findings: List[str] = []
+    implications: List[str] = []
+    consensus: List[str] = []
+    debates: List[str] = []
+    data_points: List[str] = []  # statistics and figures quoted by the sources
+    recommendations: List[str] = []
+
+class FollowUpQuestions(BaseModel):
+    questions: List[str]
 
 class ArielViewAgent:
-    def __init__(self):
+    speculative_videos: bool = True  # search videos for the raw topic while research is still running
+    stage_concurrency: int = 4  # pipeline stages (or single video analyses) running at once
+    search_ttl: float = 24 * 3600  # seconds cached research and video searches are reused
+    video_ttl: float = 7 * 24 * 3600  # seconds a cached video analysis is reused
+
+    def __init__(
+        self,
+        research_tool: Optional[PerplexityResearchTool] = None,
+        youtube_tool: Optional[EnhancedYouTubeAnalysisTool] = None,
+        stage_cache: Optional[StageCache] = None
+    ):
         # Initialize tools
-        self.research_tool = PerplexityResearchTool()
-        self.youtube_tool = EnhancedYouTubeAnalysisTool()
+        self.research_tool = research_tool or PerplexityResearchTool()
+        self.youtube_tool = youtube_tool or EnhancedYouTubeAnalysisTool()
+        
+        # Synthesis and questions are single structured calls, they need no ReAct loop or history
+        self.completion = OneShotCompletion(system_prompt="You are an analyst combining web research and video analyses.")
         
-        # Initialize base agent with our tools
-        self.agent = AgentPro(tools=[
-            self.research_tool,
-            self.youtube_tool
-        ])
+        # Stage outputs are cached by their inputs, so a rerun only recomputes what changed
+        self.stage_cache = stage_cache if stage_cache is not None else StageCache()
+        self.graph = self._build_graph()
 
-    async def analyze_topic(self, topic: str) -> AnalysisResult:
+    async def analyze_topic(
+        self,
+        topic: str,
+        depth: str = "deep",
+        on_event: Optional[Callable[[str, Any], None]] = None
+    ) -> AnalysisResult:
         """
         Perform comprehensive analysis of a topic
         Args:
             topic: The topic or situation to analyze
+            depth: Research depth, "quick" or "deep"
+            on_event: Called as on_event(name, data) as the analysis progresses: "<stage>_started"
+                and "<stage>_done" for every stage, "research_partial" snapshots, "video_done"
+                per analyzed video (cached ones included) and "synthesis_token" as the synthesis streams in
         Returns:
             AnalysisResult containing all findings and insights
         """
         try:
-            # Step 1: Perform deep research
-            research_results = await self._conduct_research(topic)
-            
-            # Step 2: Analyze relevant videos
-            video_results = await self._analyze_videos(topic, research_results)
-            
-            # Step 3: Synthesize findings
-            combined_analysis = await self._synthesize_findings(
-                topic,
-                research_results,
-                video_results
-            )
-            
-            # Step 4: Generate follow-up questions
-            suggested_questions = await self._generate_questions(
-                topic,
-                research_results,
-                video_results
-            )
+            run = await self.graph.run(on_event=on_event, topic=topic, depth=depth)
+            outputs = run.outputs
             
             return AnalysisResult(
                 topic=topic,
-                research_findings=research_results,
-                video_insights=video_results,
-                combined_analysis=combined_analysis,
-                suggested_questions=suggested_questions
+                research_findings=outputs["research"],
+                video_insights=outputs["videos"],
+                combined_analysis=outputs["synthesis"],
+                suggested_questions=outputs["questions"],
+                timings=run.timings,
+                cached_stages=run.cached
             )
 
         except Exception as e:
             raise Exception(f"Error in Ariel View analysis: {str(e)}")
 
-    async def _conduct_research(self, topic: str) -> ResearchResponse:
-        """Perform deep research using Perplexity"""
-        return await self.research_tool.run(topic)
+    def _build_graph(self) -> StageGraph:
+        """
+        The analysis pipeline as a stage graph: video search starts on the raw topic while research
+        runs, each selected video is analyzed as soon as selection is done, and synthesis and
+        questions run together once the videos are in
+        """
+        return StageGraph([
+            Stage("research", self._conduct_research, inputs=["topic", "depth"], ttl=self.search_ttl, publish=True),
+            Stage("candidates", self._prefetch_candidates, inputs=["topic"], ttl=self.search_ttl),
+            Stage("selected", self._select_videos, inputs=["topic", "research", "candidates"], cache=False),
+            Stage("videos", self._analyze_selected, inputs=["selected"], each="selected",
+                  version=self.youtube_tool.analysis_version(), ttl=self.video_ttl, item_event="video_done"),
+            Stage("synthesis", self._synthesize_findings, inputs=["topic", "research", "videos"], publish=True),
+            Stage("questions", self._generate_questions, inputs=["topic", "research", "videos"], publish=True)
+        ], max_concurrency=self.stage_concurrency, cache=self.stage_cache)
+
+    async def _conduct_research(self, topic: str, depth: str = "deep") -> ResearchResponse:
+        """Perform research using Perplexity"""
+        if emitting() and self.research_tool.use_cache and self.research_tool.cache is not None:
+            # Stream partial research to listeners, the full result below then comes from the cache
+            try:
+                async for partial in self.research_tool.astream(topic, depth=depth):
+                    emit("research_partial", partial)
+            except Exception as e:
+                print(f"Research stream failed, waiting for the full answer: {str(e)}")
+        result = await self.research_tool.arun(topic, depth=depth)
+        if "error" in result:
+            raise Exception(f"Research failed: {result['error']}")
+        return self.research_tool.research_response(result)
 
-    async def _analyze_videos(
+    async def _prefetch_candidates(self, topic: str) -> Optional[List[Dict[str, Any]]]:
+        """Search videos on the raw topic, research only refines the query"""
+        if not self.speculative_videos:
+            return None
+        try:
+            return await self.youtube_tool.prefetch_candidates(topic)
+        except Exception as e:
+            # Speculation is only an optimization, selection falls back to a regular search
+            print(f"Video prefetch failed: {str(e)}")
+            return None
+
+    async def _select_videos(
         self,
         topic: str,
-        research: ResearchResponse
-    ) -> List[VideoAnalysis]:
-        """Analyze relevant YouTube videos"""
+        research: ResearchResponse,
+        candidates: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Pick the videos to analyze, re-ranking speculatively prefetched candidates if given"""
         # Use research findings to enhance video search
         enhanced_query = self._enhance_video_query(topic, research)
-        return await self.youtube_tool.run(enhanced_query)
+        # The insights in the query change between runs, the raw topic keeps the stored analyses
+        return await self.youtube_tool.select_videos(enhanced_query, candidates=candidates, topic=topic)
+
+    async def _analyze_selected(self, selected: Dict[str, Any]) -> Optional[VideoAnalysis]:
+        """Analyze one selected video"""
+        analysis = await self.youtube_tool.analyze_selected(selected)
+        if analysis is not None and not (analysis.transcript_summary or analysis.key_points):
+            # An empty analysis is dropped, not cached for the video's whole TTL
+            return None
+        return analysis
+
+    async def stream_video_insights(
+        self,
+        topic: str,
+        research: ResearchResponse,
+        include_segments: bool = False
+    ) -> AsyncIterator[Union[VideoAnalysis, SegmentUpdate]]:
+        """Yield each video analysis as soon as it completes, for incremental rendering"""
+        enhanced_query = self._enhance_video_query(topic, research)
+        async for update in self.youtube_tool.stream(enhanced_query, include_segments, topic=topic):
+            yield update
 
     async def _synthesize_findings(
         self,
@@ -96,19 +176,22 @@ class ArielViewAgent:
         Video Insights:
         {[video.transcript_summary for video in videos]}
         
+        Key Points Across Videos:
+        {self._consolidate_video_key_points(videos)}
+        
         Provide:
         1. Overall narrative
         2. Key themes
-        3. Potential implications
-        4. Areas of consensus
-        5. Areas of debate
-        6. Data points and statistics
+        3. Key findings
+        4. Potential implications
+        5. Areas of consensus
+        6. Areas of debate
+        7. Data points and statistics
+        8. Recommendations
         """
         
-        # Use the agent's LLM to synthesize
-        synthesis = await self.agent.run(synthesis_prompt)
-        
-        return synthesis
+        synthesis = await self._complete(synthesis_prompt, Synthesis, token_event="synthesis_token")
+        return synthesis.model_dump()
 
     async def _generate_questions(
         self,
@@ -122,6 +205,15 @@ class ArielViewAgent:
         follow-up questions that would help deepen understanding or explore
         important aspects not fully covered in the current analysis.
         
+        Research Summary:
+        {research.summary}
+        
+        Key Research Insights:
+        {research.key_insights}
+        
+        Topics Covered by Videos:
+        {sorted({key_topic for video in videos for key_topic in video.key_topics})}
+        
         Consider:
         - Gaps in current research
         - Emerging trends
@@ -130,8 +222,37 @@ class ArielViewAgent:
         - Technical and non-technical aspects
         """
         
-        questions = await self.agent.run(question_prompt)
-        return questions
+        questions = await self._complete(question_prompt, FollowUpQuestions)
+        return [question.strip() for question in questions.questions if question.strip()]
+
+    async def _complete(self, prompt: str, schema: Type[BaseModel], token_event: Optional[str] = None) -> BaseModel:
+        """
+        One stateless LLM call whose JSON reply is validated into schema
+        Args:
+            prompt: The full prompt, the call sees no earlier turns
+            schema: Pydantic model the reply must match
+            token_event: When set and the run has listeners, stream the reply, emitting each delta under this name
+        """
+        if token_event is None or not emitting():
+            return await self.completion.acomplete(prompt, schema)
+        deltas = []
+        async for delta in self.completion.astream(prompt, schema):
+            deltas.append(delta)
+            emit(token_event, delta)
+        return self.completion.parse("".join(deltas), schema)
+
+    def _consolidate_video_key_points(self, videos: List[VideoAnalysis]) -> List[str]:
+        """Merge near-duplicate key points across videos, noting which videos raised each one"""
+        points, sources = [], []
+        for video in videos:
+            for point in video.key_points:
+                points.append(point)
+                sources.append(video.title)
+        consolidated = []
+        for point, members in consolidate(points):
+            titles = list(dict.fromkeys(sources[i] for i in members))
+            consolidated.append(f"{point} (raised in {len(titles)} video(s): {', '.join(titles)})")
+        return consolidated
 
     def _enhance_video_query(
         self,
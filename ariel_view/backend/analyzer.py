@@ -1,29 +1,101 @@
-from typing import Dict, Any
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import os
+import sys
+import time
+import requests
 from tools.perplexity_tool import PerplexityResearchTool
 
+# The full pipeline lives in the ariel_view package around this backend
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
 class TopicAnalyzer:
     def __init__(self):
         self.research_tool = PerplexityResearchTool()
 
-    def analyze_topic(self, topic: str, depth: str = "quick") -> Dict[str, Any]:
+    def analyze_topic(
+        self,
+        topic: str,
+        depth: str = "quick",
+        on_event: Optional[Callable[..., None]] = None
+    ) -> Dict[str, Any]:
         """
         Analyze a topic using the Perplexity API
         Args:
             topic: Topic to analyze
-            depth: Analysis depth ('quick' or 'deep')
+            depth: Analysis depth ('quick' or 'deep'), quick uses a fast model under a
+                tight latency budget and prefers cached results
+            on_event: Called as on_event(name, data) with "research_started", each partial
+                research snapshot ("research_partial") and "research_done" ({"seconds", "cached", "output"}),
+                the same events the full pipeline reports for its research stage
         Returns:
-            Dict containing the API response
+            Dict containing the API response and a "timings" entry with the seconds spent
         """
-        print(f"Analyzing topic: {topic}")
+        print(f"Analyzing topic: {topic} ({depth})")
+        started = time.monotonic()
 
         try:
-            # Get research results directly from the API
+            if on_event:
+                on_event("research_started", {"topic": topic, "depth": depth})
+                self._stream_research(topic, depth, on_event)
+            
+            # Get research results directly from the API, a cache hit when the stream already ran
             print("Calling Perplexity API...")
-            research = self.research_tool.run(topic)
+            research = self.research_tool.run(topic, depth=depth)
             print(f"Research results: {research}")
+            research["timings"] = {
+                "depth": depth,
+                "research_seconds": research.get("elapsed_seconds"),
+                "total_seconds": round(time.monotonic() - started, 3)
+            }
+            if on_event:
+                on_event("research_done", {
+                    "seconds": research["timings"]["total_seconds"],
+                    "cached": research.get("cached", False),
+                    "output": research
+                })
             return research
 
         except Exception as e:
             print(f"Error in research analysis: {str(e)}")
             return {"error": str(e)}
 
+    def analyze_with_videos(
+        self,
+        topic: str,
+        depth: str = "quick",
+        on_event: Optional[Callable[..., None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run the full Ariel View pipeline: research, video analysis, synthesis and questions
+        Args:
+            topic: Topic to analyze
+            depth: Research depth ('quick' or 'deep')
+            on_event: Passed on to ArielViewAgent.analyze_topic, see there for the events
+        Returns:
+            The AnalysisResult as a JSON-ready dict
+        Raises:
+            Exception if any stage fails
+        """
+        from ariel_view.ariel_agent import ArielViewAgent
+        
+        # One agent per job: its async clients belong to the event loop of this worker's run. The
+        # research tool (and its process-wide cache) is shared, so identical queries of concurrent
+        # jobs wait on one upstream call instead of each making their own
+        agent = ArielViewAgent(research_tool=self.research_tool)
+        result = asyncio.run(agent.analyze_topic(topic, depth, on_event=on_event))
+        return result.model_dump(mode="json")
+
+    def _stream_research(self, topic: str, depth: str, on_event: Callable[..., None]):
+        # Partial results need the streaming API; without the cache the final
+        # run() would repeat the request, so only stream when it can reuse it
+        if not self.research_tool.use_cache or self.research_tool.cache is None:
+            return
+        try:
+            for partial in self.research_tool.stream(topic, depth=depth):
+                on_event("research_partial", partial.model_dump())
+        except requests.exceptions.Timeout:
+            # The depth's latency budget is spent, a second request would only overrun it further
+            raise
+        except Exception as e:
+            print(f"Research stream failed, waiting for the full answer: {str(e)}")
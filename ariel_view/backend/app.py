@@ -1,12 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
 import os
-from analyzer import TopicAnalyzer
+import time
 
-# Load environment variables from .env file
+# Load environment variables from .env file before the tools read them at import time
 from dotenv import load_dotenv
 load_dotenv()
 
+from analyzer import TopicAnalyzer
+from job_queue import JobQueue
+
 # Validate required API keys are set
 required_keys = ['OPENAI_API_KEY', 'TRAVERSAAL_ARES_API_KEY', 'PERPLEXITY_API_KEY']
 for key in required_keys:
@@ -32,16 +36,56 @@ CORS(app, resources={
 # Initialize analyzer
 analyzer = TopicAnalyzer()
 
+SSE_POLL_INTERVAL = 0.25  # seconds between checks for new job events
+SSE_KEEPALIVE = 15.0  # seconds of silence before a comment line keeps proxies from closing the stream
+
+def run_analysis_job(payload, report):
+    """
+    Job handler: analyze the queued topic, logging each stage event and keeping the
+    results gathered so far ({"research", "videos", "synthesis", "questions"}) as the job's partial result
+    """
+    progress = {}
+
+    def on_event(event, data=None):
+        changed = True
+        if event == 'research_partial':
+            progress['research'] = data
+        elif event == 'video_done':
+            progress.setdefault('videos', []).append(data)
+        elif event.endswith('_done') and isinstance(data, dict) and 'output' in data:
+            progress[event[:-len('_done')]] = data['output']
+        else:
+            changed = False
+        report(event, data, partial=dict(progress) if changed else None)
+
+    if payload.get('videos'):
+        return analyzer.analyze_with_videos(payload['topic'], payload['depth'], on_event=on_event)
+    result = analyzer.analyze_topic(payload['topic'], payload['depth'], on_event=on_event)
+    if 'error' in result:
+        raise Exception(f"Analysis failed: {result['error']}")
+    return result
+
+# Analyses run on a pool of workers (ARIEL_JOB_WORKERS) fed from a persistent SQLite queue.
+# The workers start with the app, so jobs queued before a restart resume and stale leases are
+# reclaimed without waiting for a new submission; under the debug reloader only the serving
+# child process (WERKZEUG_RUN_MAIN) runs jobs, never the watching parent
+jobs = JobQueue(run_analysis_job)
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    jobs.start()
+
 @app.route('/api/analyze', methods=['POST', 'OPTIONS'])
 def analyze_topic():
     """
-    Analyze a topic using Ariel View
+    Queue a topic for analysis with Ariel View
     Expects JSON: {
         "topic": "Topic to analyze",
         "options": {
-            "depth": "deep" | "quick"  # Optional: analysis depth
+            "depth": "deep" | "quick",  # Optional: analysis depth
+            "videos": true | false  # Optional: run the full pipeline with video analysis, synthesis and questions
         }
     }
+    Returns 202 with {"job_id": ..., "status": "queued"}, poll GET /api/jobs/<job_id> for the result
+    or follow GET /api/jobs/<job_id>/events.
     Maximum 8 videos will be returned by default.
     """
     if request.method == 'OPTIONS':
@@ -59,26 +103,78 @@ def analyze_topic():
 
         options = data.get('options', {})
         depth = options.get('depth', 'quick')
-        print(f"Analyzing topic: {topic} with depth: {depth}")
-
-        # Analyze the topic
-        try:
-            raw_result = analyzer.analyze_topic(topic, depth)
-            print("Analysis completed successfully")
-        except Exception as analysis_error:
-            print(f"Analysis error: {str(analysis_error)}")
-            return jsonify({'error': f'Analysis failed: {str(analysis_error)}'}), 500
-
-        # Just return the raw result
-        result = raw_result
+        if depth not in ('quick', 'deep'):
+            return jsonify({'error': "options.depth must be 'quick' or 'deep'"}), 400
+        print(f"Queueing topic: {topic} with depth: {depth}")
 
-        print("Sending response:", result)
-        return jsonify(result)
+        job_id = jobs.submit({'topic': topic, 'depth': depth, 'videos': bool(options.get('videos', False))})
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202
 
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Status of an analysis job: "queued", "running", "done" or "failed", with the latest
+    partial result while it runs and the final result (or error) once it has finished
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'topic': job['payload']['topic'],
+        'depth': job['payload']['depth'],
+        'partial': job['partial'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    })
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Server-sent events of an analysis job as it runs. Each event is named after the stage event
+    (research_started, research_partial, research_done, video_done, synthesis_token, ...) and
+    carries its JSON data; the stream ends with "done" or "failed". Reconnecting clients resume
+    after the Last-Event-ID header, or an ?after=<event id> parameter.
+    """
+    if jobs.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID and after must be event ids (integers)'}), 400
+
+    def generate():
+        last_seq, idle = after, 0.0
+        while True:
+            events = jobs.events(job_id, after=last_seq)
+            for event in events:
+                last_seq = event['seq']
+                yield f"id: {last_seq}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                if event['event'] in ('done', 'failed'):
+                    return
+            if events:
+                idle = 0.0
+                continue
+            if jobs.get(job_id)['status'] in ('done', 'failed') and not jobs.events(job_id, after=last_seq):
+                # Finished without a closing event, e.g. given up on after repeated restarts
+                return
+            if idle >= SSE_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            time.sleep(SSE_POLL_INTERVAL)
+            idle += SSE_POLL_INTERVAL
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
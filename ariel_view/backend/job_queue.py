@@ -0,0 +1,297 @@
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+
+DEFAULT_JOB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ariel_view", "jobs.sqlite3")
+DEFAULT_WORKERS = 2
+DEFAULT_LEASE = 60.0
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_FLUSH_EVENTS = 64
+
+# handler(payload, report) -> result; report(event, data=None, partial=None) logs an event and,
+# when partial is given, makes it the job's latest partial result
+JobHandler = Callable[[Dict[str, Any], Callable[..., None]], Any]
+
+
+class _EventBuffer:
+    """Events a running job reported that are not written yet, with its latest partial result"""
+
+    def __init__(self):
+        self.lock = threading.Lock()  # held while flushing, so batches are written in order
+        self.events = []  # (event, encoded data, created_at)
+        self.partial = None
+
+
+class JobQueue:
+    """
+    Durable job queue in SQLite, drained by a pool of worker threads. Every job keeps its status,
+    an ordered event log with the partial results its handler reports, and the final result or error.
+    A running job is leased to the queue that claimed it and kept alive by its heartbeat; any queue
+    sharing the file requeues it once the lease runs out, i.e. when its owner has died.
+    Events of a running job are buffered and written in batches, so streamed tokens don't each
+    take the write lock that workers need for their claims and heartbeats.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        path: Optional[str] = None,
+        workers: Optional[int] = None,
+        poll_interval: float = 0.5,
+        max_attempts: int = 3,
+        lease: float = DEFAULT_LEASE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        flush_events: int = DEFAULT_FLUSH_EVENTS
+    ):
+        """
+        Args:
+            handler: Runs one job, raising marks it failed
+            path: SQLite file, ARIEL_JOB_DB_PATH or ~/.cache/ariel_view/jobs.sqlite3 by default
+            workers: Worker threads, ARIEL_JOB_WORKERS or 2 by default
+            poll_interval: Seconds an idle worker waits before checking the queue again
+            max_attempts: Runs a job gets before one interrupted by a restart counts as failed
+            lease: Seconds without a heartbeat after which a running job's owner counts as dead
+            flush_interval: Longest a reported event waits in the buffer before it is written
+            flush_events: Buffered events that trigger a write right away
+        """
+        self.handler = handler
+        self.path = os.path.expanduser(path or os.environ.get("ARIEL_JOB_DB_PATH", DEFAULT_JOB_PATH))
+        self.workers = workers or int(os.environ.get("ARIEL_JOB_WORKERS", DEFAULT_WORKERS))
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._buffers: Dict[str, _EventBuffer] = {}  # job id -> unwritten events, for jobs running here
+        # Autocommit, claims take an explicit write lock so several processes can share the file
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    partial TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )""")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    # Files written before jobs were leased
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    data TEXT,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                )""")
+
+    def start(self):
+        """Start the workers and their heartbeat; a no-op once started"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            for target, name in ((self._heartbeat, "job-heartbeat"), (self._flush_periodically, "job-event-flusher")):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the workers after their current job"""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """
+        Queue a job
+        Args:
+            payload: JSON-serializable job input, passed to the handler
+        Returns:
+            The job id
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(payload), time.time()))
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        A job's current state
+        Returns:
+            Dict with id, status ("queued", "running", "done" or "failed"), payload, the latest
+            partial result, the final result or error and timestamps; None for an unknown id
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, payload, partial, result, error, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "status", "payload", "partial", "result", "error", "attempts", "created_at", "started_at", "finished_at")
+        job = dict(zip(keys, row))
+        for key in ("payload", "partial", "result"):
+            job[key] = json.loads(job[key]) if job[key] is not None else None
+        return job
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Events a job reported, in order, starting after sequence number `after`"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event, data, created_at FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)).fetchall()
+        return [{"seq": seq, "event": event, "data": json.loads(data) if data is not None else None, "created_at": created_at}
+                for seq, event, data, created_at in rows]
+
+    def _requeue_abandoned(self, now: float):
+        # Running jobs whose owner stopped heartbeating died with it: run them again, or give up
+        stale = "status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ?"
+        self._conn.execute(
+            f"UPDATE jobs SET status = 'failed', error = 'Interrupted too many times', finished_at = ? "
+            f"WHERE {stale} AND attempts >= ?", (now, now - self.lease, self.max_attempts))
+        self._conn.execute(f"UPDATE jobs SET status = 'queued', owner = NULL WHERE {stale}", (now - self.lease,))
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        # Oldest queued job, leased to this queue under a write lock so no other worker takes it too
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._requeue_abandoned(now)
+                row = self._conn.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ?, "
+                        "owner = ?, heartbeat_at = ? WHERE id = ?",
+                        (now, self.owner, now, row[0]))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"id": row[0], "payload": json.loads(row[1])} if row else None
+
+    def _report(self, job_id: str, event: str, data: Any = None, partial: Any = None):
+        # Buffered while the job runs here, written right away otherwise (started, done, failed)
+        encoded = json.dumps(data, default=str) if data is not None else None
+        buffer = self._buffers.get(job_id)
+        if buffer is None:
+            self._write_events(job_id, [(event, encoded, time.time())], partial)
+            return
+        with buffer.lock:
+            buffer.events.append((event, encoded, time.time()))
+            if partial is not None:
+                buffer.partial = partial
+            full = len(buffer.events) >= self.flush_events
+        if full:
+            self._flush(buffer, job_id)
+
+    def _flush(self, buffer: _EventBuffer, job_id: str):
+        with buffer.lock:
+            if buffer.events or buffer.partial is not None:
+                self._write_events(job_id, buffer.events, buffer.partial)
+                buffer.events, buffer.partial = [], None
+
+    def _write_events(self, job_id: str, events: List[Any], partial: Any = None):
+        # One write transaction per batch: the events get consecutive sequence numbers
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM job_events WHERE job_id = ?", (job_id,)).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT INTO job_events VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, seq + i, event, encoded, created_at) for i, (event, encoded, created_at) in enumerate(events, 1)])
+                if partial is not None:
+                    self._conn.execute("UPDATE jobs SET partial = ? WHERE id = ?", (json.dumps(partial, default=str), job_id))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _flush_periodically(self):
+        # Bounds how long a buffered event waits when the job reports nothing more for a while
+        while not self._stopping.wait(self.flush_interval):
+            for job_id, buffer in list(self._buffers.items()):
+                self._flush(buffer, job_id)
+
+    def _heartbeat(self):
+        # Renew the lease of every job this queue runs, well before it would run out
+        while not self._stopping.wait(self.lease / 3):
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'", (time.time(), self.owner))
+
+    def _finish(self, job_id: str, result: Any = None, error: Optional[str] = None):
+        status = "failed" if error is not None else "done"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result, default=str) if error is None else None, error, time.time(), job_id))
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._report(job["id"], "started")
+            buffer = self._buffers[job["id"]] = _EventBuffer()
+            try:
+                result = self.handler(job["payload"], lambda event, data=None, partial=None: self._report(job["id"], event, data, partial))
+            except Exception as e:
+                print(f"Job {job['id']} failed: {str(e)}")
+                self._close_buffer(buffer, job["id"])
+                self._finish(job["id"], error=str(e))
+                self._report(job["id"], "failed", {"error": str(e)})
+            else:
+                # Write everything reported, then finish, so whoever sees the last event also finds the result
+                self._close_buffer(buffer, job["id"])
+                self._finish(job["id"], result)
+                self._report(job["id"], "done")
+
+    def _close_buffer(self, buffer: _EventBuffer, job_id: str):
+        del self._buffers[job_id]
+        self._flush(buffer, job_id)
+
+    def close(self):
+        self.stop()
+        self._conn.close()
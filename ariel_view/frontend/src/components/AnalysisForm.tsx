@@ -41,17 +41,76 @@ interface AnalysisFormProps {
   onAnalysisComplete: (data: AnalysisData) => void;
 }
 
+// Stage events that change what the user sees while a job runs
+const STAGE_LABELS: Record<string, string> = {
+  started: 'Started',
+  research_started: 'Researching',
+  research_done: 'Research done',
+  video_done: 'Video analyzed',
+  synthesis_done: 'Synthesis done',
+  questions_done: 'Questions ready'
+};
+
 export const AnalysisForm: React.FC<AnalysisFormProps> = ({ onAnalysisComplete }) => {
   const [topic, setTopic] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState('');
+  const [stage, setStage] = useState('');
+  const [partialSummary, setPartialSummary] = useState('');
 
   const API_URL = 'http://127.0.0.1:5003';
+  const JOB_TIMEOUT_MS = 15 * 60 * 1000;  // give up on an analysis after 15 minutes
+
+  // Follow the job's server-sent events until it finishes; EventSource reconnects on its own,
+  // resuming after the last event it saw
+  const followJob = (jobId: string): Promise<AnalysisData> =>
+    new Promise((resolve, reject) => {
+      const source = new EventSource(`${API_URL}/api/jobs/${jobId}/events`);
+      const finish = async () => {
+        source.close();
+        clearTimeout(timer);
+        try {
+          const job = await axios.get(`${API_URL}/api/jobs/${jobId}`);
+          if (job.data.status === 'done') {
+            resolve(job.data.result);
+          } else {
+            reject(new Error(job.data.error || 'Analysis failed'));
+          }
+        } catch (err) {
+          reject(err);
+        }
+      };
+      const timer = setTimeout(() => {
+        source.close();
+        reject(new Error(`Analysis did not finish within ${JOB_TIMEOUT_MS / 60000} minutes (job ${jobId})`));
+      }, JOB_TIMEOUT_MS);
+
+      Object.entries(STAGE_LABELS).forEach(([event, label]) =>
+        source.addEventListener(event, () => setStage(label)));
+      source.addEventListener('research_partial', (e) => {
+        setPartialSummary(JSON.parse((e as MessageEvent).data).summary || '');
+      });
+      source.addEventListener('done', finish);
+      source.addEventListener('failed', finish);
+      source.onerror = async () => {
+        // The stream also ends without a closing event for jobs given up on after restarts
+        try {
+          const job = await axios.get(`${API_URL}/api/jobs/${jobId}`);
+          if (job.data.status === 'done' || job.data.status === 'failed') {
+            finish();
+          }
+        } catch {
+          // Backend unreachable, EventSource keeps retrying until the deadline
+        }
+      };
+    });
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setIsLoading(true);
     setError('');
+    setStage('');
+    setPartialSummary('');
 
     try {
       console.log('Making API request to:', `${API_URL}/api/analyze`);
@@ -59,8 +118,9 @@ export const AnalysisForm: React.FC<AnalysisFormProps> = ({ onAnalysisComplete }
         topic,
         options: { depth: 'quick' }
       });
-      console.log('API response:', response.data);
-      onAnalysisComplete(response.data);
+      const result = await followJob(response.data.job_id);
+      console.log('API response:', result);
+      onAnalysisComplete(result);
     } catch (err) {
       console.error('API error:', err);
       setError(err instanceof Error ? err.message : 'An error occurred');
@@ -84,6 +144,8 @@ export const AnalysisForm: React.FC<AnalysisFormProps> = ({ onAnalysisComplete }
           {isLoading ? 'Analyzing...' : 'Analyze'}
         </button>
       </form>
+      {isLoading && stage && <div style={{ marginTop: '10px' }}>{stage}...</div>}
+      {isLoading && partialSummary && <p style={{ marginTop: '10px', color: '#555' }}>{partialSummary}</p>}
       {error && <div style={{ color: 'red', marginTop: '10px' }}>{error}</div>}
     </div>
   );
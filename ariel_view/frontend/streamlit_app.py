@@ -1,6 +1,47 @@
 import streamlit as st
 import requests
 import json
+import time
+
+API_URL = "http://127.0.0.1:5003"
+JOB_TIMEOUT = 900  # seconds to wait for an analysis before giving up
+
+def follow_job(job_id, on_event):
+    """
+    Follow a job's server-sent events until it finishes, reconnecting after the last event seen
+    when the connection drops; on_event(name, data) gets every event before the final one.
+    Returns the finished job, raises TimeoutError once JOB_TIMEOUT has passed
+    """
+    deadline = time.monotonic() + JOB_TIMEOUT
+    last_id = None
+    while time.monotonic() < deadline:
+        headers = {"Last-Event-ID": last_id} if last_id else {}
+        try:
+            # The server sends a keep-alive comment at least every 15 seconds
+            with requests.get(f"{API_URL}/api/jobs/{job_id}/events", headers=headers, stream=True, timeout=(5, 30)) as response:
+                response.raise_for_status()
+                event, data = None, []
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("id:"):
+                        last_id = line[len("id:"):].strip()
+                    elif line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data.append(line[len("data:"):].strip())
+                    elif not line and event:
+                        if event in ("done", "failed"):
+                            break
+                        on_event(event, json.loads("\n".join(data)) if data else None)
+                        event, data = None, []
+                    if time.monotonic() >= deadline:
+                        break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            pass  # reconnect below, resuming after the last event
+        job = requests.get(f"{API_URL}/api/jobs/{job_id}", timeout=30).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(1)
+    raise TimeoutError(f"Analysis did not finish within {JOB_TIMEOUT} seconds (job {job_id})")
 
 st.title("Xi Jinping Network Analysis")
 
@@ -13,11 +54,28 @@ if st.button("Analyze"):
             try:
                 # Make request to backend
                 response = requests.post(
-                    "http://127.0.0.1:5003/api/analyze",
-                    json={"topic": topic, "options": {"depth": "quick"}}
+                    f"{API_URL}/api/analyze",
+                    json={"topic": topic, "options": {"depth": "quick"}},
+                    timeout=30
                 )
                 response.raise_for_status()
-                data = response.json()
+                job_id = response.json()["job_id"]
+
+                # The analysis runs as a background job, show its progress as it streams in
+                status = st.empty()
+                preview = st.empty()
+
+                def show(event, data):
+                    status.caption(f"{event.replace('_', ' ')}...")
+                    if event == "research_partial" and data.get("summary"):
+                        preview.markdown(data["summary"])
+
+                job = follow_job(job_id, show)
+                status.empty()
+                preview.empty()
+                if job["status"] == "failed":
+                    raise Exception(job["error"])
+                data = job["result"]
 
                 # Display results
                 st.subheader("Research Summary")
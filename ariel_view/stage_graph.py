@@ -0,0 +1,265 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+from contextvars import ContextVar
+from pydantic import BaseModel
+from pydantic_core import to_jsonable_python
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+DEFAULT_STAGE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ariel_view", "stages.sqlite3")
+
+# on_event callback of the graph run the current task belongs to
+_event_sink: ContextVar[Optional[Callable[[str, Any], None]]] = ContextVar("stage_event_sink", default=None)
+
+
+def emit(event: str, data: Any = None):
+    """Report progress from inside a stage to the running graph's on_event, if it has one"""
+    sink = _event_sink.get()
+    if sink is not None:
+        sink(event, to_jsonable_python(data, fallback=str))
+
+
+def emitting() -> bool:
+    """Whether anyone listens to emit, so stages can skip work done only for progress reports"""
+    return _event_sink.get() is not None
+
+
+def _canonical(value: Any) -> Any:
+    # JSON-friendly view of a stage input, stable across processes
+    if isinstance(value, BaseModel):
+        return _canonical(value.model_dump())
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return hashlib.sha256(value.tobytes()).hexdigest()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "__dict__"):
+        return {"__type__": type(value).__name__, **_canonical(vars(value))}
+    return repr(value)
+
+
+def fingerprint(*values: Any) -> str:
+    """Hash of stage inputs; equal inputs give equal fingerprints"""
+    return hashlib.sha256(json.dumps(_canonical(list(values)), default=repr).encode("utf-8")).hexdigest()
+
+
+def _source_version(func: Callable) -> str:
+    # Editing a stage's code (its prompt, for instance) invalidates only that stage's cache
+    try:
+        return hashlib.sha256(inspect.getsource(func).encode("utf-8")).hexdigest()[:16]
+    except (OSError, TypeError):
+        return getattr(func, "__qualname__", repr(func))
+
+
+class Stage:
+    """
+    One step of a StageGraph
+    Args:
+        name: Name of the stage's output, what downstream stages list as input
+        func: Async callable taking the inputs as keyword arguments
+        inputs: Graph inputs or upstream stage names the stage needs
+        each: Name of an input to fan out over; func then gets one item at a time (under the same
+            keyword) and the stage's output is the list of non-None results, in order
+        cache: Whether outputs are cached by input fingerprint
+        version: Extra part of the cache key next to the hash of func's source code, e.g. the
+            configuration of a tool the stage calls, whose code the source hash doesn't cover
+        ttl: Seconds a cached output stays valid, None keeps it until the version changes
+        publish: Whether the stage's "<name>_done" event carries its output
+        item_event: For a fan-out stage, event emitted with each non-None result as soon as it
+            is available, whether computed or served from the cache
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        inputs: Iterable[str] = (),
+        each: Optional[str] = None,
+        cache: bool = True,
+        version: Optional[str] = None,
+        ttl: Optional[float] = None,
+        publish: bool = False,
+        item_event: Optional[str] = None
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.each = each
+        self.cache = cache
+        self.version = _source_version(func) + (f":{version}" if version else "")
+        self.ttl = ttl
+        self.publish = publish
+        self.item_event = item_event
+        if each is not None and each not in self.inputs:
+            raise ValueError(f"Stage '{name}' fans out over '{each}', which is not one of its inputs")
+        if item_event is not None and each is None:
+            raise ValueError(f"Stage '{name}' has an item_event but doesn't fan out")
+
+
+class StageCache:
+    """Pickled stage outputs in SQLite, keyed by stage name, version and input fingerprint"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.expanduser(path or os.environ.get("ARIEL_STAGE_CACHE_PATH", DEFAULT_STAGE_CACHE_PATH))
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS stage_outputs (
+                    stage TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    output BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL,
+                    PRIMARY KEY (stage, key)
+                )""")
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM stage_outputs WHERE stage = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (stage, key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, stage: str, key: str, output: Any, ttl: Optional[float] = None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stage_outputs VALUES (?, ?, ?, ?, ?)",
+                (stage, key, pickle.dumps(output), now, now + ttl if ttl is not None else None))
+
+    def clear(self, stage: Optional[str] = None):
+        with self._lock, self._conn:
+            if stage is None:
+                self._conn.execute("DELETE FROM stage_outputs")
+            else:
+                self._conn.execute("DELETE FROM stage_outputs WHERE stage = ?", (stage,))
+
+    def close(self):
+        self._conn.close()
+
+
+class GraphRun(BaseModel):
+    outputs: Dict[str, Any]
+    timings: Dict[str, float]  # stage -> seconds from its start to its output, plus the total
+    cached: List[str]  # stages (or "stage[i]" fan-out items) served from the cache
+
+
+class StageGraph:
+    """
+    Runs async stages as soon as their inputs are available, at most max_concurrency stage
+    calls at a time, caching outputs by the fingerprint of their inputs
+    """
+
+    def __init__(self, stages: List[Stage], max_concurrency: int = 4, cache: Optional[StageCache] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self._order = self._topological_order()
+
+    def _topological_order(self) -> List[Stage]:
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Stage graph has a cycle: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dependency in self.stages[name].inputs:
+                if dependency in self.stages:
+                    visit(dependency, path + [name])
+            state[name] = "done"
+            order.append(self.stages[name])
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    async def run(self, on_event: Optional[Callable[[str, Any], None]] = None, **inputs: Any) -> GraphRun:
+        """
+        Run every stage
+        Args:
+            on_event: Called as on_event(name, data) with "<stage>_started" and "<stage>_done"
+                for every stage, fan-out stages' item events, and whatever stages emit along
+                the way; data is JSON-ready
+            **inputs: Graph inputs, by the names stages list them under
+        Returns:
+            GraphRun with every stage's output, timings and cache hits
+        """
+        missing = {name for stage in self._order for name in stage.inputs
+                   if name not in self.stages and name not in inputs}
+        if missing:
+            raise ValueError(f"Missing graph inputs: {sorted(missing)}")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        timings, cached = {}, []
+        started = time.monotonic()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def call(stage, kwargs, label):
+            key = fingerprint(stage.version, kwargs)
+            output = None
+            if stage.cache and self.cache is not None:
+                output = await asyncio.to_thread(self.cache.get, stage.name, key)
+                if output is not None:
+                    cached.append(label)
+            if output is None:
+                async with semaphore:
+                    output = await stage.func(**kwargs)
+                if stage.cache and self.cache is not None and output is not None:
+                    await asyncio.to_thread(self.cache.put, stage.name, key, output, stage.ttl)
+            if stage.item_event and output is not None:
+                emit(stage.item_event, output)
+            return output
+
+        async def run_stage(stage):
+            kwargs = {name: await tasks[name] if name in tasks else inputs[name] for name in stage.inputs}
+            stage_started = time.monotonic()
+            emit(f"{stage.name}_started")
+            try:
+                if stage.each is None:
+                    output = await call(stage, kwargs, stage.name)
+                else:
+                    items = kwargs[stage.each] or []
+                    outputs = await asyncio.gather(*(
+                        call(stage, {**kwargs, stage.each: item}, f"{stage.name}[{i}]") for i, item in enumerate(items)
+                    ))
+                    output = [output for output in outputs if output is not None]
+            finally:
+                timings[stage.name] = round(time.monotonic() - stage_started, 3)
+            done = {"seconds": timings[stage.name], "cached": stage.name in cached}
+            if stage.publish:
+                done["output"] = output
+            emit(f"{stage.name}_done", done)
+            return output
+
+        # Tasks copy the current context, so stages and their subtasks see this run's sink
+        token = _event_sink.set(on_event)
+        try:
+            for stage in self._order:
+                tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+        finally:
+            _event_sink.reset(token)
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        timings["total"] = round(time.monotonic() - started, 3)
+        return GraphRun(outputs=dict(zip(tasks, results)), timings=timings, cached=cached)
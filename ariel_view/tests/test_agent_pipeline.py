@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# The agent only needs keys to construct its clients; no request is made in these tests
+os.environ.setdefault("OPENAI_API_KEY", "test_key_placeholder")
+os.environ.setdefault("PERPLEXITY_API_KEY", "test_key_placeholder")
+
+from agentpro import OneShotCompletion
+from ariel_view.ariel_agent import ArielViewAgent, FollowUpQuestions
+from ariel_view.stage_graph import StageCache
+from ariel_view.tools.enhanced_youtube_tool import VideoAnalysis
+from ariel_view.tools.perplexity_tool import PerplexityResearchTool
+
+RESEARCH = """Summary:
+Quantum error correction protects qubits.
+
+Key Insights:
+- Surface codes dominate
+- Logical qubits need many physical qubits
+"""
+
+
+class FakeResearchTool(PerplexityResearchTool):
+    """Answers research queries offline"""
+
+    def __init__(self):
+        self.cache = None
+        self.queries = []
+
+    async def arun(self, prompt, depth=None):
+        self.queries.append((prompt, depth))
+        await asyncio.sleep(0.05)
+        self.finished_at = time.monotonic()
+        return {"content": RESEARCH, "depth": depth}
+
+
+class FakeYouTubeTool:
+    """Returns one canned video analysis per query"""
+
+    def __init__(self):
+        self.queries = []
+        self.prefetched = []
+        self.analyzed = []
+        self.version = "v1"
+
+    def analysis_version(self):
+        return self.version
+
+    async def prefetch_candidates(self, query):
+        self.prefetched.append((query, time.monotonic()))
+        await asyncio.sleep(0.05)
+        return [{"video_id": "123", "title": "QEC explained"}]
+
+    async def select_videos(self, prompt, candidates=None, topic=None):
+        self.queries.append(prompt)
+        self.candidates = candidates
+        self.topic = topic
+        return [{"video_id": "123", "title": "QEC explained", "search_query": prompt, "topic": topic}]
+
+    async def analyze_selected(self, video):
+        self.analyzed.append(video["video_id"])
+        await asyncio.sleep(0.05)
+        return VideoAnalysis(video_id=video["video_id"], title=video["title"], channel="Physics Hub",
+                             transcript_summary="Surface codes", key_points=["Surface codes dominate"])
+
+
+async def stream_chunks(content, piece=9):
+    for start in range(0, len(content), piece):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[start:start + piece]))])
+
+
+def make_agent(tmp_path):
+    agent = ArielViewAgent(research_tool=FakeResearchTool(), youtube_tool=FakeYouTubeTool(),
+                           stage_cache=StageCache(str(tmp_path / "stages.sqlite3")))
+    agent.in_flight = agent.max_in_flight = 0
+    agent.requests = []
+
+    async def create(stream=False, **request):
+        # Stands in for the OpenAI chat completions endpoint
+        agent.requests.append(request)
+        agent.in_flight += 1
+        agent.max_in_flight = max(agent.max_in_flight, agent.in_flight)
+        await asyncio.sleep(0.1)
+        agent.in_flight -= 1
+        if "follow-up questions" in request["messages"][-1]["content"]:
+            reply = {"questions": ["Why do surface codes dominate?", " How many physical qubits are needed? "]}
+        else:
+            reply = {"narrative": "Surface codes are the leading approach.", "main_themes": ["Surface codes"]}
+        content = json.dumps(reply)
+        if stream:
+            return stream_chunks(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    agent.completion.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return agent
+
+
+def test_pipeline_runs_synthesis_and_questions_concurrently(tmp_path):
+    agent = make_agent(tmp_path)
+    result = asyncio.run(agent.analyze_topic("quantum error correction", depth="quick"))
+
+    assert agent.research_tool.queries == [("quantum error correction", "quick")]
+    assert agent.youtube_tool.queries[0].startswith("quantum error correction (Surface codes dominate")
+    assert agent.youtube_tool.topic == "quantum error correction"  # keys stored analyses, unlike the refined query
+    assert result.research_findings.key_insights == ["Surface codes dominate", "Logical qubits need many physical qubits"]
+    assert result.combined_analysis["narrative"] == "Surface codes are the leading approach."
+    assert result.combined_analysis["main_themes"] == ["Surface codes"] and result.combined_analysis["debates"] == []
+    assert result.suggested_questions == ["Why do surface codes dominate?", "How many physical qubits are needed?"]
+    assert agent.max_in_flight == 2
+
+    # One stateless JSON-mode call per language step, each carrying its own context
+    assert len(agent.requests) == 2
+    for request in agent.requests:
+        assert request["response_format"] == {"type": "json_object"}
+        assert [message["role"] for message in request["messages"]] == ["system", "system", "user"]
+        assert "Surface codes dominate" in request["messages"][-1]["content"]
+
+    assert set(result.timings) == {"candidates", "research", "selected", "videos", "synthesis", "questions", "total"}
+    # Video search overlapped research and the two language steps overlapped each other
+    assert result.timings["total"] < sum(value for stage, value in result.timings.items() if stage != "total") - 0.05
+    assert result.cached_stages == []
+
+
+def test_video_search_starts_while_research_runs(tmp_path):
+    agent = make_agent(tmp_path)
+    result = asyncio.run(agent.analyze_topic("quantum error correction"))
+
+    (query, started), = agent.youtube_tool.prefetched
+    assert query == "quantum error correction"
+    assert started < agent.research_tool.finished_at
+    assert agent.youtube_tool.candidates == [{"video_id": "123", "title": "QEC explained"}]
+    assert "candidates" in result.timings
+
+    agent = make_agent(tmp_path / "no_speculation")
+    agent.speculative_videos = False
+    asyncio.run(agent.analyze_topic("quantum error correction"))
+    assert agent.youtube_tool.prefetched == [] and agent.youtube_tool.candidates is None
+
+
+def test_rerun_after_prompt_change_reuses_upstream_stages(tmp_path):
+    agent = make_agent(tmp_path)
+    first = asyncio.run(agent.analyze_topic("quantum error correction"))
+    assert agent.youtube_tool.analyzed == ["123"]
+
+    # A new agent whose synthesis prompt differs, sharing the stage cache
+    agent = make_agent(tmp_path)
+
+    async def synthesize(topic, research, videos):
+        return {"narrative": await agent.completion.acomplete(f"Summarize {topic} in one line")}
+
+    agent._synthesize_findings = synthesize
+    agent.graph = agent._build_graph()
+    second = asyncio.run(agent.analyze_topic("quantum error correction"))
+
+    assert sorted(second.cached_stages) == ["candidates", "questions", "research", "videos[0]"]
+    assert agent.research_tool.queries == [] and agent.youtube_tool.prefetched == []
+    assert agent.youtube_tool.analyzed == []
+    assert second.video_insights == first.video_insights
+    assert second.suggested_questions == first.suggested_questions
+
+    # Reconfiguring the video tool (model, prompts, token budgets) invalidates its cached analyses
+    agent = make_agent(tmp_path)
+    agent.youtube_tool.version = "v2"
+    agent.graph = agent._build_graph()
+    third = asyncio.run(agent.analyze_topic("quantum error correction"))
+    assert "videos[0]" not in third.cached_stages and agent.youtube_tool.analyzed == ["123"]
+
+
+def test_analysis_reports_stage_events(tmp_path):
+    agent = make_agent(tmp_path)
+    events = []
+    result = asyncio.run(agent.analyze_topic("quantum error correction", on_event=lambda name, data: events.append((name, data))))
+
+    names = [name for name, _ in events]
+    assert names.index("research_started") < names.index("research_done") < names.index("video_done")
+    assert names.index("video_done") < names.index("synthesis_token") < names.index("synthesis_done")
+    assert dict(events)["research_done"]["output"]["key_insights"][0] == "Surface codes dominate"
+    assert dict(events)["video_done"]["video_id"] == "123"
+    # The synthesis streamed token by token, and the tokens add up to the parsed result
+    tokens = "".join(data for name, data in events if name == "synthesis_token")
+    assert json.loads(tokens)["narrative"] == result.combined_analysis["narrative"]
+    assert dict(events)["synthesis_done"]["output"] == result.combined_analysis
+    # Events are JSON-ready for whoever forwards them
+    json.dumps(events)
+
+    # A rerun served from the cache still reports every video
+    events.clear()
+    asyncio.run(agent.analyze_topic("quantum error correction", on_event=lambda name, data: events.append((name, data))))
+    assert agent.youtube_tool.analyzed == ["123"]
+    assert [data["video_id"] for name, data in events if name == "video_done"] == ["123"]
+
+
+def test_completion_rejects_replies_outside_the_schema():
+    completion = OneShotCompletion(client=SimpleNamespace(), async_client=SimpleNamespace(), model="test-model")
+    assert completion.parse('{"questions": ["Why?"]}', FollowUpQuestions).questions == ["Why?"]
+    assert completion.parse("  plain text ") == "plain text"
+    with pytest.raises(ValueError, match="FollowUpQuestions"):
+        completion.parse("1. Why?\n2. How?", FollowUpQuestions)
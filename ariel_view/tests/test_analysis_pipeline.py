@@ -0,0 +1,471 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# The tools only need a key to construct their clients; no request is made in these tests
+os.environ.setdefault("OPENAI_API_KEY", "test_key_placeholder")
+
+from agentpro.tools.near_duplicates import consolidate
+from agentpro.tools.transcript_index import format_timestamp
+from ariel_view.tools.analysis_state import AnalysisStateStore
+from ariel_view.tools.batch_analysis import BatchVideoAnalyzer, LocalBatchClient
+from ariel_view.tools.corpus_store import VideoCorpusStore
+from ariel_view.tools.enhanced_youtube_tool import EnhancedYouTubeAnalysisTool, SegmentUpdate, VideoAnalysis
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions, answering batched segment prompts offline"""
+
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        self.calls.append(prompt)
+        count = prompt.count("Segment ")
+        segments = [
+            {
+                "index": i,
+                "summary": f"summary {i}",
+                "key_points": [f"point {i}"],
+                "topics": ["testing"],
+                "speakers": {}
+            }
+            for i in range(count)
+        ]
+        segments.reverse()  # the order of the array must not matter when indices are given
+        message = SimpleNamespace(content=json.dumps({"segments": segments}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    """Async counterpart that records how many calls were in flight at once"""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return FakeCompletions.create(self, **kwargs)
+
+
+def timed_entries(sentences=400):
+    # Captions of three sentences each, 7.5 seconds apart
+    words = long_transcript(sentences).split(". ")
+    captions = [". ".join(words[i:i + 3]) for i in range(0, len(words), 3)]
+    return [{"text": caption, "start": i * 7.5, "duration": 7.5} for i, caption in enumerate(captions)]
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    # Tools open their default state store lazily from ARIEL_STATE_PATH, never the shared one in ~/.cache
+    monkeypatch.setenv("ARIEL_STATE_PATH", str(tmp_path / "default_state.sqlite3"))
+
+
+def make_tool():
+    tool = EnhancedYouTubeAnalysisTool()
+    tool.incremental = False
+    tool.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    tool.async_client = SimpleNamespace(chat=SimpleNamespace(completions=FakeAsyncCompletions()))
+    tool._get_transcript_entries = lambda video_id: timed_entries()
+    return tool
+
+
+def long_transcript(sentences=400):
+    return " ".join(f"Sentence {i} explains how quantum error correction protects qubits." for i in range(sentences))
+
+
+def test_segments_are_token_budgeted():
+    tool = make_tool()
+    tool.segment_tokens = 200
+    segments = tool._segment_transcript(long_transcript())
+    assert len(segments) > 1
+    assert all(segment.endswith(".") for segment in segments)
+    assert " ".join(segments) == long_transcript()
+
+
+def test_batched_analysis_keeps_segment_order():
+    tool = make_tool()
+    tool.segment_tokens = 200
+    tool.batch_tokens = 1000
+    segments = tool._segment_transcript(long_transcript())
+    analyses = []
+    for batch in tool._batch_segments(segments):
+        analyses.extend(tool._analyze_segment_batch(batch))
+    calls = tool.client.chat.completions.calls
+    assert len(analyses) == len(segments)
+    assert len(calls) < len(segments)
+    first_batch = tool._batch_segments(segments)[0]
+    assert [a["summary"] for a in analyses[:len(first_batch)]] == [f"summary {i}" for i in range(len(first_batch))]
+
+
+def test_run_is_bounded_by_one_semaphore():
+    tool = make_tool()
+    tool.segment_tokens = 200
+    tool.batch_tokens = 400
+    tool.max_concurrency = 3
+    results = asyncio.run(tool.run("quantum error correction"))
+    completions = tool.async_client.chat.completions
+    assert [video.video_id for video in results] == ["123", "456"]
+    assert len(completions.calls) > tool.max_concurrency
+    assert completions.max_in_flight == tool.max_concurrency
+
+
+def test_videos_analyzed_one_at_a_time_share_the_semaphore():
+    tool = make_tool()
+    tool.segment_tokens = 200
+    tool.batch_tokens = 400
+    tool.max_concurrency = 3
+    videos = [{"video_id": video_id, "title": "QEC", "channel": "Physics Hub", "search_query": "quantum error correction"}
+              for video_id in ("123", "456", "789")]
+
+    async def analyze_all():
+        return await asyncio.gather(*(tool.analyze_selected(video) for video in videos))
+
+    results = asyncio.run(analyze_all())
+    assert [video.video_id for video in results] == ["123", "456", "789"]
+    assert tool.async_client.chat.completions.max_in_flight == tool.max_concurrency
+
+    version = tool.analysis_version()
+    tool.segment_tokens = 300
+    assert tool.analysis_version() != version
+
+
+def test_ranking_keeps_only_relevant_candidates():
+    tool = make_tool()
+    tool.max_videos = 2
+    candidates = [
+        {"video_id": "a", "title": "Pasta recipes for beginners", "description": "cooking", "transcript": "boil water add salt"},
+        {"video_id": "b", "title": "Quantum error correction explained", "description": "qubits", "transcript": long_transcript(20)},
+        {"video_id": "c", "title": "Surface codes", "description": "quantum error correction basics", "transcript": "logical qubits"},
+        {"video_id": "d", "title": "Gardening tips", "description": "", "transcript": ""},
+    ]
+    ranked = tool._rank_candidates("quantum error correction", candidates)
+    assert [video["video_id"] for video in ranked] == ["b", "c"]
+    assert ranked[0]["relevance_score"] > ranked[1]["relevance_score"] > 0
+    assert candidates[0]["relevance_score"] == 0.0
+
+    # When nothing clears the threshold the best candidates are still analyzed, not none at all
+    off_topic = [dict(candidate, video_id=f"{candidate['video_id']}2") for candidate in (candidates[0], candidates[3])]
+    ranked = tool._rank_candidates("quantum error correction", off_topic)
+    assert [video["video_id"] for video in ranked] == ["a2", "d2"]
+    assert tool._rank_candidates("quantum error correction", off_topic, fallback=False) == []
+
+
+def test_timestamps_come_from_timed_entries():
+    tool = make_tool()
+    tool.segment_tokens = 200
+    index = tool._get_transcript_index("123")
+    segments = tool._segment_transcript(index.text)
+    analyses = [{"summary": f"part {i}"} for i in range(len(segments))]
+    timestamps = tool._generate_smart_timestamps(index, segments, analyses)
+    assert list(timestamps.values()) == [f"part {i}" for i in range(len(segments))]
+    assert list(timestamps)[0] == "0:00"
+    offsets = index.locate(segments)
+    assert all(offset is not None for offset in offsets)
+    expected = max(start for start, offset in zip(index.starts, index.offsets) if offset <= offsets[1])
+    assert index.time_at(offsets[1]) == expected > 0
+    assert index.time_at(len(index.text) - 1) == index.starts[-1]
+    assert format_timestamp(3725) == "1:02:05"
+
+
+def test_stream_yields_each_video_with_segment_updates():
+    tool = make_tool()
+    tool.segment_tokens = 200
+    tool.batch_tokens = 400
+
+    async def collect():
+        return [item async for item in tool.stream("quantum error correction", include_segments=True)]
+
+    items = asyncio.run(collect())
+    videos = [item for item in items if isinstance(item, VideoAnalysis)]
+    updates = [item for item in items if isinstance(item, SegmentUpdate)]
+    assert sorted(video.video_id for video in videos) == ["123", "456"]
+    assert updates and all(update.segments_done <= update.segments_total for update in updates)
+    for video in videos:
+        # Every update for a video arrives before the finished analysis
+        last_update = max(i for i, item in enumerate(items) if isinstance(item, SegmentUpdate) and item.video_id == video.video_id)
+        assert last_update < items.index(video)
+        final = [u for u in updates if u.video_id == video.video_id][-1]
+        assert final.segments_done == final.segments_total
+
+
+def test_paraphrased_key_points_are_merged_with_provenance():
+    tool = make_tool()
+    combined = tool._combine_segment_analyses([
+        {"summary": "a", "key_points": ["AI improves diagnosis accuracy", "Costs are rising"], "topics": ["AI", "Healthcare"]},
+        {"summary": "b", "key_points": ["AI improves the accuracy of diagnosis."], "topics": ["healthcare"]},
+        {"summary": "c", "key_points": ["Hospitals face staffing shortages", "costs are rising!"], "topics": ["AI"]},
+    ])
+    assert combined["key_points"] == [
+        "AI improves the accuracy of diagnosis.",
+        "costs are rising!",
+        "Hospitals face staffing shortages",
+    ]
+    assert combined["key_point_sources"]["AI improves the accuracy of diagnosis."] == [0, 1]
+    assert combined["key_point_sources"]["costs are rising!"] == [0, 2]
+    assert len(combined["topics"]) == 2
+
+
+def test_contradictory_key_points_are_not_merged():
+    assert consolidate(["AI improves diagnosis accuracy", "AI does not improve diagnosis accuracy"]) == [
+        ("AI improves diagnosis accuracy", [0]),
+        ("AI does not improve diagnosis accuracy", [1]),
+    ]
+    assert len(consolidate(["Vaccines are safe for children", "Vaccines are not safe for children",
+                            "Vaccines aren't safe for children"])) == 2
+    assert consolidate(["Vaccines are not safe for kids", "vaccines are not safe for kids!"]) == [
+        ("vaccines are not safe for kids!", [0, 1])
+    ]
+
+
+def test_sentiment_and_complexity_are_scored_locally():
+    from ariel_view.tools.text_metrics import complexity_scores, overall_sentiment, sentiment_scores
+    segments = [
+        "This is a great and helpful tool. I love how easy it is.",
+        "The launch was a terrible failure. It is not good and the risk is serious.",
+        "The cat sat on the mat.",
+        "Asymmetric cryptographic primitives like RSA-2048 and ECDSA rely on computational intractability.",
+    ]
+    scores = sentiment_scores(segments)
+    assert np.allclose(scores.sum(axis=1), 1.0)
+    assert scores[0, 0] > scores[0, 1] and scores[1, 1] > scores[1, 0]
+    assert scores[2, 2] == 1.0
+    # Negations are the relevance module's, contractions included
+    assert (sentiment_scores(["It isn't good.", "It is never good."])[:, 1] > 0).all()
+    complexity = complexity_scores(segments)
+    assert complexity.argmax() == 3 and complexity.argmin() == 2
+    assert ((0 <= complexity) & (complexity <= 10)).all()
+    assert sum(overall_sentiment(segments).values()) == pytest.approx(1.0)
+
+
+def test_rerun_only_analyzes_new_or_changed_videos(tmp_path):
+    tool = make_tool()
+    tool.incremental = True
+    tool.keep_previous_videos = True
+    tool.state_store = AnalysisStateStore(str(tmp_path / "state.sqlite3"))
+    tool.segment_tokens = 200
+    calls = tool.async_client.chat.completions.calls
+
+    first = asyncio.run(tool.run("Quantum error correction"))
+    first_calls = len(calls)
+    assert first_calls > 0
+
+    # Same topic, same transcripts: everything comes from the stored state
+    second = asyncio.run(tool.run("quantum  error correction"))
+    assert len(calls) == first_calls
+    assert [video.model_dump() for video in second] == [video.model_dump() for video in first]
+
+    # One video's transcript changes and one video drops out of the search results
+    entries = timed_entries()
+    tool._get_transcript_entries = lambda video_id: entries[:-1] if video_id == "123" else entries
+    search = tool._search_videos
+    tool._search_videos = lambda query: search(query)[:1]
+    third = asyncio.run(tool.run("quantum error correction"))
+    assert first_calls < len(calls) < 2 * first_calls
+    assert sorted(video.video_id for video in third) == ["123", "456"]
+
+    # Earlier videos are capped, the most relevant ones are kept
+    tool.max_previous_videos = 0
+    assert [video.video_id for video in asyncio.run(tool.run("quantum error correction"))] == ["123"]
+
+
+def test_refined_queries_reuse_the_topics_stored_state(tmp_path):
+    tool = make_tool()
+    tool.incremental = True
+    tool.state_store = AnalysisStateStore(str(tmp_path / "state.sqlite3"))
+    tool.segment_tokens = 200
+    calls = tool.async_client.chat.completions.calls
+
+    async def analyze(query):
+        # The agent's flow: select with a query refined by research insights, then analyze each video
+        selected = await tool.select_videos(query, topic="quantum error correction")
+        return await asyncio.gather(*(tool.analyze_selected(video) for video in selected))
+
+    first = asyncio.run(analyze("quantum error correction (surface codes OR logical qubits)"))
+    first_calls = len(calls)
+    assert first_calls > 0 and set(tool.state_store.load("quantum error correction")) == {"123", "456"}
+
+    # Different insights on the next run refine the query differently, the stored analyses still apply
+    second = asyncio.run(analyze("quantum error correction (decoders OR code distance)"))
+    assert len(calls) == first_calls
+    assert sorted(video.video_id for video in second) == sorted(video.video_id for video in first)
+
+
+def test_default_state_store_is_opened_on_first_use(tmp_path):
+    tool = make_tool()
+    assert not (tmp_path / "default_state.sqlite3").exists()
+    tool.incremental = True
+    asyncio.run(tool.run("quantum error correction"))
+    assert tool.state_store.path == str(tmp_path / "default_state.sqlite3")
+    assert set(tool.state_store.load("quantum error correction")) == {"123", "456"}
+
+
+def test_failed_llm_analysis_is_not_stored(tmp_path):
+    tool = make_tool()
+    tool.incremental = True
+    tool.state_store = AnalysisStateStore(str(tmp_path / "state.sqlite3"))
+    tool.segment_tokens = 200
+    working = tool.async_client
+    failing = FakeAsyncCompletions()
+
+    async def unavailable(**kwargs):
+        failing.calls.append(kwargs)
+        raise RuntimeError("service unavailable")
+
+    failing.create = unavailable
+    tool.async_client = SimpleNamespace(chat=SimpleNamespace(completions=failing))
+    tool.corpus_store = VideoCorpusStore(str(tmp_path / "corpus"))
+    assert asyncio.run(tool.run("quantum error correction")) == []
+    assert failing.calls and tool.state_store.load("quantum error correction") == {}
+    # Nor are the failed analyses archived in the corpus
+    assert os.listdir(tool.corpus_store.path) == []
+
+    # Batch mode drops them too, so its --corpus option has nothing to archive
+    def unavailable_sync(**kwargs):
+        raise RuntimeError("service unavailable")
+
+    (tmp_path / "batches").mkdir()
+    failing_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=unavailable_sync)))
+    analyzer = BatchVideoAnalyzer(tool, LocalBatchClient(failing_client), work_dir=str(tmp_path / "batches"),
+                                  poll_interval=0.01, timeout=10)
+    assert analyzer.run(["123", "456"], query="quantum error correction") == []
+
+    # Once the LLM is back the videos are analyzed for real instead of reusing blanks
+    tool.async_client = working
+    results = asyncio.run(tool.run("quantum error correction"))
+    assert [video.video_id for video in results] == ["123", "456"]
+    assert all(video.transcript_summary for video in results)
+    assert tool.corpus_store.scan(["video_id"]).num_rows == 2
+
+
+def test_corpus_store_scans_projected_and_filtered(tmp_path):
+    store = VideoCorpusStore(str(tmp_path / "corpus"))
+    tool = make_tool()
+    tool.corpus_store = store
+    tool.segment_tokens = 200
+    asyncio.run(tool.run("Quantum error correction"))
+    store.append([
+        VideoAnalysis(video_id="789", title="Qubits", channel="Physics Hub", publish_date="2023-01-02",
+                      relevance_score=0.9, key_topics=["Surface Codes"]),
+        VideoAnalysis(video_id="790", title="Cooking", channel="Kitchen", publish_date="2024-06-01",
+                      relevance_score=0.1, key_topics=["pasta"]),
+    ], topic="misc")
+    assert len(os.listdir(store.path)) == 2  # one file per batch
+
+    table = store.scan(columns=["video_id", "relevance_score"], topic="quantum error correction")
+    assert table.column_names == ["video_id", "relevance_score"]
+    assert sorted(table.column("video_id").to_pylist()) == ["123", "456"]
+    assert store.scan(["video_id"], channel="Physics Hub").column("video_id").to_pylist() == ["789"]
+    assert store.scan(["video_id"], since="2024-01-01").num_rows == 3
+    assert store.scan(["video_id"], until="2023-12-31", min_relevance=0.5).num_rows == 1
+    assert store.scan(["video_id"], key_topic="surface codes").column("video_id").to_pylist() == ["789"]
+
+    summary = store.summarize(by="channel").to_pydict()
+    counts = dict(zip(summary["channel"], summary["video_id_count_distinct"]))
+    assert counts == {"Sample Channel": 2, "Physics Hub": 1, "Kitchen": 1}
+
+    store.append([VideoAnalysis(video_id="789", title="Qubits v2", channel="Physics Hub", relevance_score=0.8)], topic="misc")
+    store.compact()
+    assert len(os.listdir(store.path)) == 1
+    titles = store.scan(["title"], channel="Physics Hub").column("title").to_pylist()
+    assert titles == ["Qubits v2"]
+
+
+def test_batch_mode_matches_interactive_analysis(tmp_path):
+    tool = make_tool()
+    tool.segment_tokens = 200
+    tool.prefilter_tokens = 0
+    calls = tool.client.chat.completions.calls
+    interactive = asyncio.run(tool._analyze_video({"video_id": "123", "relevance_score": 0.5}, asyncio.Semaphore(4)))
+
+    analyzer = BatchVideoAnalyzer(tool, LocalBatchClient(tool.client), work_dir=str(tmp_path),
+                                  poll_interval=0.01, timeout=10, max_requests=2)
+    analyses = analyzer.run([{"video_id": "123", "relevance_score": 0.5}, "456"])
+
+    requests = len(tool.async_client.chat.completions.calls)
+    assert len(calls) == 2 * requests  # every prompt went through the batch files
+    assert len(os.listdir(tmp_path)) == requests  # max_requests=2 splits the work into several batches
+    assert [analysis.video_id for analysis in analyses] == ["123", "456"]
+    assert analyses[0].model_dump() == interactive.model_dump()
+
+
+def test_batch_files_are_split_by_size(tmp_path):
+    tool = make_tool()
+    tool.segment_tokens = 200
+    tool.prefilter_tokens = 0
+    analyzer = BatchVideoAnalyzer(tool, LocalBatchClient(tool.client), work_dir=str(tmp_path))
+    plan = analyzer.prepare(["123", "456"])
+    requests = sum(len(entry["requests"]) for entry in plan.values())
+    single = analyzer.write_requests(plan)
+    assert len(single) == 1
+    largest = max(len(line.encode("utf-8")) for line in open(single[0], encoding="utf-8"))
+    os.remove(single[0])
+
+    # A limit of about two requests per file splits the same plan by size alone
+    analyzer.max_bytes = 2 * largest + 1
+    paths = analyzer.write_requests(plan)
+    assert len(paths) >= requests // 2 > 1
+    assert all(os.path.getsize(path) <= analyzer.max_bytes for path in paths)
+    assert sum(len(open(path, encoding="utf-8").readlines()) for path in paths) == requests
+
+    analyzer.max_bytes = largest - 1
+    with pytest.raises(ValueError):
+        analyzer.write_requests(plan)
+
+
+def test_local_batches_outnumbering_workers_complete():
+    client = LocalBatchClient(SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions())), max_workers=2)
+    batches = []
+    for n in range(4):
+        lines = "".join(json.dumps({"custom_id": f"{n}-{i}", "body": {"messages": [{"role": "user", "content": "Segment 0"}]}}) + "\n"
+                        for i in range(3))
+        batches.append(client.batches.create(input_file_id=client.files.create(lines.encode("utf-8")).id,
+                                             endpoint="/v1/chat/completions"))
+
+    deadline = time.monotonic() + 5
+    while any(client.batches.retrieve(batch.id).status == "in_progress" for batch in batches):
+        assert time.monotonic() < deadline, "batches never finished"
+        time.sleep(0.01)
+    for batch in batches:
+        assert batch.status == "completed" and batch.request_counts.completed == 3
+
+
+def test_prefetched_candidates_are_reranked_and_topped_up():
+    tool = make_tool()
+    tool.segment_tokens = 200
+    searches = []
+    search = tool._search_videos
+    tool._search_videos = lambda query: searches.append(query) or search(query)
+    fetched = []
+    get_index = tool._get_transcript_index
+    tool._get_transcript_index = lambda video_id: fetched.append(video_id) or get_index(video_id)
+
+    candidates = asyncio.run(tool.prefetch_candidates("quantum"))[:1]
+    assert searches == ["quantum"] and fetched == ["123", "456"]
+
+    # Too few relevant prefetched candidates: one more search, only new videos are fetched
+    analyses = asyncio.run(tool.run("quantum error correction qubits", candidates=candidates))
+    assert searches == ["quantum", "quantum error correction qubits"]
+    assert fetched == ["123", "456", "456"]
+    assert sorted(analysis.video_id for analysis in analyses) == ["123", "456"]
+
+    # Enough relevant candidates: no search at all
+    tool.max_videos = 1
+    analyses = asyncio.run(tool.run("quantum error correction qubits", candidates=candidates))
+    assert len(searches) == 2
+    assert [analysis.video_id for analysis in analyses] == ["123"]
@@ -0,0 +1,117 @@
+import builtins
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# The tool only needs a key to construct its client; no request is made in these tests
+os.environ.setdefault("OPENAI_API_KEY", "test_key_placeholder")
+
+from agentpro.tools.code_tool import CodeEngine
+
+
+def block(code):
+    return f"```python\n{code}\n```"
+
+
+def test_execution_result_captures_output_value_and_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data.txt").write_text("3 4 5")
+    engine = CodeEngine()
+    code, result = engine.parse_and_exec_code(block(
+        "import sys\n"
+        "numbers = [int(n) for n in open('data.txt').read().split()]\n"
+        "print('read', len(numbers))\n"
+        "print('careful', file=sys.stderr)\n"
+        "with open('total.txt', 'w') as f:\n"
+        "    f.write(str(sum(numbers)))\n"
+        "sum(numbers) * 2"))
+    assert code.startswith("import sys")
+    assert (result.stdout, result.stderr, result.return_value, result.error) == ("read 3\n", "careful\n", "24", None)
+    assert [(artifact["path"], artifact["size"]) for artifact in result.artifacts] == [("total.txt", 2)]
+    assert list(result.input_files) == [str(tmp_path / "data.txt")]
+    observation = engine.format_observation(code, result)
+    assert "Return Value: 24" in observation and "- total.txt (2 bytes)" in observation
+
+    _, failed = engine.parse_and_exec_code(block("1 / 0"))
+    assert failed.error == "ZeroDivisionError: division by zero"
+
+
+def test_cached_results_are_invalidated_by_changed_inputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data.txt").write_text("1 2")
+    engine = CodeEngine()
+    response = block("print(sum(int(n) for n in open('data.txt').read().split()))")
+    assert engine.parse_and_exec_code(response)[1].cached is False
+    cached = engine.parse_and_exec_code(response)[1]
+    assert (cached.cached, cached.stdout) == (True, "3\n")
+
+    (tmp_path / "data.txt").write_text("1 2 30")
+    rerun = engine.parse_and_exec_code(response)[1]
+    assert (rerun.cached, rerun.stdout) == (False, "33\n")
+    # Deleting a file the code produced invalidates it too
+    writer = block("open('out.txt', 'w').write('x')")
+    engine.parse_and_exec_code(writer)
+    os.remove(tmp_path / "out.txt")
+    assert engine.parse_and_exec_code(writer)[1].cached is False
+
+
+def test_file_tracking_does_not_touch_other_threads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "other.txt").write_text("other thread")
+    real_open = builtins.open
+    seen = []
+
+    def other_thread():
+        time.sleep(0.05)
+        seen.append(builtins.open is real_open)
+        with open(tmp_path / "other.txt") as f:
+            f.read()
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    _, result = CodeEngine().parse_and_exec_code(block("import time\ntime.sleep(0.2)\nopen('mine.txt', 'w').write('me')"))
+    thread.join()
+    assert seen == [True] and builtins.open is real_open
+    assert [artifact["path"] for artifact in result.artifacts] == ["mine.txt"] and result.input_files == {}
+
+
+def test_reads_outside_builtin_open_are_tracked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "notes.txt").write_text("a b")
+    (tmp_path / "d.csv").write_text("x\n1\n2\n")
+    engine = CodeEngine()
+    response = block(
+        "import os, pathlib\n"
+        "words = pathlib.Path('notes.txt').read_text().split()\n"
+        "fd = os.open('d.csv', os.O_RDONLY)\n"
+        "rows = os.read(fd, 100).decode().split()[1:]\n"
+        "os.close(fd)\n"
+        "len(words), sum(map(int, rows))")
+    first = engine.parse_and_exec_code(response)[1]
+    assert first.return_value == "(2, 3)"
+    assert set(first.input_files) == {str(tmp_path / "notes.txt"), str(tmp_path / "d.csv")}
+    assert engine.parse_and_exec_code(response)[1].cached is True
+
+    (tmp_path / "d.csv").write_text("x\n1\n2\n30\n")
+    rerun = engine.parse_and_exec_code(response)[1]
+    assert (rerun.cached, rerun.return_value) == (False, "(2, 33)")
+
+
+def test_pandas_reads_are_tracked(tmp_path, monkeypatch):
+    pytest.importorskip("pandas")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "d.csv").write_text("x\n1\n2\n")
+    engine = CodeEngine()
+    response = block("import pandas as pd\nint(pd.read_csv('d.csv')['x'].sum())")
+    first = engine.parse_and_exec_code(response)[1]
+    assert first.return_value == "3" and list(first.input_files) == [str(tmp_path / "d.csv")]
+
+    (tmp_path / "d.csv").write_text("x\n1\n2\n30\n")
+    rerun = engine.parse_and_exec_code(response)[1]
+    assert (rerun.cached, rerun.return_value) == (False, "33")
@@ -0,0 +1,211 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# The backend imports its modules relative to its own directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../backend')))
+
+# The app checks these at import time; no request leaves the process in these tests
+for key in ("OPENAI_API_KEY", "TRAVERSAAL_ARES_API_KEY", "PERPLEXITY_API_KEY"):
+    os.environ.setdefault(key, "test_key_placeholder")
+os.environ.setdefault("ARIEL_JOB_DB_PATH", os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+
+from job_queue import JobQueue
+
+
+def wait_for(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_workers_run_jobs_concurrently_and_record_partials(tmp_path):
+    release = threading.Event()
+    running = []
+
+    def handler(payload, report):
+        running.append(payload["n"])
+        report("progress", {"n": payload["n"]}, partial={"half": payload["n"] / 2})
+        release.wait(5)
+        if payload["n"] < 0:
+            raise ValueError("negative")
+        return {"double": payload["n"] * 2}
+
+    queue = JobQueue(handler, path=str(tmp_path / "jobs.sqlite3"), workers=2, poll_interval=0.01)
+    queue.start()
+    ids = [queue.submit({"n": n}) for n in (1, -1, 3)]
+
+    deadline = time.monotonic() + 5
+    while (len(running) < 2 or queue.get(ids[0])["partial"] is None) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Two workers: two jobs run, the third waits its turn; buffered events are written within the flush interval
+    assert sorted(running) == [-1, 1]
+    assert queue.get(ids[0])["status"] == "running" and queue.get(ids[0])["partial"] == {"half": 0.5}
+    assert queue.get(ids[2])["status"] == "queued"
+
+    release.set()
+    done, failed, last = (wait_for(queue, job_id) for job_id in ids)
+    assert done["result"] == {"double": 2} and last["result"] == {"double": 6}
+    assert failed["status"] == "failed" and failed["error"] == "negative"
+    assert [event["event"] for event in queue.events(ids[0])] == ["started", "progress", "done"]
+    assert queue.events(ids[0], after=2)[0]["event"] == "done"
+    assert queue.get("missing") is None
+    queue.close()
+
+
+def test_streamed_events_are_written_in_batches(tmp_path):
+    def handler(payload, report):
+        for i in range(200):
+            report("synthesis_token", str(i))
+        return {"tokens": 200}
+
+    queue = JobQueue(handler, path=str(tmp_path / "jobs.sqlite3"), poll_interval=0.01, flush_events=50)
+    writes = []
+    write_events = queue._write_events
+    queue._write_events = lambda job_id, events, partial=None: (writes.append(len(events)), write_events(job_id, events, partial))
+    queue.start()
+    job_id = queue.submit({})
+    assert wait_for(queue, job_id)["status"] == "done"
+    events = queue.events(job_id)
+    # One write per batch of tokens instead of one per token, with the order and sequence numbers intact
+    assert [event["data"] for event in events[1:-1]] == [str(i) for i in range(200)]
+    assert [event["seq"] for event in events] == list(range(1, 203))
+    assert len(writes) < 20
+    queue.close()
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    queue = JobQueue(lambda payload, report: payload, path=path)
+    job_id = queue.submit({"topic": "qubits"})
+    queue.close()
+
+    # A new process picks up what the old one queued
+    queue = JobQueue(lambda payload, report: {"seen": payload["topic"]}, path=path, poll_interval=0.01)
+    queue.start()
+    assert wait_for(queue, job_id)["result"] == {"seen": "qubits"}
+    queue.close()
+
+
+def test_live_jobs_are_not_taken_over_by_another_process(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = threading.Event()
+    runs = []
+
+    def handler(payload, report):
+        runs.append(payload["topic"])
+        release.wait(5)
+        return {"runs": len(runs)}
+
+    first = JobQueue(handler, path=path, poll_interval=0.01, lease=0.3)
+    first.start()
+    job_id = first.submit({"topic": "qubits"})
+    deadline = time.monotonic() + 5
+    while not runs and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # A second process sharing the file leaves the job alone while its owner heartbeats
+    second = JobQueue(handler, path=path, poll_interval=0.01, lease=0.3)
+    second.start()
+    time.sleep(0.8)
+    assert runs == ["qubits"] and second.get(job_id)["status"] == "running"
+
+    # Once the owner stops heartbeating (it died), its lease runs out and the job runs again
+    first._stopping.set()
+    deadline = time.monotonic() + 5
+    while len(runs) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert runs == ["qubits", "qubits"] and second.get(job_id)["attempts"] == 2
+    release.set()
+    assert wait_for(second, job_id)["status"] == "done"
+    second.close()
+    first.close()
+
+
+class FakeAnalyzer:
+    """Reports the events of a research-only and of a full run, without calling any API"""
+
+    def analyze_topic(self, topic, depth, on_event=None):
+        on_event("research_started", {"topic": topic, "depth": depth})
+        on_event("research_partial", {"summary": "Qubits are"})
+        result = {"content": f"research on {topic}", "depth": depth}
+        on_event("research_done", {"seconds": 0.1, "cached": False, "output": result})
+        return result
+
+    def analyze_with_videos(self, topic, depth, on_event=None):
+        self.analyze_topic(topic, depth, on_event)
+        on_event("video_done", {"video_id": "123"})
+        for token in ('{"narrative": ', '"Qubits"}'):
+            on_event("synthesis_token", token)
+        on_event("synthesis_done", {"seconds": 0.1, "cached": False, "output": {"narrative": "Qubits"}})
+        return {"topic": topic}
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_analyze_endpoint_queues_a_job():
+    import app as backend
+
+    backend.analyzer = FakeAnalyzer()
+    client = backend.app.test_client()
+    response = client.post("/api/analyze", json={"topic": "qubits", "options": {"depth": "quick"}})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    job = wait_for(backend.jobs, job_id)
+    body = client.get(f"/api/jobs/{job_id}").get_json()
+    assert body["status"] == job["status"] == "done"
+    assert body["result"] == {"content": "research on qubits", "depth": "quick"}
+    assert body["partial"] == {"research": body["result"]}
+    assert client.get("/api/jobs/unknown").status_code == 404
+    assert client.post("/api/analyze", json={"topic": "qubits", "options": {"depth": "medium"}}).status_code == 400
+
+
+def test_app_starts_workers_without_a_submission():
+    import app as backend
+
+    backend.analyzer = FakeAnalyzer()
+    # A job already in the queue (e.g. from before a restart) runs without anyone posting a new one
+    job_id = backend.jobs.submit({"topic": "restart", "depth": "quick", "videos": False})
+    assert wait_for(backend.jobs, job_id)["status"] == "done"
+
+
+def test_events_endpoint_streams_stage_events():
+    import app as backend
+
+    backend.analyzer = FakeAnalyzer()
+    client = backend.app.test_client()
+    job_id = client.post("/api/analyze", json={"topic": "qubits", "options": {"videos": True}}).get_json()["job_id"]
+
+    # The stream follows the job while it runs and closes after its final event
+    response = client.get(f"/api/jobs/{job_id}/events")
+    assert response.mimetype == "text/event-stream"
+    events = parse_sse(response.get_data(as_text=True))
+    assert [name for _, name, _ in events] == [
+        "started", "research_started", "research_partial", "research_done",
+        "video_done", "synthesis_token", "synthesis_token", "synthesis_done", "done"]
+    assert "".join(data for _, name, data in events if name == "synthesis_token") == '{"narrative": "Qubits"}'
+    assert [seq for seq, _, _ in events] == list(range(1, 10))
+
+    partial = client.get(f"/api/jobs/{job_id}").get_json()["partial"]
+    assert partial["videos"] == [{"video_id": "123"}] and partial["synthesis"] == {"narrative": "Qubits"}
+
+    # Resuming skips what the client already saw
+    resumed = parse_sse(client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "7"}).get_data(as_text=True))
+    assert [name for _, name, _ in resumed] == ["synthesis_done", "done"]
+    assert client.get("/api/jobs/unknown/events").status_code == 404
+    assert client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "seven"}).status_code == 400
+    assert client.get(f"/api/jobs/{job_id}/events?after=7x").status_code == 400
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# The tools only need keys to construct themselves; no request is made in these tests
+os.environ.setdefault("OPENAI_API_KEY", "test_key_placeholder")
+os.environ.setdefault("PERPLEXITY_API_KEY", "test_key_placeholder")
+
+from ariel_view.tools.perplexity_tool import PerplexityResearchTool
+from ariel_view.tools import research_cache
+from ariel_view.tools.research_cache import ResearchCache, normalize_query
+
+
+def test_normalized_queries_share_entries(tmp_path):
+    cache = ResearchCache(str(tmp_path / "cache.sqlite3"))
+    assert normalize_query("What is  Quantum Computing?") == normalize_query("quantum computing, what is it")
+    cache.put("What is quantum computing?", {"content": "qubits"}, namespace="sonar")
+    assert cache.get("QUANTUM computing") is None  # other namespace
+    assert cache.get("computing quantum", namespace="sonar") == {"content": "qubits"}
+    # Near-duplicate wording falls back to the closest cached query
+    cache.put("latest advances in quantum error correction research", {"content": "codes"})
+    assert cache.get("latest advances quantum error correction research 2024") == {"content": "codes"}
+    assert cache.get("history of the roman empire") is None
+
+
+def test_opposite_questions_do_not_share_entries(tmp_path):
+    cache = ResearchCache(str(tmp_path / "cache.sqlite3"))
+    assert normalize_query("Is nuclear power safe") != normalize_query("Is nuclear power not safe")
+    assert normalize_query("Do dogs chase cats") != normalize_query("Do cats chase dogs")
+    cache.put("Is nuclear power safe", {"content": "yes"})
+    assert cache.get("Is nuclear power not safe") is None
+    assert cache.get("Isn't nuclear power safe") is None
+    cache.put("Is nuclear power not safe", {"content": "no"})
+    assert cache.get("is nuclear power NOT safe?") == {"content": "no"}
+    assert cache.get("Is nuclear power safe?") == {"content": "yes"}
+
+
+def test_near_duplicate_lookup_scans_only_recent_entries(tmp_path):
+    cache = ResearchCache(str(tmp_path / "cache.sqlite3"), near_duplicate_scan=2)
+    cache.put("latest advances in quantum error correction research", {"content": "codes"})
+    cache.put("fusion energy", {"content": "tokamaks"})
+    assert cache.get("latest advances quantum error correction research 2024") == {"content": "codes"}
+    cache.put("solar energy", {"content": "panels"})
+    # The older entry is beyond the scan, only an exact key still finds it
+    assert cache.get("latest advances quantum error correction research 2024") is None
+    assert cache.get("latest advances in quantum error correction research") == {"content": "codes"}
+
+
+def test_entries_expire(tmp_path):
+    cache = ResearchCache(str(tmp_path / "cache.sqlite3"), near_duplicate_threshold=None)
+    cache.put("fusion energy", {"content": "tokamaks"}, ttl=0.05)
+    cache.put("solar energy", {"content": "panels"})
+    assert cache.get("fusion energy") == {"content": "tokamaks"}
+    time.sleep(0.1)
+    assert cache.get("fusion energy") is None
+    assert cache.purge_expired() == 1
+    assert cache.get("solar energy") == {"content": "panels"}
+
+
+def test_concurrent_identical_queries_share_one_call(tmp_path):
+    cache = ResearchCache(str(tmp_path / "cache.sqlite3"))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"content": "answer"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("Dark matter", compute)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [{"content": "answer"}] * 5
+
+    async def compute_async():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"content": "async answer"}
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_compute("dark energy?", compute_async) for _ in range(5)))
+
+    assert asyncio.run(main()) == [{"content": "async answer"}] * 5
+    assert len(calls) == 2
+
+
+def test_event_loops_of_different_jobs_share_one_call(tmp_path):
+    cache = ResearchCache(str(tmp_path / "cache.sqlite3"))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"content": "answer"}
+
+    # Each backend job runs its own event loop, like asyncio.run on separate worker threads
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(asyncio.run(cache.aget_or_compute("Dark matter", compute))))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and results == [{"content": "answer"}] * 4
+
+
+def test_concurrent_streams_follow_one_upstream_stream(tmp_path):
+    cache = ResearchCache(str(tmp_path / "cache.sqlite3"))
+    calls = []
+
+    def produce():
+        calls.append(1)
+        for part in ("a", "ab", "abc"):
+            time.sleep(0.05)
+            yield part
+        return {"content": "abc"}
+
+    streams = []
+    threads = [threading.Thread(target=lambda: streams.append(list(cache.stream_or_compute("Dark matter", produce))))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Followers replay the leader's partial results, then get its final result
+    assert len(calls) == 1
+    assert streams == [[(False, "a"), (False, "ab"), (False, "abc"), (True, {"content": "abc"})]] * 3
+    assert list(cache.stream_or_compute("dark matter", produce)) == [(True, {"content": "abc"})]
+
+    # A leader whose consumer goes away hands the query to a follower instead of stranding it
+    leader = cache.stream_or_compute("dark energy", produce)
+    assert next(leader) == (False, "a")
+    follower = []
+    thread = threading.Thread(target=lambda: follower.extend(cache.stream_or_compute("dark energy", produce)))
+    thread.start()
+    time.sleep(0.05)
+    leader.close()
+    thread.join(2)
+    assert follower[-1] == (True, {"content": "abc"}) and len(calls) == 3
+
+
+def test_research_tool_caches_results_but_not_errors(tmp_path):
+    tool = PerplexityResearchTool(cache=ResearchCache(str(tmp_path / "cache.sqlite3")))
+    answers = [{"error": "busy"}, {"content": "Summary:\nQubits."}]
+    tool._call_perplexity_api = lambda query, tier=None: answers.pop(0)
+    assert tool.run("quantum computing")["error"] == "busy"
+    first = tool.run("Quantum computing")
+    assert (first["content"], first["cached"]) == ("Summary:\nQubits.", False)
+    second = tool.run("computing: quantum")
+    assert (second["content"], second["cached"]) == ("Summary:\nQubits.", True)
+    assert list(tool.stream("quantum computing"))[-1].summary == "Qubits."
+    # Quick research is cache-first and settles for a deep result
+    quick = tool.run("quantum computing", depth="quick")
+    assert (quick["content"], quick["cached"], quick["depth"]) == ("Summary:\nQubits.", True, "quick")
+
+
+def test_tools_share_one_lazily_opened_default_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESEARCH_CACHE_PATH", str(tmp_path / "default.sqlite3"))
+    monkeypatch.setattr(research_cache, "_default_cache", None)
+    first, second = PerplexityResearchTool(), PerplexityResearchTool()
+    assert not (tmp_path / "default.sqlite3").exists()
+    # Tools of different jobs see one cache, and with it each other's in-flight queries
+    assert first.cache is second.cache is research_cache.get_research_cache()
+    assert first.cache.path == str(tmp_path / "default.sqlite3")
+    first.cache.close()
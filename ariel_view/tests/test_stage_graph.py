@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from ariel_view.stage_graph import Stage, StageCache, StageGraph
+
+
+def test_stages_run_when_inputs_resolve_with_bounded_concurrency():
+    running = {"now": 0, "max": 0}
+    started = []
+
+    async def work(name, delay):
+        started.append(name)
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(delay)
+        running["now"] -= 1
+        return name
+
+    async def slow(topic):
+        return await work("slow", 0.1)
+
+    async def fast(topic):
+        return await work("fast", 0.01)
+
+    async def after_fast(fast):
+        return await work("after_fast", 0.01)
+
+    async def square(items):
+        await work(f"item{items}", 0.02)
+        return items * items if items else None
+
+    async def items(topic):
+        return [0, 1, 2, 3, 4]
+
+    graph = StageGraph([
+        Stage("slow", slow, inputs=["topic"]),
+        Stage("fast", fast, inputs=["topic"]),
+        Stage("after_fast", after_fast, inputs=["fast"]),
+        Stage("items", items, inputs=["topic"]),
+        Stage("squares", square, inputs=["items"], each="items")
+    ], max_concurrency=2)
+    run = asyncio.run(graph.run(topic="qubits"))
+
+    # A downstream stage doesn't wait for unrelated slow stages
+    assert started.index("after_fast") < len(started) - 1
+    assert run.outputs["slow"] == "slow" and run.outputs["after_fast"] == "after_fast"
+    # Fan-out keeps input order and drops failed (None) items
+    assert run.outputs["squares"] == [1, 4, 9, 16]
+    assert running["max"] == 2
+    assert run.cached == [] and "total" in run.timings
+
+
+def test_cache_reuses_outputs_until_inputs_or_code_change(tmp_path):
+    calls = []
+
+    async def research(topic):
+        calls.append(("research", topic))
+        return f"research on {topic}"
+
+    async def summary(research):
+        calls.append(("summary", research))
+        return research.upper()
+
+    async def other_summary(research):
+        calls.append(("other_summary", research))
+        return research.title()
+
+    cache = StageCache(str(tmp_path / "stages.sqlite3"))
+
+    def graph(summarize):
+        return StageGraph([Stage("research", research, inputs=["topic"]),
+                           Stage("summary", summarize, inputs=["research"])], cache=cache)
+
+    asyncio.run(graph(summary).run(topic="qubits"))
+    run = asyncio.run(graph(summary).run(topic="qubits"))
+    assert run.cached == ["research", "summary"] and len(calls) == 2
+
+    # Changing only the summary stage's code reruns only that stage
+    run = asyncio.run(graph(other_summary).run(topic="qubits"))
+    assert run.cached == ["research"] and calls[-1] == ("other_summary", "research on qubits")
+
+    asyncio.run(graph(summary).run(topic="anyons"))
+    assert calls[-2:] == [("research", "anyons"), ("summary", "research on anyons")]
+
+
+def test_graph_rejects_cycles_and_missing_inputs():
+    async def echo(**kwargs):
+        return kwargs
+
+    with pytest.raises(ValueError):
+        StageGraph([Stage("a", echo, inputs=["b"]), Stage("b", echo, inputs=["a"])])
+    with pytest.raises(ValueError):
+        Stage("a", echo, inputs=["topic"], each="items")
+    with pytest.raises(ValueError):
+        asyncio.run(StageGraph([Stage("a", echo, inputs=["topic"])]).run())
@@ -0,0 +1,302 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# The tools only need keys to construct themselves; requests go to a local server
+os.environ.setdefault("OPENAI_API_KEY", "test_key_placeholder")
+os.environ.setdefault("PERPLEXITY_API_KEY", "test_key_placeholder")
+
+from agentpro.tools.http_transport import AsyncHttpTransport, HttpTransport
+from ariel_view.tools.perplexity_tool import RESEARCH_TIERS, PerplexityResearchTool, ResearchStreamParser
+from ariel_view.tools.research_cache import ResearchCache
+
+
+RESEARCH_ANSWER = """Summary:
+Quantum error correction protects fragile qubits.
+It encodes one logical qubit in many physical ones.
+
+Key Insights:
+- Surface codes tolerate about 1% error rates
+* Logical error rates fall as the code distance grows
+
+Sources:
+- Google Quantum AI
+- IBM Research
+
+Citations:
+- https://example.org/b"""
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Fails the first `failures` requests to each path with 503, then answers like Perplexity"""
+
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    failures = 1
+    delay = 0.0
+    stream_delay = 0.0
+    hits = {}
+    connections = set()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if body.get("stream"):
+            return self._stream(RESEARCH_ANSWER)
+        FlakyHandler.connections.add(self.client_address)
+        count = FlakyHandler.hits.get(self.path, 0)
+        FlakyHandler.hits[self.path] = count + 1
+        time.sleep(FlakyHandler.delay)
+        if count < FlakyHandler.failures:
+            self._reply(503, {"error": "busy"})
+        else:
+            self._reply(200, {"choices": [{"message": {"content": f"answer for {self.path}"}}]})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except BrokenPipeError:
+            pass  # the client gave up waiting
+
+    def _stream(self, content, piece=7):
+        # SSE deltas cut at arbitrary points, like a model streaming tokens
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for start in range(0, len(content), piece):
+            event = {"choices": [{"delta": {"content": content[start:start + piece]}}], "citations": ["https://example.org/a"]}
+            try:
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return  # the client stopped reading
+            time.sleep(FlakyHandler.stream_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FlakyHandler.failures, FlakyHandler.delay, FlakyHandler.stream_delay = 1, 0.0, 0.0
+    FlakyHandler.hits, FlakyHandler.connections = {}, set()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def research_tool(tmp_path):
+    # Its own cache file, so results never leak between tests or from earlier runs
+    return PerplexityResearchTool(cache=ResearchCache(str(tmp_path / "research_cache.sqlite3")))
+
+
+def test_retries_only_idempotent_requests(server):
+    transport = HttpTransport(retries=2, backoff=0.01)
+    assert transport.post(server + "/search", json={}, idempotent=True).status_code == 200
+    assert FlakyHandler.hits["/search"] == 2
+    # A plain POST is not repeated
+    assert transport.post(server + "/write", json={}).status_code == 503
+    assert FlakyHandler.hits["/write"] == 1
+
+
+def test_keep_alive_reuses_connections(server):
+    FlakyHandler.failures = 0
+    transport = HttpTransport()
+    for _ in range(5):
+        transport.post(server + "/search", json={})
+    assert len(FlakyHandler.connections) == 1
+
+
+def test_read_timeout_is_bounded(server):
+    FlakyHandler.failures, FlakyHandler.delay = 0, 1.0
+    transport = HttpTransport(read_timeout=0.1, retries=1, backoff=0.01)
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        transport.post(server + "/slow", json={}, idempotent=True)
+    assert time.monotonic() - started < 1.0
+    assert FlakyHandler.hits["/slow"] == 2
+
+
+def test_budget_bounds_total_time_across_retries(server):
+    FlakyHandler.failures, FlakyHandler.delay = 10, 0.2
+    transport = HttpTransport(retries=5, backoff=0.01)
+    started = time.monotonic()
+    # The last attempt only gets what is left of the budget
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        transport.post(server + "/busy", json={}, idempotent=True, budget=0.5)
+    assert time.monotonic() - started < 0.9
+    assert FlakyHandler.hits["/busy"] <= 3
+
+
+def test_budget_counts_time_waiting_for_a_connection(server):
+    FlakyHandler.failures, FlakyHandler.delay = 0, 0.6
+    transport = HttpTransport(max_per_host=1, retries=0)
+    holder = threading.Thread(target=lambda: transport.post(server + "/slow", json={}))
+    holder.start()
+    time.sleep(0.1)
+    # The only connection slot is taken: a budgeted request gives up when its budget runs out while queued
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        transport.post(server + "/queued", json={}, budget=0.2)
+    assert time.monotonic() - started < 0.4 and "/queued" not in FlakyHandler.hits
+    holder.join()
+    # Once the slot is free again the next request gets it
+    assert transport.post(server + "/queued", json={}, budget=1.0).status_code == 200
+
+    # A streamed response keeps its slot until it is closed
+    with transport.post(server + "/chat", json={"stream": True}, stream=True) as response:
+        with pytest.raises(requests.exceptions.Timeout):
+            transport.post(server + "/queued", json={}, budget=0.1)
+    assert transport.post(server + "/queued", json={}, budget=1.0).status_code == 200
+
+
+def test_async_transport_limits_requests_per_host(server):
+    FlakyHandler.failures, FlakyHandler.delay = 0, 0.05
+    transport = AsyncHttpTransport(HttpTransport(max_per_host=2))
+
+    async def main():
+        return await asyncio.gather(*(transport.post(server + f"/q{i}", json={}) for i in range(6)))
+
+    responses = asyncio.run(main())
+    assert [response.status_code for response in responses] == [200] * 6
+    assert len(FlakyHandler.connections) <= 2
+
+
+def test_async_budget_counts_time_waiting_for_a_connection(server):
+    FlakyHandler.failures, FlakyHandler.delay = 0, 0.3
+    transport = AsyncHttpTransport(HttpTransport(max_per_host=1, retries=0))
+
+    async def main():
+        return await asyncio.gather(*(transport.post(server + f"/q{i}", json={}, budget=0.5) for i in range(3)),
+                                    return_exceptions=True)
+
+    started = time.monotonic()
+    outcomes = asyncio.run(main())
+    # The first request fits the budget, the ones queued behind it run out of it instead of starting afresh
+    assert outcomes[0].status_code == 200
+    assert all(isinstance(outcome, requests.exceptions.Timeout) for outcome in outcomes[1:])
+    assert time.monotonic() - started < 0.9
+
+    # A queued request gives up as soon as its budget is spent, not when the slot frees up
+    FlakyHandler.delay = 0.8
+
+    async def queued():
+        holder = asyncio.ensure_future(transport.post(server + "/slow", json={}))
+        await asyncio.sleep(0.1)
+        started = time.monotonic()
+        with pytest.raises(requests.exceptions.Timeout):
+            await transport.post(server + "/queued", json={}, budget=0.2)
+        waited = time.monotonic() - started
+        await holder
+        return waited
+
+    assert asyncio.run(queued()) < 0.5
+
+
+def test_perplexity_tool_uses_shared_transport(server, research_tool):
+    tool = research_tool
+    tool.use_cache = False
+    tool.url = server + "/chat/completions"
+    assert tool.run("qubits")["content"] == "answer for /chat/completions"
+    assert asyncio.run(tool.arun("qubits"))["content"] == "answer for /chat/completions"
+
+
+def test_stream_parser_matches_batch_parser(research_tool):
+    tool = research_tool
+    tool.use_cache = False
+    expected = tool._parse_research_response(RESEARCH_ANSWER)
+    assert expected["Key Insights"] == ["Surface codes tolerate about 1% error rates",
+                                        "Logical error rates fall as the code distance grows"]
+    for piece in (1, 3, 50):
+        parser = ResearchStreamParser()
+        for start in range(0, len(RESEARCH_ANSWER), piece):
+            parser.feed(RESEARCH_ANSWER[start:start + piece])
+        assert parser.close() == expected
+
+
+def test_stream_yields_partial_research(server, research_tool):
+    tool = research_tool
+    tool.use_cache = False
+    tool.url = server + "/chat/completions"
+    updates = list(tool.stream("qubits"))
+    assert len(updates) > 3
+    # The summary is available before the rest of the answer has arrived
+    assert next(update for update in updates if update.summary).key_insights == []
+    insight_counts = [len(update.key_insights) for update in updates]
+    assert insight_counts == sorted(insight_counts)
+    final = updates[-1]
+    assert final.sources == [{"name": "Google Quantum AI"}, {"name": "IBM Research"}]
+    assert final.citations == ["https://example.org/b", "https://example.org/a"]
+
+    async def collect():
+        return [update async for update in tool.astream("qubits")]
+
+    assert asyncio.run(collect())[-1] == final
+
+
+def test_stream_keeps_to_the_latency_budget(server, research_tool):
+    FlakyHandler.stream_delay = 0.05
+    tool = research_tool
+    tool.use_cache = False
+    tool.url = server + "/chat/completions"
+    tool.tiers = {**RESEARCH_TIERS, "quick": RESEARCH_TIERS["quick"].model_copy(update={"latency_budget": 0.3})}
+    started = time.monotonic()
+    updates = []
+    with pytest.raises(requests.exceptions.Timeout):
+        for update in tool.stream("qubits", depth="quick"):
+            updates.append(update)
+    # Partial results arrived before the budget ran out, the rest of the answer (about 2s) didn't
+    assert updates and time.monotonic() - started < 1.0
+
+
+def test_depth_selects_model_and_reports_time(server, research_tool):
+    tool = research_tool
+    tool.use_cache = False
+    tool.url = server + "/chat/completions"
+    FlakyHandler.failures = 0
+    sent = []
+    build = tool._build_request
+
+    def recording_build(*args, **kwargs):
+        payload, headers = build(*args, **kwargs)
+        sent.append(payload)
+        return payload, headers
+
+    tool._build_request = recording_build
+
+    quick = tool.run("qubits", depth="quick")
+    deep = tool.run("qubits", depth="deep")
+    assert [payload["model"] for payload in sent] == ["sonar", "sonar-deep-research"]
+    assert sent[0]["max_tokens"] < sent[1]["max_tokens"]
+    assert (quick["depth"], quick["model"], quick["cached"]) == ("quick", "sonar", False)
+    assert deep["depth"] == "deep" and deep["elapsed_seconds"] >= 0
+    with pytest.raises(ValueError):
+        tool.run("qubits", depth="medium")
+
+
+def test_transport_imports_without_api_keys():
+    # The research tools import the transport, which must not build agentpro's default tools (they need keys)
+    env = {key: value for key, value in os.environ.items() if not key.endswith("_API_KEY")}
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+    subprocess.run([sys.executable, "-c", "import agentpro.tools.http_transport"], cwd=root, env=env, check=True)
@@ -2,8 +2,11 @@ import os
 from typing import Dict, Any, List
 from pydantic import BaseModel
 import openai
-from youtube_transcript_api import YouTubeTranscriptApi
 import requests
+import sys
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
 class VideoAnalysis(BaseModel):
     video_id: str
@@ -141,8 +144,10 @@ def get_video_metadata(video_id: str) -> Dict[str, Any]:
 
 def get_transcript(video_id: str) -> str:
     """Get video transcript"""
+    # Served from the local transcript store after the first download
+    from agentpro.tools.transcript_store import TranscriptStore
     try:
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+        transcript_list = TranscriptStore().fetch(video_id)
         return " ".join([entry["text"] for entry in transcript_list])
     except Exception as e:
         print(f"Error getting transcript: {str(e)}")
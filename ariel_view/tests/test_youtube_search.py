@@ -0,0 +1,247 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+# Add the project root to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+# The tool only needs a key to construct its client; no request is made in these tests
+os.environ.setdefault("OPENAI_API_KEY", "test_key_placeholder")
+
+from agentpro.tools.chunking import chunk_text, count_tokens
+from agentpro.tools import transcript_store
+from agentpro.tools.relevance import select_relevant_text
+from agentpro.tools.transcript_store import TranscriptStore
+from agentpro.tools.youtube_tool import YouTubeSearchTool
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions, answering every prompt with a short summary"""
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def create(self, model, messages, **kwargs):
+        with self.lock:
+            self.calls.append((model, messages[-1]["content"]))
+            number = len(self.calls)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"summary {number}"))])
+
+
+def make_tool(tmp_path, **fields):
+    tool = YouTubeSearchTool(transcript_store=TranscriptStore(str(tmp_path / "transcripts.sqlite3")), **fields)
+    tool.client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    return tool
+
+
+def lecture(sentences=3000):
+    # Long transcript about cooking, with a few sentences on the query topic scattered through it
+    lines = []
+    for i in range(sentences):
+        if i % 500 == 250:
+            lines.append(f"Surface codes protect logical qubits from errors, point {i}.")
+        else:
+            lines.append(f"Sentence {i} describes how to knead the dough and bake the bread.")
+    return " ".join(lines)
+
+
+def test_prefilter_keeps_query_relevant_windows_in_order():
+    text = lecture()
+    selected = select_relevant_text(text, "surface codes logical qubits", token_budget=300, window_tokens=50)
+    assert count_tokens(selected) <= 300 + 10 * count_tokens(" ... ")
+    points = [int(point) for point in re.findall(r"point (\d+)", selected)]
+    assert points == [250, 750, 1250, 1750, 2250, 2750]
+    # Short texts are returned untouched
+    assert select_relevant_text("Surface codes.", "surface codes", token_budget=300) == "Surface codes."
+
+
+def test_prefilter_falls_back_to_textrank_without_a_query():
+    text = lecture(600)
+    for query in (None, "gardening tips"):
+        selected = select_relevant_text(text, query, token_budget=200, window_tokens=50)
+        windows = selected.split(" ... ")
+        assert 0 < count_tokens(selected) <= 200 + len(windows) * count_tokens(" ... ")
+        # Windows come back in transcript order
+        positions = [text.index(window) for window in windows]
+        assert positions == sorted(positions)
+
+
+def test_default_prefilter_cuts_typical_videos_and_leaves_them_to_map_reduce(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    tool = make_tool(tmp_path)
+    assert tool.chunk_tokens < tool.prefilter_tokens
+    # A typical video (a few thousand tokens of transcript) is cut down, not passed through whole
+    typical = lecture(400)
+    assert count_tokens(typical) > tool.prefilter_tokens
+    assert count_tokens(select_relevant_text(typical, "surface codes", tool.prefilter_tokens, tool.window_tokens)) <= tool.prefilter_tokens
+    transcript = lecture()
+    monkeypatch.setattr(YouTubeSearchTool, "get_transcript", lambda self, video_id: transcript)
+    result = tool.process_video({"video_id": "abc", "title": "Bread"}, "surface codes")
+
+    calls = tool.client.chat.completions.calls
+    prefiltered = select_relevant_text(transcript, "surface codes", tool.prefilter_tokens, tool.window_tokens)
+    chunks = chunk_text(prefiltered, tool.chunk_tokens)
+    assert len(chunks) > 1
+    # One cheap map call per chunk, then a single reduce call
+    assert [model for model, _ in calls] == [tool.map_model] * len(chunks) + ["gpt-4"]
+    assert result["content"] == f"summary {len(chunks) + 1}"
+
+
+def entries(video_id, count=50):
+    return [{"text": f"{video_id} caption {i} with some words", "start": i * 2.0, "duration": 2.0} for i in range(count)]
+
+
+def test_store_is_opened_on_first_fetch(tmp_path, monkeypatch):
+    path = tmp_path / "lazy" / "transcripts.sqlite3"
+    monkeypatch.setenv("TRANSCRIPT_STORE_PATH", str(path))
+    tool = YouTubeSearchTool()
+    assert tool.transcript_store is None and not path.exists()
+    monkeypatch.setattr(transcript_store.YouTubeTranscriptApi, "get_transcript",
+                        lambda video_id, languages: entries(video_id), raising=False)
+    assert tool.get_transcript("abc").startswith("abc caption 0")
+    assert path.exists() and tool.store() is tool.transcript_store
+
+
+def test_store_round_trips_and_evicts_least_recently_used(tmp_path):
+    store = TranscriptStore(str(tmp_path / "transcripts.sqlite3"))
+    store.put("a", entries("a"))
+    assert store.get("a") == entries("a") and store.get("a", "de") is None
+    size = store.stats()["bytes"]
+    store.max_bytes = int(size * 2.5)
+    store.put("b", entries("b"))
+    time.sleep(0.01)
+    store.get("a")  # a is now more recently used than b
+    time.sleep(0.01)
+    store.put("c", entries("c"))
+    assert store.get("b") is None
+    assert store.get("a") == entries("a") and store.get("c") == entries("c")
+    assert store.stats()["transcripts"] == 2
+
+
+def test_store_cli_imports_and_warms(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "transcripts.sqlite3")
+    export = tmp_path / "export.jsonl"
+    export.write_text("\n".join(json.dumps({"video_id": video_id, "entries": entries(video_id)}) for video_id in ("a", "b")))
+    transcript_store.main(["--path", path, "import", str(export)])
+    assert "Imported 2 transcripts" in capsys.readouterr().out
+
+    def download(video_id, languages):
+        if video_id == "gone":
+            raise ValueError("transcripts disabled")
+        return entries(video_id)
+
+    monkeypatch.setattr(transcript_store.YouTubeTranscriptApi, "get_transcript", download, raising=False)
+    transcript_store.main(["--path", path, "warm", "a", "c", "gone"])
+    output = capsys.readouterr().out.splitlines()
+    assert output[:3] == ["a: cached", "c: fetched", "gone: error: transcripts disabled"]
+    assert json.loads(output[-1])["transcripts"] == 3
+
+
+def test_map_reduce_reuses_cached_chunk_summaries(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    tool = make_tool(tmp_path, chunk_tokens=300, prefilter_tokens=None)
+    transcript = lecture(200)
+    chunks = chunk_text(transcript, tool.chunk_tokens)
+    calls = tool.client.chat.completions.calls
+
+    first = tool.summarize_content(transcript, "abc")
+    map_calls = [content for model, content in calls if model == tool.map_model]
+    assert len(map_calls) == len(chunks) > 1
+    assert all(any(chunk in content for content in map_calls) for chunk in chunks)
+    assert first == f"summary {len(calls)}" and calls[-1][0] == "gpt-4"
+
+    # The same chunks, even in another video, are summarized from the cache: only the reduce call is made
+    calls.clear()
+    tool.summarize_content(transcript, "def")
+    assert [model for model, _ in calls] == ["gpt-4"]
+    assert tool.store().stats()["summaries"] == len(chunks)
+
+
+def test_reduce_condenses_summaries_that_do_not_fit_one_call(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    tool = make_tool(tmp_path, chunk_tokens=100)
+    summaries = [f"Part {i} covers kneading, proofing and baking the bread at length." for i in range(40)]
+    assert tool._reduce_summaries(summaries).startswith("summary")
+    calls = tool.client.chat.completions.calls
+    # Groups of summaries were condensed with the map model before the single final reduce
+    assert [model for model, _ in calls][-1] == "gpt-4"
+    assert sum(model == tool.map_model for model, _ in calls) >= 2
+    assert sum(model == "gpt-4" for model, _ in calls) == 1
+
+
+def test_chunk_summaries_count_toward_the_store_budget(tmp_path):
+    store = TranscriptStore(str(tmp_path / "transcripts.sqlite3"))
+    store.put("a", entries("a"))
+    time.sleep(0.01)
+    store.put("b", entries("b"))
+    transcripts = store.stats()["bytes"]
+    store.max_bytes = transcripts + 1000
+    store.put_summary("a", "hash-a", "mini", "x" * 600)
+    store.put_summary("b", "hash-b", "mini", "y" * 600)
+    # Over budget only because of the summaries: the least recently used video goes, summaries included
+    assert store.get("a") is None and store.get_summary("hash-a", "mini") is None
+    assert store.get("b") == entries("b") and store.get_summary("hash-b", "mini") == "y" * 600
+    assert store.stats()["bytes"] <= store.max_bytes
+
+    # A chunk shared by two videos is kept for each of them, and outlives either one's eviction
+    store.max_bytes = 10 ** 9
+    store.put("c", entries("c"))
+    store.put_summary("b", "shared", "mini", "shared summary")
+    store.put_summary("c", "shared", "mini", "shared summary")
+    assert store.stats()["summaries"] == 3
+    store.get("c")
+    store.max_bytes = store.stats()["bytes"] - 1
+    store.put_summary("c", "other", "mini", "z")
+    assert store.get("b") is None and store.get("c") == entries("c")
+    assert store.get_summary("shared", "mini") == "shared summary"
+
+
+def test_videos_are_processed_concurrently_in_rank_order(tmp_path, monkeypatch):
+    delays = {"first": 0.3, "second": 0.1, "third": 0.0, "empty": 0.0}
+    running = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def process_video(self, video, query=None):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(delays[video["video_id"]])
+        with lock:
+            running["now"] -= 1
+        return None if video["video_id"] == "empty" else {"video": video, "content": f"about {query}"}
+
+    monkeypatch.setattr(YouTubeSearchTool, "process_video", process_video)
+    tool = make_tool(tmp_path, max_workers=3)
+    videos = [{"video_id": video_id} for video_id in ("first", "second", "empty", "third")]
+    started = time.monotonic()
+    results = tool.process_videos(videos, "bread")
+    # The slowest, best ranked video still comes first; videos without a result are left out
+    assert [result["video"]["video_id"] for result in results] == ["first", "second", "third"]
+    assert results[0]["content"] == "about bread"
+    assert running["max"] == 3 and time.monotonic() - started < 0.6
+
+
+def test_videos_past_their_timeout_are_skipped(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def process_video(self, video, query=None):
+        if video["video_id"] == "stuck":
+            release.wait(5)
+        return {"video": video, "content": "done"}
+
+    monkeypatch.setattr(YouTubeSearchTool, "process_video", process_video)
+    tool = make_tool(tmp_path, max_workers=2, video_timeout=0.2)
+    videos = [{"video_id": video_id} for video_id in ("stuck", "quick", "queued")]
+    started = time.monotonic()
+    try:
+        results = tool.process_videos(videos)
+    finally:
+        release.set()
+    # The stuck video is skipped once its own timeout runs out, without holding back the others
+    assert [result["video"]["video_id"] for result in results] == ["quick", "queued"]
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,68 @@
+from typing import Dict, Optional, Tuple
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ariel_view", "analysis_state.sqlite3")
+
+
+def topic_key(topic: str) -> str:
+    """Normalize a topic so trivial case/whitespace differences share state"""
+    return " ".join(topic.lower().split())
+
+
+def transcript_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class AnalysisStateStore:
+    """
+    Per-topic analysis state in SQLite: for every video seen under a topic, the hash of the
+    transcript it was analyzed from and the serialized VideoAnalysis
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.expanduser(path or os.environ.get("ARIEL_STATE_PATH", DEFAULT_STATE_PATH))
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS topic_videos (
+                    topic TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    transcript_hash TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (topic, video_id)
+                )""")
+
+    def load(self, topic: str) -> Dict[str, Tuple[str, str]]:
+        """
+        Stored state for a topic
+        Returns:
+            video_id -> (transcript hash, VideoAnalysis JSON)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT video_id, transcript_hash, analysis FROM topic_videos WHERE topic = ?",
+                (topic_key(topic),)).fetchall()
+        return {video_id: (digest, analysis) for video_id, digest, analysis in rows}
+
+    def save(self, topic: str, video_id: str, digest: str, analysis_json: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO topic_videos VALUES (?, ?, ?, ?, ?)",
+                (topic_key(topic), video_id, digest, analysis_json, time.time()))
+
+    def forget(self, topic: str):
+        """Drop all state for a topic, forcing a full re-analysis next time"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM topic_videos WHERE topic = ?", (topic_key(topic),))
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,289 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from openai import OpenAI
+from .enhanced_youtube_tool import EnhancedYouTubeAnalysisTool, VideoAnalysis
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+DEFAULT_MAX_BYTES = 190 * 1024 * 1024  # the Batch API rejects input files over 200 MB
+
+
+class LocalBatchClient:
+    """
+    Local stand-in for the file and batch endpoints of the OpenAI client. Batches are executed
+    in a background thread pool through a regular chat completions client, so batch mode can
+    run against providers (or test doubles) that have no Batch API
+    """
+
+    def __init__(self, client: Optional[Any] = None, max_workers: int = 8):
+        self._client = client or OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+        # Batches wait on their requests, so they get their own pool: sharing one would deadlock
+        # as soon as running batches occupied every worker their requests need
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._batch_executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._files: Dict[str, bytes] = {}
+        self._batches: Dict[str, Tuple[SimpleNamespace, Future]] = {}
+        self._lock = threading.Lock()
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    def _store(self, data: bytes) -> str:
+        file_id = f"file-local-{uuid.uuid4().hex}"
+        with self._lock:
+            self._files[file_id] = data
+        return file_id
+
+    def _create_file(self, file, purpose: str = "batch") -> SimpleNamespace:
+        data = file.read() if hasattr(file, "read") else file
+        return SimpleNamespace(id=self._store(data), purpose=purpose)
+
+    def _file_content(self, file_id: str) -> SimpleNamespace:
+        with self._lock:
+            data = self._files[file_id]
+        return SimpleNamespace(text=data.decode("utf-8"), content=data)
+
+    def _execute(self, line: str) -> Tuple[Optional[str], Optional[str]]:
+        request = json.loads(line)
+        try:
+            response = self._client.chat.completions.create(**request["body"])
+            body = {"choices": [{"index": 0, "message": {"role": "assistant", "content": response.choices[0].message.content}}]}
+            return json.dumps({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}), None
+        except Exception as e:
+            return None, json.dumps({"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}})
+
+    def _run_batch(self, lines: List[str]) -> Tuple[str, Optional[str]]:
+        results = list(self._executor.map(self._execute, lines))
+        output = "".join(ok + "\n" for ok, _ in results if ok)
+        errors = "".join(error + "\n" for _, error in results if error)
+        return self._store(output.encode("utf-8")), self._store(errors.encode("utf-8")) if errors else None
+
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str = "24h", **kwargs) -> SimpleNamespace:
+        lines = [line for line in self._file_content(input_file_id).text.splitlines() if line.strip()]
+        batch = SimpleNamespace(id=f"batch-local-{uuid.uuid4().hex}", status="in_progress", endpoint=endpoint,
+                                input_file_id=input_file_id, output_file_id=None, error_file_id=None,
+                                request_counts=SimpleNamespace(total=len(lines), completed=0, failed=0))
+        future = self._batch_executor.submit(self._run_batch, lines) if lines else None
+        with self._lock:
+            self._batches[batch.id] = (batch, future)
+        if future is None:
+            batch.status, batch.output_file_id = "completed", self._store(b"")
+        return batch
+
+    def _retrieve_batch(self, batch_id: str) -> SimpleNamespace:
+        with self._lock:
+            batch, future = self._batches[batch_id]
+        if batch.status == "in_progress" and future.done():
+            try:
+                batch.output_file_id, batch.error_file_id = future.result()
+                failed = len(self._file_content(batch.error_file_id).text.splitlines()) if batch.error_file_id else 0
+                batch.request_counts.failed = failed
+                batch.request_counts.completed = batch.request_counts.total - failed
+                batch.status = "completed"
+            except Exception:
+                batch.status = "failed"
+        return batch
+
+
+class BatchVideoAnalyzer:
+    """
+    Non-interactive bulk analysis through the Batch API: every segment-batch prompt of every
+    video is written to a JSONL file, submitted as one or more batches, polled until done and
+    reassembled into VideoAnalysis objects exactly as EnhancedYouTubeAnalysisTool.run would
+    """
+
+    def __init__(
+        self,
+        tool: Optional[EnhancedYouTubeAnalysisTool] = None,
+        client: Optional[Any] = None,
+        work_dir: Optional[str] = None,
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+        completion_window: str = "24h",
+        max_requests: int = 50000,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        """
+        Args:
+            tool: Supplies transcripts, metadata, prompts and result assembly
+            client: OpenAI client (or LocalBatchClient) used for the file and batch endpoints
+            work_dir: Where batch input files are written, a temporary directory by default
+            poll_interval: Seconds between batch status checks
+            timeout: Give up waiting after this many seconds, None waits for the completion window
+            completion_window: Passed on to the Batch API
+            max_requests: Requests per submitted batch, the Batch API accepts up to 50,000
+            max_bytes: Size of a batch input file, the Batch API accepts up to 200 MB
+        """
+        self.tool = tool or EnhancedYouTubeAnalysisTool()
+        self.client = client or self.tool.client
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="ariel_batch_")
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.completion_window = completion_window
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+
+    def prepare(self, videos: Iterable[Union[str, Dict[str, Any]]], query: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch transcripts and metadata and split every video into prompt batches
+        Args:
+            videos: Video ids or search result dicts
+            query: Topic used to pre-filter transcripts, None keeps the most central windows
+        Returns:
+            Plan keyed by video id with the video, its transcript index, metadata, segments
+            and the (custom_id, segments) of each request
+        """
+        plan = {}
+        for video in videos:
+            video_data = {"video_id": video} if isinstance(video, str) else dict(video)
+            video_id = video_data["video_id"]
+            try:
+                index = video_data.get("transcript_index") or self.tool._get_transcript_index(video_id)
+                metadata = self.tool._get_video_metadata(video_id)
+            except Exception as e:
+                print(f"Skipping video {video_id}: {str(e)}")
+                continue
+            segments = self.tool._prepare_segments(index.text, query or video_data.get("search_query"))
+            plan[video_id] = {
+                "video": video_data,
+                "index": index,
+                "metadata": metadata,
+                "segments": segments,
+                "requests": [(f"{video_id}:{n}", batch) for n, batch in enumerate(self.tool._batch_segments(segments))]
+            }
+        return plan
+
+    def write_requests(self, plan: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Write the plan's requests as Batch API JSONL files, starting a new file before one would
+        exceed max_requests lines or max_bytes bytes
+        Raises:
+            ValueError if a single request is larger than max_bytes
+        """
+        paths, f, lines, size = [], None, 0, 0
+        try:
+            for entry in plan.values():
+                for custom_id, segments in entry["requests"]:
+                    body = self.tool._completion_request(self.tool._build_batch_prompt(segments))
+                    line = (json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}) + "\n").encode("utf-8")
+                    if len(line) > self.max_bytes:
+                        raise ValueError(f"Request {custom_id} alone is {len(line)} bytes, over the {self.max_bytes} byte file limit")
+                    if f is None or lines >= self.max_requests or size + len(line) > self.max_bytes:
+                        if f is not None:
+                            f.close()
+                        paths.append(os.path.join(self.work_dir, f"requests-{len(paths):04d}.jsonl"))
+                        f, lines, size = open(paths[-1], "wb"), 0, 0
+                    f.write(line)
+                    lines, size = lines + 1, size + len(line)
+        finally:
+            if f is not None:
+                f.close()
+        return paths
+
+    def submit(self, path: str) -> str:
+        """Upload a request file and start a batch, returns the batch id"""
+        with open(path, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=self.completion_window)
+        print(f"Submitted batch {batch.id} from {path}")
+        return batch.id
+
+    def wait(self, batch_id: str) -> Any:
+        """Poll a batch until it reaches a final status"""
+        started = time.monotonic()
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in FINAL_STATUSES:
+                return batch
+            if self.timeout is not None and time.monotonic() - started > self.timeout:
+                raise TimeoutError(f"Batch {batch_id} still {batch.status} after {self.timeout}s")
+            time.sleep(self.poll_interval)
+
+    def collect(self, batch: Any) -> Dict[str, Any]:
+        """Parsed model output of every successful request in a finished batch, keyed by custom_id"""
+        if batch.status != "completed":
+            print(f"Batch {batch.id} ended as {batch.status}")
+        results = {}
+        if batch.output_file_id:
+            for line in self.client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") != 200:
+                    continue
+                content = response["body"]["choices"][0]["message"]["content"]
+                results[record["custom_id"]] = self.tool._parse_llm_content(content)
+        return results
+
+    def assemble(self, plan: Dict[str, Dict[str, Any]], results: Dict[str, Any]) -> List[VideoAnalysis]:
+        """Turn batch results back into VideoAnalysis objects, failed requests get default analyses"""
+        analyses = []
+        for video_id, entry in plan.items():
+            segment_analyses = []
+            for custom_id, segments in entry["requests"]:
+                segment_analyses.extend(self.tool._parse_batch_result(results.get(custom_id), segments))
+            try:
+                analyses.append(self.tool._build_video_analysis(
+                    entry["video"], entry["metadata"], entry["index"], entry["segments"], segment_analyses))
+            except Exception as e:
+                print(f"Error analyzing video {video_id}: {str(e)}")
+        return analyses
+
+    def run(self, videos: Iterable[Union[str, Dict[str, Any]]], query: Optional[str] = None) -> List[VideoAnalysis]:
+        """
+        Analyze videos in batch mode
+        Args:
+            videos: Video ids or search result dicts
+            query: Topic used to pre-filter transcripts
+        Returns:
+            List of VideoAnalysis objects, in input order
+        """
+        plan = self.prepare(videos, query)
+        batch_ids = [self.submit(path) for path in self.write_requests(plan)]
+        results = {}
+        for batch_id in batch_ids:
+            results.update(self.collect(self.wait(batch_id)))
+        return self.assemble(plan, results)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Analyze YouTube videos in bulk through the OpenAI Batch API")
+    parser.add_argument("video_ids", nargs="*", help="Video IDs to analyze")
+    parser.add_argument("--ids-file", help="File with one video ID per line")
+    parser.add_argument("--topic", help="Topic used to pre-filter transcripts")
+    parser.add_argument("--output", default="video_analyses.jsonl", help="Where to write the analyses (JSONL)")
+    parser.add_argument("--corpus", action="store_true", help="Also append the analyses to the corpus store")
+    parser.add_argument("--local", action="store_true", help="Run requests locally instead of through the Batch API")
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    video_ids = list(args.video_ids)
+    if args.ids_file:
+        with open(args.ids_file, encoding="utf-8") as f:
+            video_ids.extend(line.strip() for line in f if line.strip())
+    if not video_ids:
+        parser.error("no video IDs given")
+
+    tool = EnhancedYouTubeAnalysisTool()
+    client = LocalBatchClient(tool.client) if args.local else tool.client
+    analyses = BatchVideoAnalyzer(tool, client, poll_interval=args.poll_interval).run(video_ids, args.topic)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for analysis in analyses:
+            f.write(analysis.model_dump_json() + "\n")
+    if args.corpus:
+        from .corpus_store import VideoCorpusStore
+        VideoCorpusStore().append(analyses, args.topic or "")
+    print(f"Wrote {len(analyses)} analyses to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Union
+import json
+import os
+import time
+import uuid
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from .analysis_state import topic_key
+
+
+DEFAULT_CORPUS_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ariel_view", "corpus")
+
+# One row per analyzed video. Dict-valued VideoAnalysis fields are kept as JSON strings,
+# sentiment is flattened so it can be aggregated like any other numeric column
+CORPUS_SCHEMA = pa.schema([
+    ("video_id", pa.string()),
+    ("topic", pa.string()),
+    ("title", pa.string()),
+    ("channel", pa.string()),
+    ("url", pa.string()),
+    ("publish_date", pa.date32()),
+    ("duration", pa.string()),
+    ("view_count", pa.int64()),
+    ("relevance_score", pa.float64()),
+    ("technical_complexity", pa.float64()),
+    ("sentiment_positive", pa.float64()),
+    ("sentiment_negative", pa.float64()),
+    ("sentiment_neutral", pa.float64()),
+    ("transcript_summary", pa.string()),
+    ("key_points", pa.list_(pa.string())),
+    ("key_topics", pa.list_(pa.string())),
+    ("timestamps", pa.string()),
+    ("key_point_sources", pa.string()),
+    ("speaker_info", pa.string()),
+    ("analyzed_at", pa.timestamp("ms", tz="UTC")),
+])
+
+DateLike = Union[date, str]
+
+
+def _parse_date(value: Optional[DateLike]) -> Optional[date]:
+    # Accepts dates and ISO strings ("2024-04-13", "2024-04-13T10:00:00Z"), anything else is unknown
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def _row(analysis: Any, topic: str, analyzed_at: datetime) -> Dict[str, Any]:
+    data = analysis.model_dump() if hasattr(analysis, "model_dump") else dict(analysis)
+    sentiment = data.get("sentiment_analysis") or {}
+    return {
+        "video_id": data["video_id"],
+        "topic": topic_key(topic),
+        "title": data.get("title", ""),
+        "channel": data.get("channel", ""),
+        "url": data.get("url", ""),
+        "publish_date": _parse_date(data.get("publish_date")),
+        "duration": data.get("duration", ""),
+        "view_count": int(data.get("view_count") or 0),
+        "relevance_score": float(data.get("relevance_score") or 0.0),
+        "technical_complexity": float(data.get("technical_complexity") or 0.0),
+        "sentiment_positive": float(sentiment.get("positive", 0.0)),
+        "sentiment_negative": float(sentiment.get("negative", 0.0)),
+        "sentiment_neutral": float(sentiment.get("neutral", 0.0)),
+        "transcript_summary": data.get("transcript_summary", ""),
+        "key_points": list(data.get("key_points") or []),
+        "key_topics": list(data.get("key_topics") or []),
+        "timestamps": json.dumps(data.get("timestamps") or {}),
+        "key_point_sources": json.dumps(data.get("key_point_sources") or {}),
+        "speaker_info": json.dumps(data.get("speaker_info") or {}),
+        "analyzed_at": analyzed_at,
+    }
+
+
+class VideoCorpusStore:
+    """
+    Append-only Parquet corpus of VideoAnalysis results. Every append writes one Parquet file,
+    scans read the directory as an Arrow dataset through memory-mapped files so only the
+    projected columns and matching row groups are touched
+    """
+
+    def __init__(self, path: Optional[str] = None, row_group_size: int = 10000):
+        self.path = os.path.expanduser(path or os.environ.get("ARIEL_CORPUS_PATH", DEFAULT_CORPUS_PATH))
+        self.row_group_size = row_group_size
+        os.makedirs(self.path, exist_ok=True)
+        self._filesystem = fs.LocalFileSystem(use_mmap=True)
+
+    def append(self, analyses: Sequence[Any], topic: str = "") -> Optional[str]:
+        """
+        Write a batch of analyses as a new Parquet file
+        Args:
+            analyses: VideoAnalysis objects (or dicts with the same fields)
+            topic: The topic the videos were analyzed for
+        Returns:
+            Path of the written file, None for an empty batch
+        """
+        if not analyses:
+            return None
+        analyzed_at = datetime.now(timezone.utc)
+        rows = [_row(analysis, topic, analyzed_at) for analysis in analyses]
+        return self.append_table(pa.Table.from_pylist(rows, schema=CORPUS_SCHEMA))
+
+    def append_table(self, table: pa.Table) -> str:
+        """Write an Arrow table that already follows CORPUS_SCHEMA as a new Parquet file"""
+        name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        # Write under a temporary name so concurrent scans never see a partial file
+        tmp_path = os.path.join(self.path, "." + name)
+        pq.write_table(table.cast(CORPUS_SCHEMA), tmp_path, row_group_size=self.row_group_size, compression="zstd")
+        final_path = os.path.join(self.path, name)
+        os.replace(tmp_path, final_path)
+        return final_path
+
+    def _files(self) -> List[str]:
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                      if name.startswith("part-") and name.endswith(".parquet"))
+
+    def _filter(
+        self,
+        channel: Optional[Union[str, Sequence[str]]],
+        topic: Optional[str],
+        since: Optional[DateLike],
+        until: Optional[DateLike],
+        min_relevance: Optional[float]
+    ) -> Optional[ds.Expression]:
+        conditions = []
+        if channel is not None:
+            channels = [channel] if isinstance(channel, str) else list(channel)
+            conditions.append(ds.field("channel").isin(channels))
+        if topic is not None:
+            conditions.append(ds.field("topic") == topic_key(topic))
+        if since is not None:
+            conditions.append(ds.field("publish_date") >= pa.scalar(_parse_date(since), pa.date32()))
+        if until is not None:
+            conditions.append(ds.field("publish_date") <= pa.scalar(_parse_date(until), pa.date32()))
+        if min_relevance is not None:
+            conditions.append(ds.field("relevance_score") >= min_relevance)
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def scan(
+        self,
+        columns: Optional[List[str]] = None,
+        channel: Optional[Union[str, Sequence[str]]] = None,
+        topic: Optional[str] = None,
+        key_topic: Optional[str] = None,
+        since: Optional[DateLike] = None,
+        until: Optional[DateLike] = None,
+        min_relevance: Optional[float] = None
+    ) -> pa.Table:
+        """
+        Read matching rows, projected to the requested columns
+        Args:
+            columns: Columns to return, all of them by default
+            channel: One channel name or several
+            topic: The analyzed topic, normalized like the analysis state
+            key_topic: A topic the LLM extracted from the video (case-insensitive)
+            since: Earliest publish date, inclusive
+            until: Latest publish date, inclusive
+            min_relevance: Lowest relevance score to include
+        Returns:
+            Arrow table
+        """
+        files = self._files()
+        if not files:
+            empty = CORPUS_SCHEMA.empty_table()
+            return empty.select(columns) if columns else empty
+        dataset = ds.dataset(files, schema=CORPUS_SCHEMA, format="parquet", filesystem=self._filesystem)
+        read_columns = columns
+        if key_topic is not None and columns and "key_topics" not in columns:
+            read_columns = list(columns) + ["key_topics"]
+        table = dataset.to_table(columns=read_columns,
+                                 filter=self._filter(channel, topic, since, until, min_relevance))
+        if key_topic is not None:
+            # List membership isn't expressible as a pushdown filter, check it on the projected table
+            topics = table.column("key_topics").combine_chunks()
+            matches = pc.equal(pc.utf8_lower(pc.list_flatten(topics)), key_topic.lower())
+            rows = pc.list_parent_indices(topics).filter(matches)
+            mask = pc.is_in(pa.array(range(table.num_rows)), value_set=pc.unique(rows))
+            table = table.filter(mask)
+            if read_columns is not columns:
+                table = table.drop_columns(["key_topics"])
+        return table
+
+    def summarize(self, by: str = "channel", **filters) -> pa.Table:
+        """
+        Per-group aggregates for dashboards: video count, mean relevance, complexity and sentiment
+        Args:
+            by: Column to group on, e.g. channel or topic
+            **filters: Passed on to scan
+        Returns:
+            Arrow table with one row per group
+        """
+        metrics = ["relevance_score", "technical_complexity", "sentiment_positive", "sentiment_negative"]
+        table = self.scan(columns=[by, "video_id"] + metrics, **filters)
+        return table.group_by(by).aggregate(
+            [("video_id", "count_distinct")] + [(metric, "mean") for metric in metrics])
+
+    def compact(self) -> Optional[str]:
+        """Merge all part files into one, keeping the latest row per (topic, video_id)"""
+        files = self._files()
+        if len(files) < 2:
+            return files[0] if files else None
+        # Files are named by write time, so the last occurrence of a key is the latest analysis
+        table = self.scan()
+        latest = {}
+        for row, key in enumerate(zip(table.column("topic").to_pylist(), table.column("video_id").to_pylist())):
+            latest[key] = row
+        path = self.append_table(table.take(sorted(latest.values())))
+        for file in files:
+            os.remove(file)
+        return path
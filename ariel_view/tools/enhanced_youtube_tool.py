@@ -1,7 +1,20 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Union
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from agentpro.tools.chunking import chunk_text, count_tokens
+from agentpro.tools.near_duplicates import consolidate
+from agentpro.tools.relevance import hashed_tfidf_cosine, select_relevant_text, tokenize
+from agentpro.tools.transcript_index import TranscriptIndex, format_timestamp
+import asyncio
+import hashlib
+import inspect
+import json
 import os
+import weakref
+import numpy as np
+from .corpus_store import VideoCorpusStore
+from .analysis_state import AnalysisStateStore, transcript_hash
+from .text_metrics import overall_complexity, overall_sentiment
 
 class VideoAnalysis(BaseModel):
     video_id: str
@@ -13,6 +26,7 @@ class VideoAnalysis(BaseModel):
     view_count: int = 0
     transcript_summary: str = ''
     key_points: List[str] = []
+    key_point_sources: Dict[str, List[int]] = {}  # key point -> indices of the segments it was merged from
     timestamps: Dict[str, str] = {}  # timestamp -> description
     relevance_score: float = 0.0
     sentiment_analysis: Dict[str, float] = {'positive': 0.33, 'negative': 0.33, 'neutral': 0.34}
@@ -20,61 +34,328 @@ class VideoAnalysis(BaseModel):
     key_topics: List[str] = []
     speaker_info: Dict[str, str] = {}  # speaker -> role/description
 
+class SegmentUpdate(BaseModel):
+    """Partial progress for one video, emitted as each batch of its segments is analyzed"""
+    video_id: str
+    title: str = ''
+    segments_done: int
+    segments_total: int
+    analyses: List[Dict[str, Any]] = []  # analyses of the batch that just finished
+
+DEFAULT_SEGMENT_ANALYSIS = {
+    "summary": "",
+    "key_points": [],
+    "topics": [],
+    "speakers": {}
+}
+
+LLM_ERROR_ANALYSIS = {
+    "summary": "Error analyzing video content",
+    "key_points": ["Could not analyze video"],
+    "topics": ["error"],
+    "speaker_info": {}
+}
+
 class EnhancedYouTubeAnalysisTool:
     name: str = "enhanced_youtube_analysis"
     description: str = "performs in-depth analysis of relevant youtube videos"
     arg: str = "topic to analyze from youtube"
+    analysis_model: str = "gpt-4-turbo-preview"  # model used for segment analysis
+    prefilter_tokens: int = 3000  # transcript tokens kept for LLM analysis, 0 disables the pre-filter
+    segment_tokens: int = 800  # target size of each analyzed transcript segment
+    batch_tokens: int = 6000  # transcript tokens sent per batched analysis call
+    max_concurrency: int = 8  # LLM calls in flight at once across all videos and segments of a run
+    max_videos: int = 5  # candidates that get the expensive per-segment analysis
+    min_relevance: float = 0.05  # candidates scoring below this are not analyzed
+    relevance_weights: Dict[str, float] = {'title': 0.5, 'description': 0.2, 'transcript': 0.3}
+    incremental: bool = True  # reuse stored analyses of videos whose transcript hasn't changed
+    keep_previous_videos: bool = False  # also return videos analyzed in earlier runs of the same topic
+    max_previous_videos: int = 5  # most relevant earlier videos kept when keep_previous_videos is on
 
-    def __init__(self):
+    def __init__(self, state_store: Optional[AnalysisStateStore] = None, corpus_store: Optional[VideoCorpusStore] = None):
         self.client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+        self.async_client = AsyncOpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
         if not os.environ.get('OPENAI_API_KEY'):
             raise ValueError('OPENAI_API_KEY environment variable not set')
+        self._state_store = state_store
+        self.corpus_store = corpus_store  # when set, every freshly analyzed video is archived here
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
 
-    def run(self, prompt: str) -> List[VideoAnalysis]:
+    @property
+    def state_store(self) -> AnalysisStateStore:
+        # The default store (ARIEL_STATE_PATH) is opened on first use, not when the tool is built
+        if self._state_store is None:
+            self._state_store = AnalysisStateStore()
+        return self._state_store
+
+    @state_store.setter
+    def state_store(self, state_store: Optional[AnalysisStateStore]):
+        self._state_store = state_store
+
+    async def run(
+        self,
+        prompt: str,
+        candidates: Optional[List[Dict[str, Any]]] = None,
+        topic: Optional[str] = None
+    ) -> List[VideoAnalysis]:
         """
         Search for relevant videos and perform in-depth analysis
         Args:
-            prompt: The topic to analyze
+            prompt: The topic to analyze, or a search query refined from it
+            candidates: Prefetched candidates from prefetch_candidates, searched for when None
+            topic: The raw topic when prompt is a refined query; keys the stored state, so re-runs
+                find it even when the refinement changes (the prompt when None)
         Returns:
             List of VideoAnalysis objects containing detailed analysis of each relevant video
         """
         try:
-            # Mock video search for now
-            search_results = [
-                {
-                    'video_id': '123',
-                    'title': 'Sample Video 1',
-                    'channel': 'Sample Channel',
-                    'duration': '10:00',
-                    'view_count': 1000,
-                    'publish_date': '2024-04-13'
-                },
-                {
-                    'video_id': '456',
-                    'title': 'Sample Video 2',
-                    'channel': 'Sample Channel',
-                    'duration': '15:00',
-                    'view_count': 2000,
-                    'publish_date': '2024-04-13'
-                }
-            ]
+            videos = await self._select_videos(prompt, candidates, topic)
+            state_key = topic or prompt
+            state = await self._load_state(state_key)
             
-            analyzed_videos = []
+            # One semaphore bounds LLM calls across every video and segment of this run
+            semaphore = asyncio.Semaphore(self.max_concurrency)
             
-            # Process each video in depth
-            for video in search_results[:5]:  # Analyze top 5 most relevant videos
-                analysis = self._analyze_video(video)
-                if analysis:
-                    analyzed_videos.append(analysis)
+            # Process each video in depth, concurrently, skipping unchanged ones seen before
+            fresh = []
+            analyses = await asyncio.gather(*(
+                self._analyze_or_reuse(state_key, video, semaphore, state=state, fresh=fresh) for video in videos
+            ))
+            results = [analysis for analysis in analyses if analysis]
+            await self._archive(prompt, fresh)
             
-            return analyzed_videos
+            # Merge with what earlier runs of this topic found
+            results.extend(self._previous_analyses(state, videos))
+            return sorted(results, key=lambda analysis: -analysis.relevance_score)
 
         except Exception as e:
             raise Exception(f"Error analyzing YouTube videos: {str(e)}")
 
-    def _get_transcript(self, video_id: str) -> str:
-        # Mock transcript for now
-        return f"This is a mock transcript for video {video_id}. It contains some technical terms and discussions about various topics."
+    async def stream(
+        self,
+        prompt: str,
+        include_segments: bool = False,
+        candidates: Optional[List[Dict[str, Any]]] = None,
+        topic: Optional[str] = None
+    ) -> AsyncIterator[Union[VideoAnalysis, SegmentUpdate]]:
+        """
+        Like run, but yield each VideoAnalysis as soon as it is complete
+        Args:
+            prompt: The topic to analyze, or a search query refined from it
+            include_segments: Also yield a SegmentUpdate whenever a batch of segments finishes
+            candidates: Prefetched candidates from prefetch_candidates, searched for when None
+            topic: See run
+        Yields:
+            VideoAnalysis objects in completion order, interleaved with SegmentUpdates if requested
+        """
+        videos = await self._select_videos(prompt, candidates, topic)
+        state_key = topic or prompt
+        state = await self._load_state(state_key)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        queue: asyncio.Queue = asyncio.Queue()
+        fresh = []
+        
+        async def analyze(video):
+            try:
+                on_progress = queue.put_nowait if include_segments else None
+                queue.put_nowait(await self._analyze_or_reuse(state_key, video, semaphore, on_progress, state, fresh))
+            finally:
+                queue.put_nowait(None)  # marks this video as finished
+        
+        tasks = [asyncio.create_task(analyze(video)) for video in videos]
+        try:
+            pending = len(tasks)
+            while pending:
+                item = await queue.get()
+                if item is None:
+                    pending -= 1
+                elif item:
+                    yield item
+            for analysis in self._previous_analyses(state, videos):
+                yield analysis
+            await self._archive(prompt, fresh)
+        finally:
+            # The consumer may stop early, don't leave analyses running
+            for task in tasks:
+                task.cancel()
+
+    async def _load_state(self, topic: str) -> Optional[Dict[str, Any]]:
+        # Stored per-topic state, None when incremental analysis is off
+        if not self.incremental:
+            return None
+        return await asyncio.to_thread(self.state_store.load, topic)
+
+    async def _analyze_or_reuse(
+        self,
+        topic: str,
+        video: Dict[str, Any],
+        semaphore: asyncio.Semaphore,
+        on_progress: Optional[Callable[[SegmentUpdate], None]] = None,
+        state: Optional[Dict[str, Any]] = None,
+        fresh: Optional[List[VideoAnalysis]] = None
+    ) -> Optional[VideoAnalysis]:
+        """
+        Analyze a video unless this topic already has an analysis of the same transcript
+        Args:
+            topic: The raw topic, which keys the stored state
+            video: Selected candidate with its transcript
+            semaphore: Bounds concurrent LLM calls across the whole run
+            on_progress: Passed on to _analyze_video
+            state: The topic's stored state from _load_state
+            fresh: Collects analyses that were actually computed, not reused
+        Returns:
+            Stored or fresh VideoAnalysis, None if the analysis failed
+        """
+        digest = transcript_hash(video.get("transcript") or "")
+        stored = state.get(video["video_id"]) if state else None
+        if stored and stored[0] == digest:
+            analysis = VideoAnalysis.model_validate_json(stored[1])
+            analysis.relevance_score = video.get("relevance_score", analysis.relevance_score)
+            return analysis
+        analysis = await self._analyze_video(video, semaphore, on_progress)
+        if analysis and state is not None:
+            await asyncio.to_thread(self.state_store.save, topic, video["video_id"], digest, analysis.model_dump_json())
+        if analysis and fresh is not None:
+            fresh.append(analysis)
+        return analysis
+
+    async def _archive(self, prompt: str, analyses: List[VideoAnalysis]):
+        # One corpus file per run keeps appends batched
+        if self.corpus_store is not None and analyses:
+            await asyncio.to_thread(self.corpus_store.append, analyses, prompt)
+
+    def _previous_analyses(self, state: Optional[Dict[str, Any]], videos: List[Dict[str, Any]]) -> List[VideoAnalysis]:
+        # Stored analyses of videos that are not among this run's candidates
+        if not state or not self.keep_previous_videos:
+            return []
+        current = {video["video_id"] for video in videos}
+        previous = [VideoAnalysis.model_validate_json(analysis)
+                    for video_id, (_, analysis) in state.items() if video_id not in current]
+        return sorted(previous, key=lambda analysis: -analysis.relevance_score)[:self.max_previous_videos]
+
+    async def prefetch_candidates(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Search and fetch transcripts ahead of time, e.g. on the raw topic while research runs
+        Args:
+            query: Preliminary search query
+        Returns:
+            Unranked candidates with transcripts, to pass to run or stream as candidates
+        """
+        search_results = await asyncio.to_thread(self._search_videos, query)
+        return await self._fetch_transcripts(search_results)
+
+    async def select_videos(
+        self,
+        prompt: str,
+        candidates: Optional[List[Dict[str, Any]]] = None,
+        topic: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        The videos run would analyze, for callers that schedule each analysis themselves
+        Args:
+            prompt: The analysis query
+            candidates: Prefetched candidates from prefetch_candidates, searched for when None
+            topic: See run
+        Returns:
+            Ranked candidates with transcripts, ready for analyze_selected
+        """
+        return await self._select_videos(prompt, candidates, topic)
+
+    async def analyze_selected(self, video: Dict[str, Any]) -> Optional[VideoAnalysis]:
+        """
+        Analyze one video from select_videos, reusing the topic's stored analysis when its transcript is unchanged
+        Args:
+            video: Selected candidate, its topic keys the stored state
+        Returns:
+            VideoAnalysis, None if the analysis failed
+        """
+        topic = video.get("topic") or video.get("search_query", "")
+        state = await self._load_state(topic)
+        fresh = []
+        analysis = await self._analyze_or_reuse(topic, video, self._loop_semaphore(), state=state, fresh=fresh)
+        await self._archive(video.get("search_query", ""), fresh)
+        return analysis
+
+    def _loop_semaphore(self) -> asyncio.Semaphore:
+        # Videos analyzed one call at a time still share one bound on LLM calls per event loop
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+
+    def analysis_version(self) -> str:
+        """Hash of everything that shapes an analysis (model, token budgets, prompts), for keying cached analyses"""
+        config = [self.analysis_model, self.prefilter_tokens, self.segment_tokens, self.batch_tokens,
+                  inspect.getsource(type(self)._build_batch_prompt), inspect.getsource(type(self)._analysis_messages),
+                  inspect.getsource(type(self)._completion_request)]
+        return hashlib.sha256(json.dumps(config).encode("utf-8")).hexdigest()[:16]
+
+    async def _fetch_transcripts(self, videos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Fetch candidate transcripts concurrently so ranking can look at the content
+        indexes = await asyncio.gather(*(
+            asyncio.to_thread(self._get_transcript_index, video['video_id']) for video in videos
+        ))
+        for video, index in zip(videos, indexes):
+            video["transcript_index"] = index
+            video["transcript"] = index.text
+        return videos
+
+    async def _select_videos(
+        self,
+        prompt: str,
+        candidates: Optional[List[Dict[str, Any]]] = None,
+        topic: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        # Search, fetch candidate transcripts and rank them locally
+        if candidates is None:
+            candidates = await self._fetch_transcripts(await asyncio.to_thread(self._search_videos, prompt))
+        else:
+            # Prefetched candidates are re-ranked against the real query, and only
+            # topped up with a new search when too few of them are relevant
+            candidates = [dict(candidate) for candidate in candidates]
+            if len(self._rank_candidates(prompt, candidates, fallback=False)) < self.max_videos:
+                seen = {candidate["video_id"] for candidate in candidates}
+                search_results = await asyncio.to_thread(self._search_videos, prompt)
+                candidates += await self._fetch_transcripts([video for video in search_results if video["video_id"] not in seen])
+        for candidate in candidates:
+            candidate["search_query"] = prompt  # what the transcript is pre-filtered against
+            candidate["topic"] = topic or prompt  # what the stored state is kept under
+        
+        # Rank locally, only the best candidates go on to LLM analysis
+        return self._rank_candidates(prompt, candidates)
+
+    def _search_videos(self, query: str) -> List[Dict[str, Any]]:
+        # Mock video search for now
+        return [
+            {
+                'video_id': '123',
+                'title': 'Sample Video 1',
+                'channel': 'Sample Channel',
+                'duration': '10:00',
+                'view_count': 1000,
+                'publish_date': '2024-04-13'
+            },
+            {
+                'video_id': '456',
+                'title': 'Sample Video 2',
+                'channel': 'Sample Channel',
+                'duration': '15:00',
+                'view_count': 2000,
+                'publish_date': '2024-04-13'
+            }
+        ]
+
+    def _get_transcript_entries(self, video_id: str) -> List[Dict[str, Any]]:
+        # Mock timed transcript entries for now
+        sentences = [
+            f"This is a mock transcript for video {video_id}.",
+            "It contains some technical terms and discussions about various topics."
+        ]
+        return [{'text': text, 'start': i * 5.0, 'duration': 5.0} for i, text in enumerate(sentences)]
+
+    def _get_transcript_index(self, video_id: str) -> TranscriptIndex:
+        # Keep the timed entries as columns so analyzed text maps back to video time
+        return TranscriptIndex(self._get_transcript_entries(video_id))
 
     def _get_video_metadata(self, video_id: str) -> Dict[str, Any]:
         # Mock metadata for now
@@ -87,44 +368,97 @@ class EnhancedYouTubeAnalysisTool:
         }
 
     def _segment_transcript(self, transcript: str) -> List[str]:
-        # Simple segmentation by sentences
-        return [s.strip() for s in transcript.split('.') if s.strip()]
+        # Pack sentences into segments of roughly segment_tokens each
+        return chunk_text(transcript, self.segment_tokens)
+
+    def _batch_segments(self, segments: List[str]) -> List[List[str]]:
+        # Group consecutive segments so each analysis call carries up to batch_tokens of transcript
+        batches, current, current_tokens = [], [], 0
+        for segment in segments:
+            segment_tokens = count_tokens(segment)
+            if current and current_tokens + segment_tokens > self.batch_tokens:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(segment)
+            current_tokens += segment_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _build_batch_prompt(self, segments: List[str]) -> str:
+        numbered = "\n\n".join(f"Segment {i}:\n{segment}" for i, segment in enumerate(segments))
+        analysis_prompt = f"""
+        Analyze each of the following {len(segments)} video segments independently. Return a JSON object
+        with a "segments" array holding exactly one entry per segment, in order, each with:
+        index (the segment number), summary, key_points (list), topics (list),
+        speakers (dict of speaker -> role, if identifiable).
+        
+        {numbered}
+        """
+        return analysis_prompt
+
+    def _parse_batch_result(self, result: Any, segments: List[str]) -> List[Dict[str, Any]]:
+        # Map a batched response back onto its segments, in order
+        items = result.get("segments") if isinstance(result, dict) else None
+        if not isinstance(items, list):
+            # The call failed or returned something else entirely, flag it so the video can be dropped
+            return [dict(DEFAULT_SEGMENT_ANALYSIS, failed=True) for _ in segments]
+        items = [item for item in items if isinstance(item, dict)]
+        by_index = {item.get("index"): item for item in items}
+        if set(by_index) != set(range(len(segments))) and len(items) == len(segments):
+            # Indices missing or numbered differently, trust the array order instead
+            return items
+        return [by_index.get(i, dict(DEFAULT_SEGMENT_ANALYSIS)) for i in range(len(segments))]
+
+    def _analyze_segment_batch(self, segments: List[str]) -> List[Dict[str, Any]]:
+        """
+        Analyze several transcript segments in one LLM call
+        Args:
+            segments: Consecutive transcript segments
+        Returns:
+            One analysis dict per segment, in the same order
+        """
+        result = self._analyze_with_llm(self._build_batch_prompt(segments))
+        return self._parse_batch_result(result, segments)
+
+    async def _analyze_segment_batch_async(self, segments: List[str], semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+        """Async variant of _analyze_segment_batch, waiting on the run-wide semaphore"""
+        result = await self._analyze_with_llm_async(self._build_batch_prompt(segments), semaphore)
+        return self._parse_batch_result(result, segments)
 
     def _combine_segment_analyses(self, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
         # Combine all segment analyses
-        all_topics = set()
+        all_topics = []
         all_key_points = []
+        point_segments = []
         summary_parts = []
 
-        for analysis in analyses:
-            all_topics.update(analysis.get('topics', []))
-            all_key_points.extend(analysis.get('key_points', []))
+        for index, analysis in enumerate(analyses):
+            all_topics.extend(analysis.get('topics', []))
+            for point in analysis.get('key_points', []):
+                all_key_points.append(point)
+                point_segments.append(index)
             if 'summary' in analysis:
                 summary_parts.append(analysis['summary'])
 
+        # Merge paraphrased duplicates across segments, remembering where each point came from
+        key_points = consolidate(all_key_points)
         return {
             'summary': ' '.join(summary_parts),
-            'key_points': list(set(all_key_points)),
-            'topics': list(all_topics)
+            'key_points': [point for point, _ in key_points],
+            'key_point_sources': {
+                point: sorted({point_segments[i] for i in members}) for point, members in key_points
+            },
+            'topics': [topic for topic, _ in consolidate(all_topics)]
         }
 
-    def _calculate_overall_sentiment(self, analyses: List[Dict[str, Any]]) -> Dict[str, float]:
-        # Average sentiment scores
-        total_positive = sum(a.get('sentiment', {}).get('positive', 0) for a in analyses)
-        total_negative = sum(a.get('sentiment', {}).get('negative', 0) for a in analyses)
-        total_neutral = sum(a.get('sentiment', {}).get('neutral', 0) for a in analyses)
-        count = len(analyses) or 1
-
-        return {
-            'positive': total_positive / count,
-            'negative': total_negative / count,
-            'neutral': total_neutral / count
-        }
+    def _calculate_overall_sentiment(self, segments: List[str]) -> Dict[str, float]:
+        # Scored locally from an opinion lexicon, so the LLM doesn't have to produce it
+        return overall_sentiment(segments)
 
-    def _calculate_technical_complexity(self, analyses: List[Dict[str, Any]]) -> float:
-        # Average complexity scores
-        total = sum(a.get('technical_complexity', 0) for a in analyses)
-        return total / (len(analyses) or 1)
+    def _calculate_technical_complexity(self, segments: List[str]) -> float:
+        # Readability and jargon density, computed locally across all segments at once
+        return overall_complexity(segments)
 
     def _extract_speakers(self, analyses: List[Dict[str, Any]]) -> Dict[str, str]:
         # Combine speaker information
@@ -134,95 +468,189 @@ class EnhancedYouTubeAnalysisTool:
                 speakers.update(analysis['speakers'])
         return speakers
 
-    def _generate_smart_timestamps(self, transcript: str, analyses: List[Dict[str, Any]]) -> Dict[str, str]:
-        # Mock timestamps for now
-        return {
-            '0:00': 'Introduction',
-            '1:00': 'Main discussion',
-            '5:00': 'Conclusion'
-        }
+    def _generate_smart_timestamps(self, index: TranscriptIndex, segments: List[str], analyses: List[Dict[str, Any]]) -> Dict[str, str]:
+        # Map each analyzed segment's position in the transcript to its start time
+        located = [(offset, analysis) for offset, analysis in zip(index.locate(segments), analyses) if offset is not None]
+        times = index.times_at([offset for offset, _ in located])
+        timestamps = {}
+        for seconds, (_, analysis) in zip(times, located):
+            description = analysis.get('summary') or ', '.join(analysis.get('topics', [])[:3])
+            if len(description) > 120:
+                description = description[:117].rstrip() + '...'
+            timestamps.setdefault(format_timestamp(seconds), description)
+        return timestamps
+
+    def _calculate_relevance_scores(self, query: str, candidates: List[Dict[str, Any]]) -> np.ndarray:
+        # Weighted hashed TF-IDF cosine of the query against title, description and transcript
+        scores = np.zeros(len(candidates))
+        for field, weight in self.relevance_weights.items():
+            texts = [candidate.get(field) or '' for candidate in candidates]
+            scores += weight * hashed_tfidf_cosine(query, texts)
+        return scores
 
-    def _calculate_relevance_score(self, analysis: Dict[str, Any], query: str, complexity: float) -> float:
-        # Mock relevance calculation
-        return 0.8
+    def _rank_candidates(self, query: str, candidates: List[Dict[str, Any]], fallback: bool = True) -> List[Dict[str, Any]]:
+        """
+        Score search results locally and pick the ones worth a deep analysis
+        Args:
+            query: The search query
+            candidates: Search results, with transcripts when available
+            fallback: When no candidate scores min_relevance, keep the best max_videos anyway
+                rather than analyzing nothing
+        Returns:
+            Up to max_videos candidates scoring at least min_relevance, best first,
+            each with its relevance_score filled in
+        """
+        if not candidates:
+            return []
+        scores = self._calculate_relevance_scores(query, candidates)
+        for candidate, score in zip(candidates, scores):
+            candidate["relevance_score"] = float(score)
+        order = np.argsort(-scores, kind="stable")
+        if not tokenize(query):
+            # Nothing to match against, keep the search engine's order
+            return [candidates[i] for i in order[:self.max_videos]]
+        relevant = [candidates[i] for i in order if scores[i] >= self.min_relevance][:self.max_videos]
+        if not relevant and fallback:
+            return [candidates[i] for i in order[:self.max_videos]]
+        return relevant
 
-    def _analyze_video(self, video_data: Dict[str, Any]) -> VideoAnalysis:
+    async def _analyze_video(
+        self,
+        video_data: Dict[str, Any],
+        semaphore: asyncio.Semaphore,
+        on_progress: Optional[Callable[[SegmentUpdate], None]] = None
+    ) -> VideoAnalysis:
         """
         Perform detailed analysis of a single video
         Args:
             video_data: Data about the video from initial search
+            semaphore: Bounds concurrent LLM calls across the whole run
+            on_progress: Called with a SegmentUpdate as each batch of segments completes
         Returns:
             VideoAnalysis object containing detailed analysis
         """
         try:
             # Get video transcript and metadata
-            transcript = self._get_transcript(video_data["video_id"])
-            metadata = self._get_video_metadata(video_data["video_id"])
-            
-            # Split transcript into segments for better analysis
-            segments = self._segment_transcript(transcript)
-            
-            # Analyze each segment with LLM
-            segment_analyses = []
-            for segment in segments:
-                analysis_prompt = f"""
-                Analyze this video segment and provide:
-                1. Summary of the segment
-                2. Key points discussed
-                3. Technical terms used and their explanations
-                4. Speaker identification (if multiple speakers)
-                5. Sentiment analysis
-                6. Technical complexity (0-1 score)
-                7. Key topics covered
-                
-                Segment: {segment}
-                """
-                
-                segment_analysis = self._analyze_with_llm(analysis_prompt)
-                segment_analyses.append(segment_analysis)
-            
-            # Combine segment analyses
-            combined_analysis = self._combine_segment_analyses(segment_analyses)
+            index = video_data.get("transcript_index")
+            if index is None:
+                index = await asyncio.to_thread(self._get_transcript_index, video_data["video_id"])
+            metadata = await asyncio.to_thread(self._get_video_metadata, video_data["video_id"])
+            segments = self._prepare_segments(index.text, video_data.get("search_query"))
             
-            # Calculate overall metrics
-            sentiment = self._calculate_overall_sentiment(segment_analyses)
-            technical_complexity = self._calculate_technical_complexity(segment_analyses)
+            # Analyze segments with LLM, several segments per call, all batches concurrently
+            progress = {"done": 0}
             
-            # Extract speaker information
-            speakers = self._extract_speakers(segment_analyses)
+            async def analyze_batch(batch):
+                analyses = await self._analyze_segment_batch_async(batch, semaphore)
+                if on_progress:
+                    progress["done"] += len(batch)
+                    on_progress(SegmentUpdate(
+                        video_id=video_data["video_id"],
+                        title=video_data.get("title", ""),
+                        segments_done=progress["done"],
+                        segments_total=len(segments),
+                        analyses=analyses
+                    ))
+                return analyses
             
-            # Generate timestamps with context
-            timestamps = self._generate_smart_timestamps(transcript, segment_analyses)
-            
-            # Calculate relevance score based on multiple factors
-            relevance_score = self._calculate_relevance_score(
-                combined_analysis,
-                video_data.get("search_query", ""),
-                technical_complexity
-            )
-            
-            return VideoAnalysis(
-                video_id=video_data["video_id"],
-                title=metadata["title"],
-                channel=metadata["channel"],
-                url=f"https://youtube.com/watch?v={video_data['video_id']}",
-                publish_date=metadata["publish_date"],
-                duration=metadata["duration"],
-                view_count=metadata["view_count"],
-                transcript_summary=combined_analysis["summary"],
-                key_points=combined_analysis["key_points"],
-                timestamps=timestamps,
-                relevance_score=relevance_score,
-                sentiment_analysis=sentiment,
-                technical_complexity=technical_complexity,
-                key_topics=combined_analysis["topics"],
-                speaker_info=speakers
-            )
+            batch_results = await asyncio.gather(*(analyze_batch(batch) for batch in self._batch_segments(segments)))
+            # gather preserves order, so segments stay in transcript order
+            segment_analyses = [analysis for batch in batch_results for analysis in batch]
+            return self._build_video_analysis(video_data, metadata, index, segments, segment_analyses)
 
         except Exception as e:
             print(f"Error analyzing video {video_data['video_id']}: {str(e)}")
             return None
 
+    def _prepare_segments(self, transcript: str, query: Optional[str] = None) -> List[str]:
+        # Keep only the transcript windows relevant to the query before paying for LLM calls
+        relevant_text = transcript
+        if self.prefilter_tokens:
+            relevant_text = select_relevant_text(transcript, query, self.prefilter_tokens)
+        
+        # Split transcript into segments for better analysis
+        return self._segment_transcript(relevant_text)
+
+    def _build_video_analysis(
+        self,
+        video_data: Dict[str, Any],
+        metadata: Dict[str, Any],
+        index: TranscriptIndex,
+        segments: List[str],
+        segment_analyses: List[Dict[str, Any]]
+    ) -> VideoAnalysis:
+        """
+        Assemble a VideoAnalysis from per-segment LLM analyses
+        Args:
+            video_data: Data about the video from initial search
+            metadata: Video metadata from _get_video_metadata
+            index: Transcript index of the video
+            segments: Analyzed segments, in transcript order
+            segment_analyses: One analysis dict per segment
+        Returns:
+            VideoAnalysis object containing detailed analysis
+        Raises:
+            ValueError if the LLM analysis of every segment failed, an empty analysis must not be stored or archived
+        """
+        if segment_analyses and all(analysis.get("failed") for analysis in segment_analyses):
+            raise ValueError("LLM analysis failed for every segment")
+        
+        # Combine segment analyses
+        combined_analysis = self._combine_segment_analyses(segment_analyses)
+        
+        # Calculate overall metrics
+        sentiment = self._calculate_overall_sentiment(segments)
+        technical_complexity = self._calculate_technical_complexity(segments)
+        
+        # Extract speaker information
+        speakers = self._extract_speakers(segment_analyses)
+        
+        # Generate timestamps with context
+        timestamps = self._generate_smart_timestamps(index, segments, segment_analyses)
+        
+        return VideoAnalysis(
+            video_id=video_data["video_id"],
+            title=metadata["title"],
+            channel=metadata["channel"],
+            url=f"https://youtube.com/watch?v={video_data['video_id']}",
+            publish_date=metadata["publish_date"],
+            duration=metadata["duration"],
+            view_count=metadata["view_count"],
+            transcript_summary=combined_analysis["summary"],
+            key_points=combined_analysis["key_points"],
+            key_point_sources=combined_analysis["key_point_sources"],
+            timestamps=timestamps,
+            relevance_score=video_data.get("relevance_score", 0.0),
+            sentiment_analysis=sentiment,
+            technical_complexity=technical_complexity,
+            key_topics=combined_analysis["topics"],
+            speaker_info=speakers
+        )
+
+    def _analysis_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "You are an expert video content analyzer. "
+                                        "Always respond with valid JSON matching the structure requested in the prompt."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _completion_request(self, prompt: str) -> Dict[str, Any]:
+        # Chat completion parameters of one analysis call, also used as the body of batch requests
+        return {
+            "model": self.analysis_model,
+            "messages": self._analysis_messages(prompt),
+            "response_format": {"type": "json_object"},
+            "temperature": 0.3
+        }
+
+    def _parse_llm_content(self, content: str) -> Dict[str, Any]:
+        # Safely parse JSON response instead of using eval
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            # Fallback: return as string if not valid JSON
+            return content
+
     def _analyze_with_llm(self, prompt: str) -> Dict[str, Any]:
         """
         Use LLM to analyze video content
@@ -232,36 +660,28 @@ class EnhancedYouTubeAnalysisTool:
             Dict containing analysis results
         """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are an expert video content analyzer. "
-                                                "Provide a structured analysis in JSON format with the following fields:"
-                                                "summary, key_points (list), topics (list), sentiment (dict with positive/negative/neutral), "
-                                                "technical_complexity (0-10), speaker_info (dict)."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3
-            )
-            
-            # Parse the JSON response
-            # Safely parse JSON response instead of using eval
-            try:
-                import json
-                return json.loads(response.choices[0].message.content)
-            except json.JSONDecodeError:
-                # Fallback: return as string if not valid JSON
-                return response.choices[0].message.content
+            response = self.client.chat.completions.create(**self._completion_request(prompt))
+            return self._parse_llm_content(response.choices[0].message.content)
             
         except Exception as e:
             # Return default values on error
             print(f"Error in LLM analysis: {str(e)}")
-            return {
-                "summary": "Error analyzing video content",
-                "key_points": ["Could not analyze video"],
-                "topics": ["error"],
-                "sentiment": {"positive": 0.33, "negative": 0.33, "neutral": 0.34},
-                "technical_complexity": 5.0,
-                "speaker_info": {}
-            }
+            return dict(LLM_ERROR_ANALYSIS)
+
+    async def _analyze_with_llm_async(self, prompt: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """
+        Async variant of _analyze_with_llm
+        Args:
+            prompt: Analysis prompt including transcript
+            semaphore: Bounds concurrent LLM calls across the whole run
+        Returns:
+            Dict containing analysis results
+        """
+        try:
+            async with semaphore:
+                response = await self.async_client.chat.completions.create(**self._completion_request(prompt))
+            return self._parse_llm_content(response.choices[0].message.content)
+            
+        except Exception as e:
+            print(f"Error in LLM analysis: {str(e)}")
+            return dict(LLM_ERROR_ANALYSIS)
@@ -1,9 +1,13 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Generator, Iterator, Optional, Tuple
 import requests
+import asyncio
 import os
 import re
+import time
 import json
 from pydantic import BaseModel
+from agentpro.tools.http_transport import get_async_transport, get_transport
+from .research_cache import ResearchCache, get_research_cache
 
 class ResearchResponse(BaseModel):
     sources: List[Dict[str, str]]
@@ -11,78 +15,353 @@ class ResearchResponse(BaseModel):
     key_insights: List[str]
     citations: List[str]
 
+class ResearchStreamParser:
+    """
+    Incremental version of PerplexityResearchTool._parse_research_response: content can be
+    fed in arbitrary pieces as it streams in, every completed line is parsed right away
+    """
+
+    def __init__(self):
+        self.sections = {
+            "Summary": "",
+            "Key Insights": [],
+            "Sources": [],
+            "Citations": []
+        }
+        self._current_section = None
+        self._pending = ""  # unfinished last line
+
+    def feed(self, text: str) -> bool:
+        """
+        Add streamed content
+        Args:
+            text: Next piece of the response
+        Returns:
+            True if any section changed
+        """
+        *lines, self._pending = (self._pending + text).split('\n')
+        changed = False
+        for line in lines:
+            changed = self._parse_line(line) or changed
+        return changed
+
+    def close(self) -> Dict[str, Any]:
+        """Parse whatever is left over and return the final sections"""
+        if self._pending:
+            self._parse_line(self._pending)
+            self._pending = ""
+        return self.sections
+
+    def _parse_line(self, line: str) -> bool:
+        line = line.strip()
+        if not line:
+            return False
+            
+        # Check if this is a section header
+        for section in self.sections.keys():
+            if line.lower().startswith(section.lower() + ":"):
+                self._current_section = section
+                break
+        
+        if self._current_section == "Summary":
+            if not line.lower().startswith("summary:"):
+                self.sections["Summary"] += line + " "
+                return True
+        elif self._current_section:
+            # For list items
+            if line.startswith("-") or line.startswith("*"):
+                item = line.lstrip("- *").strip()
+                self.sections[self._current_section].append(item)
+                return True
+        return False
+
+    def response(self, citations: Optional[List[str]] = None) -> ResearchResponse:
+        """
+        Snapshot of the parsed sections
+        Args:
+            citations: Citation URLs reported by the API alongside the content
+        Returns:
+            ResearchResponse with everything parsed so far
+        """
+        merged = list(dict.fromkeys(self.sections["Citations"] + (citations or [])))
+        return ResearchResponse(
+            sources=[{"name": source} for source in self.sections["Sources"]],
+            summary=self.sections["Summary"].strip(),
+            key_insights=list(self.sections["Key Insights"]),
+            citations=merged
+        )
+
+class ResearchTier(BaseModel):
+    """Model and latency settings of one research depth"""
+    model: str
+    max_tokens: int
+    connect_timeout: float = 5.0
+    read_timeout: float  # longest wait for the (next chunk of the) response
+    latency_budget: Optional[float] = None  # total seconds for the call including retries, None is unbounded
+    cache_first: bool = False  # also accept cached results of other tiers before calling the API
+
+RESEARCH_TIERS = {
+    "quick": ResearchTier(model="sonar", max_tokens=1000, connect_timeout=3.0, read_timeout=20.0,
+                          latency_budget=25.0, cache_first=True),
+    "deep": ResearchTier(model="sonar-deep-research", max_tokens=4000, read_timeout=600.0)
+}
+
 class PerplexityResearchTool:
     name: str = "perplexity_research"
     description: str = "performs deep research using perplexity sonar api"
     arg: str = "topic or query to research"
     api_key: str = None
+    url: str = "https://api.perplexity.ai/chat/completions"
+    tiers: Dict[str, ResearchTier] = RESEARCH_TIERS
+    default_depth: str = "deep"
+    use_cache: bool = True  # serve repeated (or reworded) queries from the research cache
 
-    def __init__(self):
+    def __init__(self, cache: Optional[ResearchCache] = None):
+        """
+        Args:
+            cache: Research cache to use, the process-wide one (get_research_cache) when None, so
+                tools of different jobs share results and in-flight queries
+        """
         self.api_key = os.environ.get("PERPLEXITY_API_KEY")
         if not self.api_key:
             raise ValueError("PERPLEXITY_API_KEY environment variable not set")
+        self._cache = cache
+
+    @property
+    def cache(self) -> ResearchCache:
+        # The shared default cache is opened on first use, not when the tool is built
+        if self._cache is None:
+            self._cache = get_research_cache()
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache: Optional[ResearchCache]):
+        self._cache = cache
 
-    def run(self, prompt: str) -> Dict[str, Any]:
+    def run(self, prompt: str, depth: Optional[str] = None) -> Dict[str, Any]:
         """
         Perform research on the given topic using Perplexity Sonar API
         Args:
             prompt: The topic or query to research
+            depth: "quick" or "deep", default_depth when None
         Returns:
-            Dictionary containing the API response
+            Dictionary containing the API response, plus the depth, model, elapsed_seconds
+            and whether the result came from the cache
         """
+        depth, tier = self._tier(depth)
+        started = time.monotonic()
+        computed = []
+        
+        def compute():
+            computed.append(True)
+            return self._call_perplexity_api(prompt, tier)
+        
         try:
-            return self._call_perplexity_api(prompt)
+            result = self._cached(prompt, tier) if tier.cache_first else None
+            if result is None:
+                if self._caching():
+                    result = self.cache.get_or_compute(prompt, compute, namespace=tier.model)
+                else:
+                    result = compute()
         except Exception as e:
-            return {"error": str(e)}
+            result = {"error": str(e)}
+        return self._with_timing(result, depth, tier, started, cached=not computed)
 
-    def _call_perplexity_api(self, query: str) -> Dict[str, Any]:
+    async def arun(self, prompt: str, depth: Optional[str] = None) -> Dict[str, Any]:
+        """Async variant of run, sharing the same connection pool"""
+        depth, tier = self._tier(depth)
+        started = time.monotonic()
+        computed = []
+        
+        async def compute():
+            computed.append(True)
+            return await self._call_perplexity_api_async(prompt, tier)
+        
+        try:
+            result = await asyncio.to_thread(self._cached, prompt, tier) if tier.cache_first else None
+            if result is None:
+                if self._caching():
+                    result = await self.cache.aget_or_compute(prompt, compute, namespace=tier.model)
+                else:
+                    result = await compute()
+        except Exception as e:
+            result = {"error": str(e)}
+        return self._with_timing(result, depth, tier, started, cached=not computed)
+
+    def research_response(self, result: Dict[str, Any]) -> ResearchResponse:
+        """Parse a run/arun result into a ResearchResponse"""
+        parser = ResearchStreamParser()
+        parser.feed(result.get("content", ""))
+        parser.close()
+        return parser.response(result.get("citations"))
+
+    def _tier(self, depth: Optional[str]) -> Tuple[str, ResearchTier]:
+        depth = (depth or self.default_depth).lower()
+        if depth not in self.tiers:
+            raise ValueError(f"Unknown research depth '{depth}', expected one of {sorted(self.tiers)}")
+        return depth, self.tiers[depth]
+
+    def _caching(self) -> bool:
+        return self.use_cache and self.cache is not None
+
+    def _cached(self, prompt: str, tier: ResearchTier) -> Optional[Dict[str, Any]]:
+        # Cache-first lookup: this tier's own results, then those of any other tier
+        if not self._caching():
+            return None
+        models = [tier.model] + [other.model for other in self.tiers.values() if other.model != tier.model]
+        for model in dict.fromkeys(models):
+            result = self.cache.get(prompt, model)
+            if result is not None:
+                return result
+        return None
+
+    def _with_timing(self, result: Dict[str, Any], depth: str, tier: ResearchTier, started: float, cached: bool) -> Dict[str, Any]:
+        elapsed = time.monotonic() - started
+        print(f"Research ({depth}, {tier.model}) took {elapsed:.2f}s{' from cache' if cached else ''}")
+        return {**result, "depth": depth, "model": tier.model, "elapsed_seconds": round(elapsed, 3), "cached": cached}
+
+    def stream(self, prompt: str, depth: Optional[str] = None) -> Iterator[ResearchResponse]:
         """
-        Make the actual API call to Perplexity Sonar
+        Research a topic, yielding partial results while the answer streams in; concurrent
+        identical queries share one upstream stream and replay its partial results
         Args:
-            query: The research query
-        Returns:
-            Dict containing the API response
+            prompt: The topic or query to research
+            depth: "quick" or "deep", default_depth when None
+        Yields:
+            ResearchResponse snapshots, whenever a section gains a line; the last one is final
+        Raises:
+            requests.exceptions.RequestException if the API call fails, Timeout once the answer
+            takes longer than the tier's latency budget
         """
-        url = "https://api.perplexity.ai/chat/completions"
-        
+        depth, tier = self._tier(depth)
+        cached = self._cached(prompt, tier) if tier.cache_first else None
+        if cached is not None:
+            yield self.research_response(cached)
+            return
+        if not self._caching():
+            updates = self._stream_perplexity_api(prompt, tier)
+            result = yield from updates
+            yield self.research_response(result)
+            return
+        for final, update in self.cache.stream_or_compute(
+                prompt, lambda: self._stream_perplexity_api(prompt, tier), namespace=tier.model):
+            yield self.research_response(update) if final else update
+
+    def _stream_perplexity_api(self, prompt: str, tier: ResearchTier) -> Generator[ResearchResponse, None, Dict[str, Any]]:
+        # Yields a snapshot whenever a section changes, returns the result in the shape run() caches
+        parser = ResearchStreamParser()
+        citations: List[str] = []
+        content = []
+        print(f"Streaming Perplexity research for query: {prompt}")
+        deadline = time.monotonic() + tier.latency_budget if tier.latency_budget is not None else None
+        with get_transport().post(self.url, stream=True, **self._request_kwargs(prompt, tier, stream=True)) as response:
+            response.raise_for_status()
+            for event in self._iter_sse_events(response):
+                # The transport's budget covers the wait for the response to start, this covers reading it
+                if deadline is not None and time.monotonic() > deadline:
+                    raise requests.exceptions.Timeout(f"Research stream exceeded its {tier.latency_budget}s budget")
+                changed = False
+                if event.get("citations") and event["citations"] != citations:
+                    citations, changed = list(event["citations"]), True
+                choices = event.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    content.append(delta)
+                    changed = parser.feed(delta) or changed
+                if changed:
+                    yield parser.response(citations)
+        return {"content": "".join(content), "citations": citations}
+
+    async def astream(self, prompt: str, depth: Optional[str] = None) -> AsyncIterator[ResearchResponse]:
+        """Async variant of stream, reading the response on a worker thread"""
+        updates = self.stream(prompt, depth)
+        done = object()
+        try:
+            while True:
+                update = await asyncio.to_thread(next, updates, done)
+                if update is done:
+                    break
+                yield update
+        finally:
+            updates.close()
+
+    def _iter_sse_events(self, response: requests.Response) -> Iterator[Dict[str, Any]]:
+        # Server-sent events: "data: {json}" lines, terminated by "data: [DONE]"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                yield json.loads(data)
+            except json.JSONDecodeError:
+                continue
+
+    def _build_request(self, query: str, tier: ResearchTier, stream: bool = False) -> Tuple[Dict[str, Any], Dict[str, str]]:
         # Simple research prompt
         research_prompt = f"Analyze and provide information about {query}"
 
         payload = {
-            "model": "sonar-deep-research",
+            "model": tier.model,
             "messages": [
                 {"role": "user", "content": research_prompt}
             ],
-            "max_tokens": 1000
+            "max_tokens": tier.max_tokens
         }
+        if stream:
+            payload["stream"] = True
         
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        return payload, headers
+
+    def _request_kwargs(self, query: str, tier: ResearchTier, stream: bool = False) -> Dict[str, Any]:
+        payload, headers = self._build_request(query, tier, stream)
+        # A research query has no side effects, so the transport may retry it within the tier's budget
+        return {"json": payload, "headers": headers, "timeout": (tier.connect_timeout, tier.read_timeout),
+                "budget": tier.latency_budget, "idempotent": True}
+
+    def _handle_response(self, response: requests.Response) -> Dict[str, Any]:
+        print(f"Response status: {response.status_code}")
+        response.raise_for_status()
         
+        # Process the response
+        result = response.json()
+        content = result['choices'][0]['message']['content']
+        print(f"Perplexity API response: {content}")
+        
+        # Just return the content directly
+        return {"content": content}
+
+    def _call_perplexity_api(self, query: str, tier: Optional[ResearchTier] = None) -> Dict[str, Any]:
+        """
+        Make the actual API call to Perplexity Sonar
+        Args:
+            query: The research query
+            tier: Model and timeouts to use, the default depth's when None
+        Returns:
+            Dict containing the API response
+        """
+        tier = tier or self._tier(None)[1]
         try:
-            print(f"Making API call to Perplexity for query: {query}")
-            print(f"Making request to {url}")
-            print(f"Headers: {headers}")
-            print(f"Payload: {payload}")
-            
-            response = requests.post(url, json=payload, headers=headers)
-            print(f"Response status: {response.status_code}")
-            print(f"Response headers: {response.headers}")
-            print(f"Response text: {response.text}")
-            
-            response.raise_for_status()
-            
-            # Process the response
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            print(f"Perplexity API response: {content}")
-            
-            # Just return the content directly
-            return {"content": content}
+            print(f"Making API call to Perplexity ({tier.model}) for query: {query}")
+            response = get_transport().post(self.url, **self._request_kwargs(query, tier))
+            return self._handle_response(response)
             
-            return {"content": content}
+        except Exception as e:
+            print(f"Perplexity API error: {str(e)}")
+            return {"error": str(e)}
+
+    async def _call_perplexity_api_async(self, query: str, tier: Optional[ResearchTier] = None) -> Dict[str, Any]:
+        """Async variant of _call_perplexity_api"""
+        tier = tier or self._tier(None)[1]
+        try:
+            print(f"Making API call to Perplexity ({tier.model}) for query: {query}")
+            response = await get_async_transport().post(self.url, **self._request_kwargs(query, tier))
+            return self._handle_response(response)
             
         except Exception as e:
             print(f"Perplexity API error: {str(e)}")
@@ -96,35 +375,6 @@ class PerplexityResearchTool:
         Returns:
             Dict containing parsed sections
         """
-        sections = {
-            "Summary": "",
-            "Key Insights": [],
-            "Sources": [],
-            "Citations": []
-        }
-        
-        current_section = None
-        current_list = []
-        
-        for line in content.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-                
-            # Check if this is a section header
-            for section in sections.keys():
-                if line.lower().startswith(section.lower() + ":"):
-                    current_section = section
-                    break
-            
-            if current_section:
-                if current_section == "Summary":
-                    if not line.lower().startswith("summary:"):
-                        sections["Summary"] += line + " "
-                else:
-                    # For list items
-                    if line.startswith("-") or line.startswith("*"):
-                        item = line.lstrip("- *").strip()
-                        sections[current_section].append(item)
-        
-        return sections
+        parser = ResearchStreamParser()
+        parser.feed(content)
+        return parser.close()
@@ -0,0 +1,332 @@
+from typing import Any, Awaitable, Callable, Dict, Generator, Iterator, Optional, Tuple
+from agentpro.tools.relevance import NEGATIONS, STOPWORDS, hashed_tfidf_cosine, is_negation, tokenize
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "ariel_view", "research_cache.sqlite3")
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_NEAR_DUPLICATE_SCAN = 500
+
+# "not" turns a question into its opposite, so it stays in the key
+_KEY_STOPWORDS = STOPWORDS - NEGATIONS
+
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key of a research query: lowercase tokens in order, without stopwords other than
+    negations, so "What is quantum computing?" and "quantum computing, what is it" share an
+    entry while "Is nuclear power safe" and "Is nuclear power not safe" don't
+    """
+    tokens = tokenize(query, _KEY_STOPWORDS)
+    return " ".join(tokens) if tokens else " ".join(query.lower().split())
+
+
+_default_cache: Optional["ResearchCache"] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_research_cache() -> "ResearchCache":
+    """
+    The process-wide cache at the default path, opened on first use; every research tool built
+    without an explicit cache shares it, and with it the in-flight queries of all jobs
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResearchCache()
+        return _default_cache
+
+
+def _negated(key: str) -> bool:
+    return any(is_negation(word) for word in key.split())
+
+
+def _cacheable(result: Any) -> bool:
+    return not (isinstance(result, dict) and "error" in result)
+
+
+class _Flight:
+    """
+    One in-progress upstream call that concurrent identical queries wait on, from any thread or
+    event loop; streaming leaders also publish their partial results for followers to replay
+    """
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self.updates = []
+        self.finished = False
+        self.abandoned = False  # the leader stopped without an outcome, e.g. it was cancelled
+        self.result = None
+        self.error = None
+
+    def publish(self, update: Any):
+        with self._changed:
+            self.updates.append(update)
+            self._changed.notify_all()
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None, abandoned: bool = False):
+        with self._changed:
+            self.result, self.error, self.abandoned = result, error, abandoned
+            self.finished = True
+            self._changed.notify_all()
+
+    def wait(self):
+        with self._changed:
+            self._changed.wait_for(lambda: self.finished)
+
+    def follow(self) -> Iterator[Any]:
+        """Partial results published so far, then the rest as they arrive, until the flight finishes"""
+        seen = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self.finished or len(self.updates) > seen)
+                updates, finished = self.updates[seen:], self.finished
+            seen += len(updates)
+            yield from updates
+            if finished:
+                return
+
+    def outcome(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class ResearchCache:
+    """
+    Persistent research results keyed by normalized query, with a freshness TTL per entry.
+    Lookups fall back to the nearest cached query (hashed TF-IDF cosine) when no exact key
+    matches, and get_or_compute (aget_or_compute, stream_or_compute) lets concurrent identical
+    queries share one upstream call, across threads and event loops alike
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        near_duplicate_threshold: Optional[float] = 0.8,
+        near_duplicate_scan: int = DEFAULT_NEAR_DUPLICATE_SCAN
+    ):
+        """
+        Args:
+            path: SQLite file, RESEARCH_CACHE_PATH or ~/.cache/ariel_view/research_cache.sqlite3 by default
+            ttl: Default freshness in seconds, RESEARCH_CACHE_TTL or one week by default
+            near_duplicate_threshold: Cosine similarity needed to reuse a differently worded query, None disables
+            near_duplicate_scan: Most recent fresh entries a miss compares against, bounding the fallback's cost
+        """
+        self.path = os.path.expanduser(path or os.environ.get("RESEARCH_CACHE_PATH", DEFAULT_CACHE_PATH))
+        self.ttl = ttl if ttl is not None else float(os.environ.get("RESEARCH_CACHE_TTL", DEFAULT_TTL))
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_scan = near_duplicate_scan
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS research_cache (
+                    namespace TEXT NOT NULL,
+                    query_key TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, query_key)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_research_cache_expiry ON research_cache (expires_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_research_cache_recent ON research_cache (namespace, created_at)")
+
+    def get(self, query: str, namespace: str = "") -> Optional[Any]:
+        """
+        Fresh cached result for a query
+        Args:
+            query: The research query as the user wrote it
+            namespace: Separates results that aren't interchangeable, e.g. different models
+        Returns:
+            The cached result, None on a miss
+        """
+        key, now = normalize_query(query), time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM research_cache WHERE namespace = ? AND query_key = ? AND expires_at > ?",
+                (namespace, key, now)).fetchone()
+            if row is None and self.near_duplicate_threshold is not None:
+                candidates = self._conn.execute(
+                    "SELECT query_key, result FROM research_cache WHERE namespace = ? AND expires_at > ? "
+                    "ORDER BY created_at DESC LIMIT ?",
+                    (namespace, now, self.near_duplicate_scan)).fetchall()
+                # A negated question never reuses the answer to the affirmative one, or vice versa
+                candidates = [candidate for candidate in candidates if _negated(candidate[0]) == _negated(key)]
+                if candidates:
+                    scores = hashed_tfidf_cosine(key, [candidate for candidate, _ in candidates])
+                    best = int(scores.argmax())
+                    if scores[best] >= self.near_duplicate_threshold:
+                        row = (candidates[best][1],)
+        return json.loads(row[0]) if row else None
+
+    def put(self, query: str, result: Any, namespace: str = "", ttl: Optional[float] = None):
+        """Store a result, fresh for ttl seconds (the cache default when None)"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO research_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, normalize_query(query), query, json.dumps(result), now, expires_at))
+
+    def _join(self, query: str, namespace: str) -> Tuple[Tuple[str, str], _Flight, bool]:
+        # The flight in progress for this query, or a new one led by the caller
+        flight_key = (namespace, normalize_query(query))
+        with self._lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+        return flight_key, flight, leader
+
+    def _land(self, flight_key: Tuple[str, str], flight: _Flight, **outcome):
+        # Leave the flight before finishing it, so followers of an abandoned one start a new flight
+        with self._lock:
+            if self._flights.get(flight_key) is flight:
+                del self._flights[flight_key]
+        flight.finish(**outcome)
+
+    def get_or_compute(self, query: str, compute: Callable[[], Any], namespace: str = "", ttl: Optional[float] = None) -> Any:
+        """
+        Cached result, or compute it once even when several threads ask for the same query
+        Args:
+            query: The research query
+            compute: Makes the upstream call, error results ({"error": ...}) are not cached
+            namespace: See get
+            ttl: See put
+        Returns:
+            The cached or freshly computed result
+        """
+        while True:
+            cached = self.get(query, namespace)
+            if cached is not None:
+                return cached
+            flight_key, flight, leader = self._join(query, namespace)
+            if not leader:
+                flight.wait()
+                if flight.abandoned:
+                    continue
+                return flight.outcome()
+            try:
+                # Another leader may have finished between our lookup and taking the flight
+                result = self.get(query, namespace)
+                if result is None:
+                    result = compute()
+                    if _cacheable(result):
+                        self.put(query, result, namespace, ttl)
+            except Exception as e:
+                self._land(flight_key, flight, error=e)
+                raise
+            except BaseException:
+                self._land(flight_key, flight, abandoned=True)
+                raise
+            self._land(flight_key, flight, result=result)
+            return result
+
+    async def aget_or_compute(self, query: str, compute: Callable[[], Awaitable[Any]], namespace: str = "", ttl: Optional[float] = None) -> Any:
+        """
+        Async variant of get_or_compute; it shares flights with the sync one, so tasks in other
+        event loops (each backend job runs its own) and plain threads wait on the same call
+        """
+        while True:
+            cached = await asyncio.to_thread(self.get, query, namespace)
+            if cached is not None:
+                return cached
+            flight_key, flight, leader = self._join(query, namespace)
+            if not leader:
+                await asyncio.to_thread(flight.wait)
+                if flight.abandoned:
+                    continue
+                return flight.outcome()
+            try:
+                result = await asyncio.to_thread(self.get, query, namespace)
+                if result is None:
+                    result = await compute()
+                    if _cacheable(result):
+                        await asyncio.to_thread(self.put, query, result, namespace, ttl)
+            except Exception as e:
+                self._land(flight_key, flight, error=e)
+                raise
+            except BaseException:
+                self._land(flight_key, flight, abandoned=True)
+                raise
+            self._land(flight_key, flight, result=result)
+            return result
+
+    def stream_or_compute(
+        self,
+        query: str,
+        produce: Callable[[], Generator[Any, None, Any]],
+        namespace: str = "",
+        ttl: Optional[float] = None
+    ) -> Iterator[Tuple[bool, Any]]:
+        """
+        Streaming variant of get_or_compute: one caller runs produce, concurrent identical
+        queries replay its partial results as they arrive instead of calling upstream themselves
+        Args:
+            query: The research query
+            produce: Generator yielding partial results and returning the result to cache
+            namespace: See get
+            ttl: See put
+        Yields:
+            (False, partial result) while the answer streams in, then (True, result) once,
+            only the latter on a cache hit
+        """
+        while True:
+            cached = self.get(query, namespace)
+            if cached is not None:
+                yield True, cached
+                return
+            flight_key, flight, leader = self._join(query, namespace)
+            if not leader:
+                for update in flight.follow():
+                    yield False, update
+                if flight.abandoned:
+                    continue  # the leader's consumer went away mid-stream, start over
+                yield True, flight.outcome()
+                return
+            updates = None
+            try:
+                result = self.get(query, namespace)
+                if result is None:
+                    updates = produce()
+                    while True:
+                        try:
+                            update = next(updates)
+                        except StopIteration as stop:
+                            result = stop.value
+                            break
+                        flight.publish(update)
+                        yield False, update
+                    if _cacheable(result):
+                        self.put(query, result, namespace, ttl)
+            except Exception as e:
+                self._land(flight_key, flight, error=e)
+                raise
+            except BaseException:
+                self._land(flight_key, flight, abandoned=True)
+                raise
+            finally:
+                if updates is not None:
+                    updates.close()  # releases the upstream response when the stream stops early
+            self._land(flight_key, flight, result=result)
+            yield True, result
+            return
+
+    def purge_expired(self) -> int:
+        """Delete stale entries, returns how many were removed"""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM research_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def close(self):
+        self._conn.close()
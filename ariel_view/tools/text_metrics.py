@@ -0,0 +1,104 @@
+from typing import Dict, List
+from agentpro.tools.relevance import WORD, is_negation
+import re
+import numpy as np
+
+# Compact opinion lexicon; enough to separate upbeat, critical and neutral/explanatory segments
+POSITIVE_WORDS = frozenset("""
+able accurate achieve achievement advance advantage amazing awesome beautiful benefit best better boost breakthrough
+brilliant clear confident cool easy effective efficient elegant enjoy excellent exciting fantastic fast favorite fine
+fortunate fun gain glad good great happy helpful ideal impressive improve improved improvement incredible innovative
+interesting love lucky nice opportunity optimistic perfect pleasant popular positive powerful progress promising
+reliable remarkable robust safe simple smart solid solve solved strong success successful superb support thrive
+useful valuable win wonderful worth
+""".split())
+NEGATIVE_WORDS = frozenset("""
+abuse afraid attack awful bad bias biased break broken bug challenge concern concerned crash crisis critical
+damage danger dangerous decline difficult disaster disappointing error expensive fail failed failure fake fear
+flaw flawed fraud hard harm harmful hate horrible issue lack lose loss mistake negative pain poor problem problematic
+risk risky sad scary serious slow struggle stupid terrible threat trouble ugly unclear unfortunately unreliable
+unsafe vulnerable weak worry worse worst wrong
+""".split())
+
+_SENTENCE_END = re.compile(r"[.!?]+")
+_VOWEL_GROUPS = re.compile(r"[aeiouy]+")
+
+
+def _words(text: str) -> List[str]:
+    # The relevance tokenizer's words, so sentiment and relevance scoring can't drift apart
+    return WORD.findall(text)
+
+
+def sentiment_scores(segments: List[str], scale: float = 10.0) -> np.ndarray:
+    """
+    Lexicon-based sentiment for each segment
+    Args:
+        segments: Transcript segments
+        scale: Density of opinion words that counts as fully polar (10 -> 10% of words)
+    Returns:
+        (n_segments, 3) array of positive/negative/neutral shares, each row summing to 1
+    """
+    counts = np.zeros((len(segments), 3), dtype=np.float64)  # positive, negative, words
+    for i, segment in enumerate(segments):
+        negate = 0
+        for word in _words(segment.lower()):
+            counts[i, 2] += 1
+            if is_negation(word):
+                negate = 3  # flips the polarity of the next few words
+                continue
+            polarity = (word in POSITIVE_WORDS) - (word in NEGATIVE_WORDS)
+            if negate:
+                polarity, negate = -polarity, negate - 1
+            if polarity > 0:
+                counts[i, 0] += 1
+            elif polarity < 0:
+                counts[i, 1] += 1
+    polar = np.clip(counts[:, :2] * scale / np.maximum(counts[:, 2:3], 1.0), 0.0, 1.0)
+    total = polar.sum(axis=1, keepdims=True)
+    polar = np.where(total > 1.0, polar / np.maximum(total, 1e-12), polar)
+    return np.column_stack([polar, 1.0 - polar.sum(axis=1)])
+
+
+def complexity_scores(segments: List[str], max_sentence_words: int = 40) -> np.ndarray:
+    """
+    Technical complexity (0-10) of each segment from readability and jargon density
+    Args:
+        segments: Transcript segments
+        max_sentence_words: Caps sentence length, auto captions often have no punctuation
+    Returns:
+        Array of complexity scores
+    """
+    features = np.zeros((len(segments), 4), dtype=np.float64)  # words, sentences, syllables, jargon
+    for i, segment in enumerate(segments):
+        words = _words(segment)
+        features[i, 0] = len(words)
+        features[i, 1] = max(1, len([s for s in _SENTENCE_END.split(segment) if s.strip()]))
+        features[i, 2] = sum(max(1, len(_VOWEL_GROUPS.findall(word.lower()))) for word in words)
+        # Acronyms, numbers and long words stand in for domain jargon
+        features[i, 3] = sum(1 for word in words if (len(word) > 1 and word.isupper()) or word[0].isdigit() or len(word) >= 10)
+    words = np.maximum(features[:, 0], 1.0)
+    words_per_sentence = np.minimum(words / features[:, 1], max_sentence_words)
+    syllables_per_word = features[:, 2] / words
+    # Flesch-Kincaid grade level, 20 and above counts as maximally hard
+    grade = 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59
+    readability = np.clip(grade / 2.0, 0.0, 10.0)
+    jargon = np.clip(features[:, 3] / words * 40.0, 0.0, 10.0)
+    scores = 0.6 * readability + 0.4 * jargon
+    return np.where(features[:, 0] > 0, scores, 0.0)
+
+
+def overall_sentiment(segments: List[str]) -> Dict[str, float]:
+    """Word-weighted average sentiment over all segments"""
+    if not segments:
+        return {'positive': 0.33, 'negative': 0.33, 'neutral': 0.34}
+    weights = np.array([max(1, len(_words(segment))) for segment in segments], dtype=np.float64)
+    average = np.average(sentiment_scores(segments), axis=0, weights=weights)
+    return {'positive': float(average[0]), 'negative': float(average[1]), 'neutral': float(average[2])}
+
+
+def overall_complexity(segments: List[str]) -> float:
+    """Word-weighted average technical complexity over all segments"""
+    if not segments:
+        return 0.0
+    weights = np.array([max(1, len(_words(segment))) for segment in segments], dtype=np.float64)
+    return float(np.average(complexity_scores(segments), weights=weights))